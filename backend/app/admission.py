@@ -0,0 +1,170 @@
+"""Admission control: per-client rate limits and a cap on expensive work.
+
+`AdmissionMiddleware` checks every HTTP request against the first matching
+`Rule` before any route code runs. Each rule has a token bucket per client,
+kept in a `NamespacedCache`, so limits are per process with the memory cache
+backend and shared by every worker on the host with the sqlite one. With
+the memory backend the buckets get a bounded LRU of their own, so a flood
+of clients cannot push other cache entries out. A client
+is the user id of a valid bearer token, else the peer address (run uvicorn
+with ``--proxy-headers`` behind a proxy); sign-in and sign-up always count
+per address. An empty bucket answers 429 with Retry-After.
+
+Expensive rules (bcrypt, full-text search) also share an in-flight cap per
+process; past it, requests are shed with 503 instead of queueing for the
+threadpool behind a flood.
+"""
+import math
+import os
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+
+from .auth import decode_token
+from . import cache
+from .cache import MemoryBackend, NamespacedCache
+from .metrics import REGISTRY
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# "<requests>/<second|minute|hour>", or "off"; the count is also the burst
+RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "10/minute")
+RATE_LIMIT_SEARCH = os.getenv("RATE_LIMIT_SEARCH", "20/second")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "100/second")
+# expensive requests running at once in one process
+EXPENSIVE_CONCURRENCY = int(os.getenv("EXPENSIVE_CONCURRENCY", "32"))
+# buckets kept per process with the memory backend; the least recently
+# seen client's bucket goes first, which only ever resets it to full
+ADMISSION_MAX_BUCKETS = int(os.getenv("ADMISSION_MAX_BUCKETS", "100000"))
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+admission_rejected = REGISTRY.counter(
+    "admission_rejected_total", "Requests turned away before any work, by rule and reason"
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    interval: float  # seconds per token
+    burst: int
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Limit"]:
+        """``"10/minute"`` -> a bucket of 10 refilled every 6 seconds."""
+        if value.strip().lower() == "off":
+            return None
+        count, _, period = value.partition("/")
+        try:
+            count, seconds = int(count), _PERIODS[period.strip().lower()]
+        except (ValueError, KeyError):
+            raise ValueError(f"Bad rate limit {value!r}, expected e.g. '10/minute'")
+        if count <= 0:
+            raise ValueError(f"Bad rate limit {value!r}, expected a positive count")
+        return cls(interval=seconds / count, burst=count)
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    limit: Optional[Limit]
+    methods: tuple = ()  # empty matches any method
+    paths: tuple = ()  # empty matches any path
+    param: Optional[str] = None  # only when this query parameter is non-empty
+    per_address: bool = False
+    expensive: bool = False
+
+    def matches(self, scope):
+        if self.methods and scope["method"] not in self.methods:
+            return False
+        if self.paths and scope["path"] not in self.paths:
+            return False
+        if self.param is not None:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            return any(value.strip() for value in query.get(self.param, ()))
+        return True
+
+
+def default_rules():
+    return (
+        Rule(
+            "auth", Limit.parse(RATE_LIMIT_AUTH), methods=("POST",),
+            paths=("/auth/signin", "/auth/signup"), per_address=True, expensive=True,
+        ),
+        Rule(
+            "search", Limit.parse(RATE_LIMIT_SEARCH), methods=("GET",),
+            paths=("/books/", "/books"), param="search", expensive=True,
+        ),
+        Rule("default", Limit.parse(RATE_LIMIT_DEFAULT)),
+    )
+
+
+def client_key(scope, per_address=False):
+    if not per_address:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                payload = decode_token(token) if scheme.lower() == "bearer" else None
+                if payload and payload.get("sub"):
+                    return f"user:{payload['sub']}"
+                break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def bucket_store():
+    backend = cache.cache_backend
+    if not backend.shared:
+        backend = MemoryBackend(maxsize=ADMISSION_MAX_BUCKETS)
+    return NamespacedCache("admission", backend=backend)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware; rejected requests never reach routing."""
+
+    def __init__(self, app, rules=None, store=None, max_in_flight=EXPENSIVE_CONCURRENCY):
+        self.app = app
+        self.rules = default_rules() if rules is None else rules
+        self.store = bucket_store() if store is None else store
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = next((rule for rule in self.rules if rule.matches(scope)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        if rule.limit is not None:
+            key = f"{rule.name}:{client_key(scope, rule.per_address)}"
+            wait = self.store.throttle(key, rule.limit.interval, rule.limit.burst)
+            if wait > 0:
+                admission_rejected.inc(rule=rule.name, reason="rate")
+                await _reject(429, "Too many requests", wait, scope, receive, send)
+                return
+
+        if not rule.expensive:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_in_flight:
+            admission_rejected.inc(rule=rule.name, reason="busy")
+            await _reject(503, "Server busy, try again shortly", 1, scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+async def _reject(status_code, detail, retry_after, scope, receive, send):
+    response = JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+    await response(scope, receive, send)
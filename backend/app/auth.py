@@ -1,126 +1,302 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from .schemas.user_schema import UserSignup, UserSignin
-import bcrypt
-from jose import jwt, JWTError
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from .schemas.user_schema import RefreshRequest, UserSignup, UserSignin
 import os
-from .database import get_db
+import time
+from .database import get_db, run_db
 from sqlalchemy.orm import Session
 from .models_db import User as DBUser
+from .passwords import password_hasher
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import Optional
+from .cache import NamespacedCache
+from .tokens import new_token_id, revocations, revoke_family, rotate_family, start_family
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# AUTH_STATELESS=1 trusts the profile claims of a valid access token and skips
+# the user lookup entirely; profile edits show up after the next sign-in.
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "0") == "1"
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 SECRET = os.getenv("SECRET_KEY", "secret_fallback_key")
 
+# the "type" claim; a refresh token is never accepted as an access token
+ACCESS = "access"
+REFRESH = "refresh"
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-):
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET, algorithms=["HS256"])
-        user_id = payload.get("sub")
-        if not isinstance(user_id, str):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-            )
-    except JWTError:
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, detached from any database session."""
+
+    id: int
+    name: str
+    email: str
+    role: str
+
+    @classmethod
+    def from_user(cls, user: DBUser):
+        return cls(id=user.id, name=user.name, email=user.email, role=user.role)
+
+    @classmethod
+    def from_claims(cls, payload: dict):
+        if not all(isinstance(payload.get(claim), str) for claim in ("name", "email", "role")):
+            return None
+        return cls(
+            id=int(payload["sub"]),
+            name=payload["name"],
+            email=payload["email"],
+            role=payload["role"],
+        )
+
+
+# lives in the shared cache backend so a profile change in one worker
+# invalidates the principal in all of them
+principal_cache = NamespacedCache("principal", ttl=PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(user_id: int):
+    principal_cache.delete(user_id)
+
+
+def principal_claims(user):
+    return {"sub": str(user.id), "role": user.role, "name": user.name, "email": user.email}
+
+
+def token_claims(token: Optional[str], token_type: str) -> Optional[dict]:
+    """Verified claims of a `token_type` token for a user id, else None."""
+    payload = decode_token(token) if token else None
+    if payload is None or payload.get("type") != token_type:
+        return None
+    user_id = payload.get("sub")
+    if not isinstance(user_id, str) or not user_id.isdigit():
+        return None
+    return payload
+
+
+async def ensure_not_revoked(payload: dict, db: Session):
+    # the deny-list is in memory; the database is only read when another
+    # worker revoked something since the last sync
+    if revocations.stale:
+        await run_db(db, revocations.load)
+    if revocations.revoked(payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
+            detail="Token has been revoked",
         )
 
-    user = db.query(DBUser).filter(DBUser.id == int(user_id)).first()
+
+async def load_principal(user_id: int, db: Session) -> Principal:
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    user = await run_db(
+        db, lambda db: db.query(DBUser).filter(DBUser.id == user_id).first()
+    )
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.set(principal.id, principal)
+    return principal
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+) -> Principal:
+    payload = token_claims(credentials.credentials, ACCESS)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+    await ensure_not_revoked(payload, db)
+
+    if AUTH_STATELESS:
+        principal = Principal.from_claims(payload)
+        if principal is not None:
+            return principal
+
+    return await load_principal(int(payload["sub"]), db)
+
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db),
+) -> Optional[Principal]:
+    """The signed-in user, or None for requests without a bearer token."""
+    if credentials is None:
+        return None
+    return await get_current_user(credentials, db)
 
 
 @router.post("/signup")
 async def signup(user: UserSignup, db: Session = Depends(get_db)):
-    existing_user = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if existing_user:
+    def email_taken(db: Session):
+        return db.query(DBUser).filter(DBUser.email == user.email).first() is not None
+
+    if await run_db(db, email_taken):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt()).decode()
+    hashed_pw = await password_hasher.hash(user.password)
 
-    new_user = DBUser(
-        name=user.name, email=user.email, password=hashed_pw, role=user.role
-    )
+    def create(db: Session):
+        new_user = DBUser(
+            name=user.name, email=user.email, password=hashed_pw, role=user.role
+        )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
 
-    return {
-        "id": new_user.id,
-        "name": new_user.name,
-        "email": new_user.email,
-        "role": new_user.role,
-    }
+        return {
+            "id": new_user.id,
+            "name": new_user.name,
+            "email": new_user.email,
+            "role": new_user.role,
+        }
+
+    return await run_db(db, create)
 
 
 @router.post("/signin")
 async def signin(credentials: UserSignin, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.email == credentials.email).first()
+    user = await run_db(
+        db, lambda db: db.query(DBUser).filter(DBUser.email == credentials.email).first()
+    )
 
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    # the commits below expire `user`, and an AsyncSession cannot reload it
+    # outside run_db
+    claims = principal_claims(user)
+    user_id = user.id
 
-    if not bcrypt.checkpw(credentials.password.encode(), user.password.encode()):
+    valid, new_hash = await password_hasher.verify_and_update(
+        credentials.password, user.password
+    )
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    access_token = create_access_token({"sub": str(user.id), "role": user.role})
-    refresh_token = create_refresh_token({"sub": str(user.id)})
+    if new_hash:
+        # the configured bcrypt cost changed since this hash was stored
+        def rehash(db: Session):
+            db.query(DBUser).filter(DBUser.id == user_id).update({"password": new_hash})
+            db.commit()
+
+        await run_db(db, rehash)
 
+    expires_at = _expiry(REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    family = await run_db(db, lambda db: start_family(db, user_id, expires_at))
+    return token_pair(claims, family, 0, expires_at)
+
+
+def token_pair(claims: dict, family: str, generation: int, expires_at: int):
     return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
+        "access_token": create_access_token(claims, family),
+        "refresh_token": create_refresh_token(claims, family, generation, expires_at),
         "token_type": "bearer",
     }
 
 
+def _presented_token(credentials, body):
+    # the header for API clients, the JSON body for the web app
+    if body is not None:
+        return body.refresh_token
+    return credentials.credentials if credentials is not None else None
+
+
 @router.post("/refresh")
-def refresh_token(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+async def refresh_token(
+    body: Optional[RefreshRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: Session = Depends(get_db),
 ):
+    """Swap a refresh token for a new access token and a new refresh token.
+
+    Each refresh token works once; using one again revokes its whole family,
+    since either the client or someone who copied the token is replaying it.
+    """
+    payload = token_claims(_presented_token(credentials, body), REFRESH)
+    if payload is None or not isinstance(payload.get("fam"), str) or not isinstance(payload.get("gen"), int):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    await ensure_not_revoked(payload, db)
+    principal = await load_principal(int(payload["sub"]), db)
+
+    family, generation = payload["fam"], payload["gen"]
+    expires_at = _expiry(REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    if not await run_db(db, lambda db: rotate_family(db, family, generation, expires_at)):
+        await run_db(db, lambda db: revoke_family(db, family, payload.get("exp")))
+        raise HTTPException(status_code=401, detail="Refresh token already used")
+    return token_pair(principal_claims(principal), family, generation + 1, expires_at)
+
+
+@router.post("/logout", status_code=204)
+async def logout(
+    body: Optional[RefreshRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db),
+):
+    """Revoke every token of the presented token's sign-in."""
+    token = _presented_token(credentials, body)
+    payload = token_claims(token, REFRESH) or token_claims(token, ACCESS)
+    family = payload.get("fam") if payload is not None else None
+    if not isinstance(family, str):
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    await run_db(db, lambda db: revoke_family(db, family, payload.get("exp")))
+    return Response(status_code=204)
+
+
+# python-jose pulls in its RSA/ECDSA backends on import; load it on first use.
+def decode_token(token: str):
+    """Verified claims of `token`, or None when it is malformed or expired."""
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(credentials.credentials, SECRET, algorithms=["HS256"])
-        user_id = payload.get("sub")
-        if not isinstance(user_id, str):
-            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        return jwt.decode(token, SECRET, algorithms=["HS256"])
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid refresh token")
+        return None
 
-    user = db.query(DBUser).filter(DBUser.id == int(user_id)).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
 
-    # New access token
-    access_token = create_access_token({"sub": str(user.id), "role": user.role})
-    return {"access_token": access_token, "token_type": "bearer"}
+def encode_token(claims: dict) -> str:
+    from jose import jwt
 
+    return jwt.encode(claims, SECRET, algorithm="HS256")
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET, algorithm="HS256")
+
+def _expiry(seconds) -> int:
+    return int(time.time() + seconds)
+
+
+def create_access_token(data: dict, family: Optional[str] = None):
+    to_encode = {
+        **data,
+        "type": ACCESS,
+        "jti": new_token_id(),
+        "exp": _expiry(ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+    }
+    if family is not None:
+        to_encode["fam"] = family
+    return encode_token(to_encode)
 
 
-def create_refresh_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET, algorithm="HS256")
+def create_refresh_token(data: dict, family: str, generation: int, expires_at: int):
+    # only the subject: profile claims are refreshed from the user on rotation
+    return encode_token({
+        "sub": data["sub"],
+        "type": REFRESH,
+        "jti": new_token_id(),
+        "fam": family,
+        "gen": generation,
+        "exp": expires_at,
+    })
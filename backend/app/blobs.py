@@ -0,0 +1,125 @@
+"""Local content-addressed storage for uploaded book files.
+
+Uploads are streamed to a temporary file while being hashed, then renamed
+to ``<BLOB_DIR>/<sha256[:2]>/<sha256>``. A file that is already stored is
+not written twice. Blobs are never rewritten in place, so they can be served
+with plain file reads and their hash is a strong ETag. Deleting a book only
+drops its book_files row; `collect_garbage` removes blobs no row points at.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import REGISTRY
+from .models_db import BookFile
+
+BLOB_DIR = os.getenv("BLOB_DIR", "./blobs")
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(200 * 1024 * 1024)))
+# request chunks are gathered into writes of this size
+BLOB_WRITE_SIZE = 1024 * 1024
+# unreferenced blobs younger than this may belong to an upload in flight
+BLOB_GC_GRACE = 3600
+
+# accepted upload types and the bytes their files start with
+FORMATS = {
+    "application/pdf": b"%PDF-",
+    "application/epub+zip": b"PK\x03\x04",
+}
+
+blob_uploads = REGISTRY.counter(
+    "blob_uploads_total", "Book file uploads, by whether the content was already stored"
+)
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    digest: str
+    size: int
+    path: str
+    deduplicated: bool
+
+
+class BlobStore:
+    def __init__(self, directory=BLOB_DIR, max_bytes=BLOB_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    async def save(self, chunks, magic=b"") -> StoredBlob:
+        """Store the bytes of the async iterable `chunks`.
+
+        Raises BlobTooLarge past `max_bytes` and ValueError when the content
+        does not start with `magic`.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=self.directory, suffix=".partial")
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        pending = bytearray()
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise BlobTooLarge(f"files are limited to {self.max_bytes} bytes")
+                    if len(head) < len(magic):
+                        head += chunk[: len(magic) - len(head)]
+                        if not magic.startswith(head):
+                            raise ValueError("content does not match its type")
+                    digest.update(chunk)
+                    pending += chunk
+                    if len(pending) >= BLOB_WRITE_SIZE:
+                        await run_in_threadpool(stream.write, bytes(pending))
+                        pending.clear()
+                if head != magic:
+                    raise ValueError("content does not match its type")
+                await run_in_threadpool(stream.write, bytes(pending))
+            stored = await run_in_threadpool(self._commit, partial, digest.hexdigest(), size)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        blob_uploads.inc(outcome="deduplicated" if stored.deduplicated else "stored")
+        return stored
+
+    def _commit(self, partial, digest, size):
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(partial)
+            return StoredBlob(digest, size, path, deduplicated=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(partial, path)
+        return StoredBlob(digest, size, path, deduplicated=False)
+
+    def collect_garbage(self, db, grace=BLOB_GC_GRACE):
+        """Delete blobs that no book_files row references; return how many."""
+        referenced = set(db.scalars(select(BookFile.digest).distinct()))
+        cutoff = time.time() - grace
+        removed = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name in referenced or os.stat(path).st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+blob_store = BlobStore()
+
+
+def get_blob_store() -> BlobStore:
+    return blob_store
@@ -0,0 +1,283 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+# "memory" keeps state inside each worker process; "sqlite" shares it between
+# every worker on the host through a local file (a stand-in for Redis).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", "./cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+# float slack when comparing a bucket's arrival time against its burst
+_THROTTLE_EPSILON = 1e-6
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = float("inf") if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MemoryBackend(TTLCache):
+    """Process-local cache backend: correct for a single worker only.
+
+    Counters live outside the LRU. A version counter that was evicted would
+    restart at 0 and make entries cached under its old values look current.
+    """
+
+    shared = False
+
+    def __init__(self, maxsize=CACHE_MAX_ENTRIES, clock=time.monotonic):
+        super().__init__(maxsize=maxsize, ttl=None, clock=clock)
+        self._counters = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._counters.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        return super().get(key, default)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._counters.pop(key, None)
+        super().set(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+        super().delete(key)
+
+    def incr(self, key, amount=1) -> int:
+        with self._lock:
+            value = self._counters.get(key)
+            if value is None:
+                # a plain entry set earlier becomes the counter's start
+                _, value = self._data.pop(key, (None, 0))
+            value = self._counters[key] = value + amount
+            return value
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for store in (self._data, self._counters):
+                for key in [key for key in store if str(key).startswith(prefix)]:
+                    del store[key]
+
+    def throttle(self, key, interval, burst) -> float:
+        """Take one token from the bucket `key` (see `throttle` below)."""
+        now = self._clock()
+        with self._lock:
+            expires, tat = self._data.get(key, (now, now))
+            tat = max(tat, now) if expires > now else now
+            wait = tat - now - (burst - 1) * interval
+            if wait > _THROTTLE_EPSILON:
+                return wait
+            # the entry lapses once the bucket is full again
+            self._data[key] = (tat + interval, tat + interval)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return 0.0
+
+
+class SQLiteBackend:
+    """Cache backend in a SQLite file that every worker on the host shares.
+
+    Values are pickled, counters are stored as integers so `incr` is a single
+    atomic upsert, and expired rows are dropped on read and swept on write.
+    """
+
+    shared = True
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path=CACHE_PATH, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        # connections must not cross a fork (gunicorn preload) or a thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (str(key),)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= self._clock()):
+            self.misses += 1
+            return default
+        self.hits += 1
+        value = row[0]
+        return value if isinstance(value, (int, float)) else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else self._clock() + ttl
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (str(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires),
+        )
+        self._sweep(conn)
+
+    def _sweep(self, conn):
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (self._clock(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (str(key),))
+
+    def incr(self, key, amount=1) -> int:
+        return self._conn().execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, NULL) "
+            "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value "
+            "RETURNING value",
+            (str(key), amount),
+        ).fetchone()[0]
+
+    def throttle(self, key, interval, burst) -> float:
+        """Take one token from the bucket `key` (see `throttle` below)."""
+        now = self._clock()
+        conn = self._conn()
+        # the stored value is the bucket's theoretical arrival time; the
+        # upsert only applies, and so only returns a row, when a token is free
+        taken = conn.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (:key, :next, :next) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = max(value, :now) + :interval, expires = max(value, :now) + :interval "
+            "WHERE max(value, :now) - :now <= :slack "
+            "RETURNING value",
+            {
+                "key": str(key),
+                "now": now,
+                "next": now + interval,
+                "interval": interval,
+                "slack": (burst - 1) * interval + _THROTTLE_EPSILON,
+            },
+        ).fetchone()
+        self._sweep(conn)
+        if taken is not None:
+            return 0.0
+        row = conn.execute("SELECT value FROM cache WHERE key = ?", (str(key),)).fetchone()
+        return max(row[0] - now - (burst - 1) * interval, 0.0) if row else 0.0
+
+    def clear(self, prefix=""):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._conn().execute(
+            "DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)
+        )
+
+
+def make_backend(kind=CACHE_BACKEND, path=CACHE_PATH):
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
+
+
+cache_backend = make_backend()
+
+
+class NamespacedCache:
+    """A TTLCache-shaped view of one key prefix in a cache backend."""
+
+    def __init__(self, namespace, ttl=None, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        # resolved late so tests and the server config can swap cache_backend
+        return cache_backend if self._backend is None else self._backend
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        value = self.backend.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(self._key(key), value, ttl=self.ttl)
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def incr(self, key, amount=1) -> int:
+        return self.backend.incr(self._key(key), amount)
+
+    def throttle(self, key, interval, burst) -> float:
+        """Token bucket: spend one of `burst` tokens that refill one per
+        `interval` seconds. Returns 0 when a token was taken, otherwise the
+        seconds until one is free (GCRA, so one stored number per bucket).
+        """
+        return self.backend.throttle(self._key(key), interval, burst)
+
+    def clear(self):
+        self.backend.clear(self.namespace + ":")
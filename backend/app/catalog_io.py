@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .models_db import Book
+from .schemas.book_schema import BookCreate
+from .search import search_index
+from .suggest import book_suggestions
+from .sync import next_revision
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+IMPORT_FIELDS = list(BookCreate.model_fields)
+FORMATS = ("csv", "ndjson")
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+
+def detect_format(filename: str = "", content_type: str = ""):
+    if filename.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+        return "ndjson"
+    return None
+
+
+def iter_records(stream, format: str):
+    """Yield ``(line_number, record)`` from a text stream of CSV or NDJSON.
+
+    Unparseable NDJSON lines come through as ``(line_number, None)`` so the
+    importer can report them.
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # empty CSV cells mean "not set" for the optional columns
+            yield reader.line_num, {
+                key: (value if value != "" or key == "description" else None)
+                for key, value in record.items()
+                if key in IMPORT_FIELDS
+            }
+    elif format == "ndjson":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {format}")
+
+
+def _insert_chunk(db: Session, chunk, report: ImportReport):
+    titles = {record["title"] for _, record in chunk}
+    # one set-based lookup per chunk instead of a SELECT per title
+    existing = set(db.scalars(select(Book.title).where(Book.title.in_(titles))))
+
+    rows = []
+    for _, record in chunk:
+        if record["title"] in existing:
+            report.duplicates += 1
+            continue
+        existing.add(record["title"])
+        rows.append(record)
+    if not rows:
+        return
+
+    revision = next_revision(db)
+    inserted = db.execute(
+        insert(Book).returning(Book.id, Book.title, Book.author, Book.description),
+        [{**row, "revision": revision} for row in rows],
+    ).all()
+    search_index.index_many(db, [row._asdict() for row in inserted])
+    db.commit()
+    book_suggestions.add_books([(row.id, row.title, row.author) for row in inserted])
+    report.imported += len(rows)
+
+
+def import_books(db: Session, records, chunk_size=IMPORT_CHUNK_SIZE, report=None) -> ImportReport:
+    """Validate, dedupe by title and insert books in batched transactions.
+
+    `records` yields ``(line_number, dict)`` pairs (see `iter_records`).
+    Titles that already exist, in the database or earlier in the input, are
+    skipped. Pass `report` to see what was committed when an error stops
+    the import part way.
+    """
+    report = ImportReport() if report is None else report
+    chunk = []
+    for line_number, record in records:
+        if record is None:
+            report.error(line_number, "Not a JSON object")
+            continue
+        try:
+            book = BookCreate.model_validate(record)
+        except ValidationError as exc:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            )
+            report.error(line_number, problems)
+            continue
+        chunk.append((line_number, book.model_dump()))
+        if len(chunk) >= chunk_size:
+            _insert_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        _insert_chunk(db, chunk, report)
+    return report
+
+
+def export_chunk(rows, format: str) -> str:
+    """Render rows of IMPORT_FIELDS in the same format `iter_records` reads."""
+    if format == "ndjson":
+        return "".join(json.dumps(dict(zip(IMPORT_FIELDS, row))) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(IMPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def export_query():
+    return select(*[getattr(Book, name) for name in IMPORT_FIELDS]).order_by(Book.id)
@@ -0,0 +1,142 @@
+import argparse
+import contextlib
+import sys
+
+from .blobs import blob_store
+from .catalog_io import (
+    FORMATS,
+    IMPORT_CHUNK_SIZE,
+    csv_header,
+    detect_format,
+    export_chunk,
+    export_query,
+    import_books,
+    iter_records,
+)
+from .database import SessionLocal
+from .init_db import init_db, seed_books
+from .pagination import STREAM_CHUNK_SIZE
+from .stats import rebuild_stats
+from .sync import SYNC_TOMBSTONE_DAYS, prune_tombstones
+
+
+def _open(path, mode):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if "r" in mode else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def import_command(args):
+    format = args.format or detect_format(args.path)
+    if format is None:
+        sys.exit("Cannot tell the format from the file name, pass --format")
+    db = SessionLocal()
+    try:
+        with _open(args.path, "r") as stream:
+            report = import_books(db, iter_records(stream, format), args.chunk_size)
+    finally:
+        db.close()
+    print(
+        f"imported {report.imported}, duplicates {report.duplicates}, invalid {report.invalid}"
+    )
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['error']}", file=sys.stderr)
+
+
+def export_command(args):
+    format = args.format or detect_format(args.path) or "ndjson"
+    db = SessionLocal()
+    try:
+        with _open(args.path, "w") as stream:
+            if format == "csv":
+                stream.write(csv_header())
+            result = db.execute(
+                export_query().execution_options(stream_results=True, yield_per=STREAM_CHUNK_SIZE)
+            )
+            for rows in result.partitions():
+                stream.write(export_chunk(rows, format))
+    finally:
+        db.close()
+
+
+def init_db_command(args):
+    init_db()
+    if args.seed:
+        seed_books()
+
+
+def seed_command(args):
+    seed_books()
+
+
+def gc_blobs_command(args):
+    db = SessionLocal()
+    try:
+        removed = blob_store.collect_garbage(db)
+    finally:
+        db.close()
+    print(f"removed {removed} unreferenced blob(s)")
+
+
+def prune_tombstones_command(args):
+    db = SessionLocal()
+    try:
+        removed = prune_tombstones(db, args.days)
+    finally:
+        db.close()
+    print(f"removed {removed} tombstone(s)")
+
+
+def rebuild_stats_command(args):
+    db = SessionLocal()
+    try:
+        rebuild_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = commands.add_parser(
+        "init-db", help="apply migrations and build the search index; run once per deploy"
+    )
+    init_parser.add_argument("--seed", action="store_true", help="also load the sample books")
+    init_parser.set_defaults(handler=init_db_command)
+
+    seed_parser = commands.add_parser("seed-books", help="load the sample books if missing")
+    seed_parser.set_defaults(handler=seed_command)
+
+    stats_parser = commands.add_parser(
+        "rebuild-stats", help="recompute the reading statistics from the shelves"
+    )
+    stats_parser.set_defaults(handler=rebuild_stats_command)
+
+    gc_parser = commands.add_parser("gc-blobs", help="delete stored book files no book uses")
+    gc_parser.set_defaults(handler=gc_blobs_command)
+
+    prune_parser = commands.add_parser(
+        "prune-tombstones", help="forget deletions older than --days; older clients resync fully"
+    )
+    prune_parser.add_argument("--days", type=int, default=SYNC_TOMBSTONE_DAYS)
+    prune_parser.set_defaults(handler=prune_tombstones_command)
+
+    import_parser = commands.add_parser("import-books", help="bulk load books from CSV/NDJSON")
+    import_parser.add_argument("path", help="input file, or - for stdin")
+    import_parser.add_argument("--format", choices=FORMATS)
+    import_parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    import_parser.set_defaults(handler=import_command)
+
+    export_parser = commands.add_parser("export-books", help="stream the catalog to CSV/NDJSON")
+    export_parser.add_argument("path", help="output file, or - for stdout")
+    export_parser.add_argument("--format", choices=FORMATS)
+    export_parser.set_defaults(handler=export_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
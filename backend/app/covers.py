@@ -0,0 +1,299 @@
+"""Book covers fetched once from their external hosts and served from disk.
+
+A cover_url is fetched at most once while it stays cached. The original is
+stored under the SHA-256 of its bytes and every resized variant under that
+hash plus the size name, so books sharing a cover share its files and a
+file's name doubles as its strong ETag. Small ref files map the hash of a
+cover_url to its blob; changing a book's cover_url fetches the new image.
+A failed fetch is remembered for COVER_FAILURE_TTL seconds, so a dead or
+slow host is not asked again on every request. Only http(s) URLs whose host
+resolves to public addresses are fetched, redirects included, so a
+cover_url cannot make the server reach its own network.
+
+The directory is capped at COVER_CACHE_MAX_BYTES. Hits bump a file's access
+time, and a write that pushes the total over the cap deletes the least
+recently used files. Thumbnails need Pillow; without it every size is the
+original image.
+"""
+import asyncio
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .metrics import REGISTRY
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+COVER_CACHE_DIR = os.getenv("COVER_CACHE_DIR", "./covers")
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# largest image accepted from a cover host
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(10 * 1024 * 1024)))
+COVER_FETCH_TIMEOUT = float(os.getenv("COVER_FETCH_TIMEOUT", "10"))
+COVER_MAX_AGE = int(os.getenv("COVER_MAX_AGE", str(7 * 24 * 3600)))
+COVER_FAILURE_TTL = float(os.getenv("COVER_FAILURE_TTL", "60"))
+COVER_MAX_REDIRECTS = 5
+
+# longest edge in pixels; None serves the original
+COVER_SIZES = {"small": 200, "medium": 400, "large": 800, "original": None}
+# eviction trims the cache to this fraction of the cap, not just under it
+EVICT_TO = 0.9
+
+# thumbnails keep the original's format where Pillow can write it
+_THUMBNAIL_FORMATS = {
+    "image/jpeg": ("JPEG", "image/jpeg"),
+    "image/png": ("PNG", "image/png"),
+    "image/webp": ("WEBP", "image/webp"),
+}
+
+cover_requests = REGISTRY.counter(
+    "cover_cache_total", "Cover requests, by whether the cover was on disk or fetched"
+)
+
+
+class CoverFetchError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class FetchedCover:
+    content: bytes
+    media_type: str
+
+
+@dataclass(frozen=True)
+class CachedCover:
+    path: str
+    etag: str
+    media_type: str
+
+
+async def _resolve(host: str, port: int):
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    # link-local IPv6 addresses carry a "%<interface>" suffix
+    return [info[4][0].split("%")[0] for info in infos]
+
+
+async def _public_address(url) -> str:
+    """An address to fetch `url` from, if its host only resolves to public ones."""
+    if url.scheme not in ("http", "https"):
+        raise CoverFetchError(f"{url}: only http and https covers are fetched")
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        addresses = [ipaddress.ip_address(address) for address in await _resolve(url.host, port)]
+    except (OSError, UnicodeError, ValueError) as exc:
+        raise CoverFetchError(f"{url}: {exc}") from exc
+    if not addresses or not all(
+        address.is_global and not address.is_multicast for address in addresses
+    ):
+        raise CoverFetchError(f"{url}: not a public address")
+    return str(addresses[0])
+
+
+async def http_fetcher(url: str, transport=None) -> FetchedCover:
+    """Download `url` if it is an image no larger than COVER_MAX_BYTES."""
+    import httpx
+
+    try:
+        target = httpx.URL(url)
+        async with httpx.AsyncClient(timeout=COVER_FETCH_TIMEOUT, transport=transport) as client:
+            for _ in range(COVER_MAX_REDIRECTS + 1):
+                # connect to the address that was checked, not to whatever a
+                # second lookup returns; TLS still verifies the real host name
+                request = client.build_request(
+                    "GET",
+                    target.copy_with(host=await _public_address(target)),
+                    headers={"Host": target.netloc.decode("ascii")},
+                    extensions={"sni_hostname": target.host},
+                )
+                response = await client.send(request, stream=True)
+                try:
+                    if response.is_redirect:
+                        target = target.join(response.headers["location"])
+                        continue
+                    media_type = response.headers.get("content-type", "").split(";")[0].strip()
+                    if response.status_code != 200 or not media_type.startswith("image/"):
+                        raise CoverFetchError(f"{url}: {response.status_code} {media_type}")
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > COVER_MAX_BYTES:
+                            raise CoverFetchError(f"{url}: larger than {COVER_MAX_BYTES} bytes")
+                        chunks.append(chunk)
+                    return FetchedCover(b"".join(chunks), media_type)
+                finally:
+                    await response.aclose()
+    except (httpx.HTTPError, httpx.InvalidURL) as exc:
+        # InvalidURL (a malformed stored cover_url) is not an HTTPError
+        raise CoverFetchError(f"{url}: {exc}") from exc
+    raise CoverFetchError(f"{url}: more than {COVER_MAX_REDIRECTS} redirects")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}-{threading.get_ident()}.partial"
+    with open(partial, "wb") as stream:
+        stream.write(data)
+    os.replace(partial, path)
+
+
+def _touch(path):
+    # access time drives eviction; mtime stays put for Last-Modified
+    os.utime(path, (time.time(), os.stat(path).st_mtime))
+
+
+class CoverCache:
+    def __init__(
+        self,
+        directory=COVER_CACHE_DIR,
+        max_bytes=COVER_CACHE_MAX_BYTES,
+        fetcher=http_fetcher,
+        failure_ttl=COVER_FAILURE_TTL,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher
+        # cover_url digest -> why its last fetch failed
+        self._failures = TTLCache(maxsize=10_000, ttl=failure_ttl)
+        # one fetch per cover_url at a time within this process
+        self._locks = weakref.WeakValueDictionary()
+        self._size_lock = threading.Lock()
+        self._bytes = None  # bytes on disk, counted on first write
+
+    def _path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    async def get(self, url: str, size: str) -> CachedCover:
+        key = _digest(url.encode())
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            original = await run_in_threadpool(self._lookup, key)
+            if original is None:
+                failure = self._failures.get(key)
+                if failure is not None:
+                    cover_requests.inc(outcome="failed")
+                    raise CoverFetchError(failure)
+                cover_requests.inc(outcome="fetch")
+                try:
+                    fetched = await self.fetcher(url)
+                except CoverFetchError as exc:
+                    self._failures.set(key, str(exc))
+                    raise
+                original = await run_in_threadpool(self._store_original, key, fetched)
+            else:
+                cover_requests.inc(outcome="hit")
+            return await run_in_threadpool(self._variant, original, size)
+
+    def _lookup(self, key):
+        ref = self._path(f"{key}.ref")
+        try:
+            with open(ref) as stream:
+                digest, media_type = stream.read().split()
+            path = self._path(digest)
+            _touch(path)
+            _touch(ref)
+        except (FileNotFoundError, ValueError):
+            return None
+        return CachedCover(path=path, etag=digest, media_type=media_type)
+
+    def _store_original(self, key, fetched: FetchedCover):
+        digest = _digest(fetched.content)
+        path = self._path(digest)
+        written = 0
+        if not os.path.exists(path):
+            _write_atomic(path, fetched.content)
+            written += len(fetched.content)
+        ref = f"{digest} {fetched.media_type}".encode()
+        _write_atomic(self._path(f"{key}.ref"), ref)
+        self._written(written + len(ref))
+        return CachedCover(path=path, etag=digest, media_type=fetched.media_type)
+
+    def _variant(self, original: CachedCover, size):
+        edge = COVER_SIZES[size]
+        if edge is None or Image is None:
+            return original
+        image_format, media_type = _THUMBNAIL_FORMATS.get(original.media_type, ("PNG", "image/png"))
+        name = f"{original.etag}-{size}"
+        path = self._path(name)
+        try:
+            _touch(path)
+        except FileNotFoundError:
+            try:
+                thumbnail = _thumbnail(original.path, edge, image_format)
+            except (OSError, Image.DecompressionBombError) as exc:
+                logger.warning("cannot resize cover %s: %s", original.path, exc)
+                return original
+            _write_atomic(path, thumbnail)
+            self._written(len(thumbnail))
+        return CachedCover(path=path, etag=name, media_type=media_type)
+
+    def _written(self, nbytes):
+        with self._size_lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            else:
+                self._bytes += nbytes
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_atime, stat.st_size, path
+
+    def evict(self, target_bytes):
+        """Delete least recently used files until at most `target_bytes` remain."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._size_lock:
+            self._bytes = total
+        return total
+
+
+def _thumbnail(path, edge, image_format):
+    with Image.open(path) as image:
+        image.thumbnail((edge, edge))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, image_format)
+    return output.getvalue()
+
+
+cover_cache = CoverCache()
+
+
+def get_cover_cache() -> CoverCache:
+    return cover_cache
@@ -1,21 +1,120 @@
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
+from .db_config import configure_engine, engine_options
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# "sync" serves requests with a threadpool-bound Session, "async" with an
+# AsyncSession on the aiosqlite/asyncpg drivers.
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=driver)
+
+
+# The sync engine is always available: init_db, seeding and the CLI use it.
+engine = configure_engine(create_engine(DATABASE_URL, **engine_options(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    async_engine = configure_engine(
+        create_async_engine(
+            async_database_url(DATABASE_URL),
+            **engine_options(DATABASE_URL, name="async", is_async=True),
+        ),
+        name="async",
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, class_=AsyncSession
+    )
+
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+else:
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run `fn(session, *args)` without blocking the event loop.
+
+    Route bodies are written once against the sync Session API. An
+    AsyncSession runs them through `run_sync` on its async driver, a plain
+    Session runs them in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def sync_bind(db):
+    """A sync engine for `db`'s database, for threadpool-only work like imports."""
+    if isinstance(db, AsyncSession):
+        return engine
+    return db.get_bind()
+
+
+@asynccontextmanager
+async def detached_session(db):
+    """A fresh session on the same bind, for work that outlives the request."""
+    if isinstance(db, AsyncSession):
+        async with AsyncSession(db.bind) as session:
+            yield session
+        return
+    session = Session(bind=db.get_bind())
     try:
-        yield db
+        yield session
     finally:
-        db.close()
+        await run_in_threadpool(session.close)
+
+
+async def release_session(db):
+    """Give `db`'s connection back to the pool, for a request that stays open."""
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def stream_partitions(session, stmt, size):
+    """Yield lists of rows from a server-side cursor, `size` rows at a time."""
+    stmt = stmt.execution_options(stream_results=True, yield_per=size)
+    if isinstance(session, AsyncSession):
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+        return
+    result = await run_in_threadpool(session.execute, stmt)
+    partitions = result.partitions()
+    while True:
+        partition = await run_in_threadpool(next, partitions, None)
+        if partition is None:
+            break
+        yield partition
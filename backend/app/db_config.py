@@ -0,0 +1,127 @@
+"""Dialect-aware engine settings: pool sizing, SQLite pragmas and pool metrics."""
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .instrumentation import instrument_engine
+from .metrics import REGISTRY
+
+SQLITE_PRAGMAS = {
+    # readers no longer block the writer and vice versa
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # safe with WAL: a crash can lose the last commits but never corrupts
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # wait for the write lock instead of failing with "database is locked"
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # negative values are KiB: 64 MiB page cache per connection
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+pool_checkouts = REGISTRY.counter(
+    "db_pool_checkouts_total", "Connections handed out by the pool"
+)
+pool_checkout_seconds = REGISTRY.counter(
+    "db_pool_checkout_seconds_total", "Time spent waiting for a pooled connection"
+)
+pool_checkout_failures = REGISTRY.counter(
+    "db_pool_checkout_failures_total", "Checkouts that timed out or failed to connect"
+)
+pool_checked_out = REGISTRY.gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool"
+)
+pool_connects = REGISTRY.counter(
+    "db_pool_connections_total", "New DBAPI connections opened by the pool"
+)
+
+
+class _TimedCheckout:
+    """Pool mixin that records how long each checkout waited."""
+
+    def connect(self):
+        label = self._orig_logging_name or "default"
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            pool_checkout_failures.inc(engine=label)
+            raise
+        finally:
+            pool_checkout_seconds.inc(time.perf_counter() - started, engine=label)
+        return connection
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(database_url, name="sync", is_async=False):
+    """Keyword arguments for create_engine / create_async_engine."""
+    url = make_url(database_url)
+    options = {"pool_logging_name": name}
+    if url.get_backend_name() == "sqlite":
+        if not is_async:
+            # sessions hop between threadpool threads
+            options["connect_args"] = {"check_same_thread": False}
+        if _is_memory_sqlite(url):
+            return options
+        options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    else:
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    options["poolclass"] = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine, name="sync"):
+    """Install pragmas, pool metrics and query instrumentation on an engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    instrument_engine(sync_engine)
+    if sync_engine.dialect.name == "sqlite" and not _is_memory_sqlite(sync_engine.url):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        pool_connects.inc(engine=name)
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts.inc(engine=name)
+        pool_checked_out.inc(engine=name)
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        pool_checked_out.dec(engine=name)
+
+    return engine
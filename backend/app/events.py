@@ -0,0 +1,259 @@
+"""In-process pub/sub for catalog and shelf changes, pushed to clients.
+
+Writers call `event_bus.publish(topic, type, data)` after their commit, from
+the event loop or a threadpool worker. Every event is encoded once and then
+handed to each subscriber's bounded queue on the subscriber's own loop, so
+publishing never blocks or waits on a slow client. A subscriber whose queue
+fills up is dropped and told to ``resync``: reload with plain GETs, then
+subscribe again.
+
+With a shared cache backend (several workers), every event is also
+appended to a log in that backend under a shared sequence number, which is
+then the event's id everywhere. While a worker has subscribers, a thread
+tails the log and delivers the other workers' events. An event that left
+the log before it was read (EVENT_LOG_TTL) makes every local subscriber
+resync.
+
+Topics are ``catalog`` (book created, updated, deleted) and ``user:<id>``
+(that user's shelf changes).
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from .cache import NamespacedCache
+from .metrics import REGISTRY
+from .responses import dumps
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+# seconds of silence before a connection gets a keep-alive
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", "15"))
+MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "10000"))
+# how often a worker reads the other workers' events from the shared log
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "0.2"))
+EVENT_LOG_TTL = float(os.getenv("EVENT_LOG_TTL", "60"))
+
+CATALOG = "catalog"
+
+events_published = REGISTRY.counter("events_published_total", "Events published, by type")
+events_dropped = REGISTRY.counter(
+    "events_subscribers_dropped_total", "Subscribers dropped because their queue was full"
+)
+event_subscribers = REGISTRY.gauge("event_subscribers", "Open event subscriptions")
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: bytes  # JSON
+
+    def sse(self) -> bytes:
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (self.id, self.type.encode(), self.data)
+
+    def json(self) -> str:
+        return (b'{"id":%d,"type":"%s","data":%s}' % (self.id, self.type.encode(), self.data)).decode()
+
+
+RESYNC = Event(0, "resync", b"{}")
+
+
+class Subscription:
+    """One client's bounded queue of events for some topics."""
+
+    def __init__(self, bus, topics, maxsize):
+        self.bus = bus
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def _deliver(self, event):
+        # runs on self.loop
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            events_dropped.inc()
+            self.resync()
+
+    def resync(self):
+        # runs on self.loop
+        if self.closed:
+            return
+        self.close()
+        # nothing queued matters once the client reloads
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+
+    async def next(self, timeout=EVENT_HEARTBEAT):
+        """The next event, or None after `timeout` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.bus.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class EventBus:
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS, log=None, poll_interval=EVENT_POLL_INTERVAL):
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self._log = NamespacedCache("events", ttl=EVENT_LOG_TTL) if log is None else log
+        self._lock = threading.Lock()
+        self._topics = defaultdict(set)
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._tailer = None  # (pid, thread) reading the shared log
+        self._missing = None  # a sequence number not found in the log last time
+
+    @property
+    def _origin(self):
+        # tells this bus's own log entries apart, also across a fork
+        return f"{os.getpid()}:{id(self)}"
+
+    def subscribe(self, topics, maxsize=EVENT_QUEUE_SIZE) -> Subscription:
+        """Subscribe from inside the event loop that will read the events."""
+        subscription = Subscription(self, topics, maxsize)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers(f"{self.max_subscribers} subscribers already")
+            self._count += 1
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+            if self._log.backend.shared:
+                self._start_tailer()
+        event_subscribers.set(self._count)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            removed = False
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self._topics[topic]
+            if removed:
+                self._count -= 1
+        event_subscribers.set(self._count)
+
+    def publish(self, topic, type, data):
+        """Queue `data` (JSON-serializable) for every subscriber of `topic`.
+
+        Safe to call from any thread; returns without waiting for delivery.
+        """
+        events_published.inc(type=type)
+        if self._log.backend.shared:
+            payload = dumps(data)
+            event_id = self._log.incr("seq")
+            self._log.set(event_id, (self._origin, topic, type, payload))
+            self._fanout(topic, Event(event_id, type, payload))
+            return
+        with self._lock:
+            event_id = next(self._ids)
+            if not self._topics.get(topic):
+                return
+        self._fanout(topic, Event(event_id, type, dumps(data)))
+
+    def _fanout(self, topic, event):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        self._send(subscribers, _deliver_all, event)
+
+    def _resync_all(self):
+        with self._lock:
+            subscribers = {s for topic in self._topics.values() for s in topic}
+        self._send(subscribers, _resync_each)
+
+    def _send(self, subscribers, callback, *args):
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, batch in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(callback, batch, *args)
+            except RuntimeError:
+                # the loop is closed, e.g. a test client that went away
+                for subscription in batch:
+                    self.unsubscribe(subscription)
+
+    def _start_tailer(self):
+        # called with self._lock held
+        if self._tailer is not None and self._tailer[0] == os.getpid():
+            return
+        cursor = self._log.get("seq", 0)
+        thread = threading.Thread(target=self._tail, args=(cursor,), name="event-log", daemon=True)
+        self._tailer = (os.getpid(), thread)
+        thread.start()
+
+    def _tail(self, cursor):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._count:
+                    self._tailer = None
+                    return
+            cursor = self._read_log(cursor)
+
+    def _read_log(self, cursor):
+        """Deliver the other workers' events after `cursor`; returns the new cursor."""
+        last = self._log.get("seq", 0)
+        if last < cursor:
+            # the log was cleared, e.g. by a server restart
+            return last
+        while cursor < last:
+            entry = self._log.get(cursor + 1)
+            if entry is None:
+                if self._missing != cursor + 1:
+                    # published but maybe not written yet; look again next time
+                    self._missing = cursor + 1
+                    return cursor
+                # gone from the log: the subscribers cannot know what they missed
+                self._resync_all()
+            else:
+                origin, topic, type, payload = entry
+                if origin != self._origin:
+                    self._fanout(topic, Event(cursor + 1, type, payload))
+            self._missing = None
+            cursor += 1
+        return cursor
+
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription._deliver(event)
+
+
+def _resync_each(subscriptions):
+    for subscription in subscriptions:
+        subscription.resync()
+
+
+event_bus = EventBus()
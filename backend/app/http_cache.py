@@ -0,0 +1,94 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+
+from fastapi import Request, Response
+
+from .cache import NamespacedCache, TTLCache
+from .responses import dumps
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+# how long browsers/CDNs may reuse a catalog response without revalidating
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "30"))
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    etag: str
+    body: bytes
+    headers: dict = field(default_factory=dict)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == bare
+        for candidate in if_none_match.split(",")
+    )
+
+
+class ResponseCache:
+    """Serialized catalog responses keyed by catalog generation / book version.
+
+    Every librarian write bumps the catalog generation, so list responses
+    cached under an older generation are never served again. Single-book
+    responses are keyed by that book's own version and survive writes to
+    other books.
+
+    Bodies stay in the worker that rendered them; the generation and version
+    counters live in the shared cache backend, so a write handled by one
+    worker retires the cached responses of every worker.
+    """
+
+    def __init__(self, maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL):
+        self._bodies = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = NamespacedCache("catalog")
+
+    @property
+    def generation(self):
+        return self._versions.get("generation", 0)
+
+    def catalog_key(self, *parts):
+        return ("catalog", self.generation) + parts
+
+    def book_key(self, book_id: int):
+        return ("book", book_id, self._versions.get(f"book:{book_id}", 0))
+
+    def get(self, key):
+        return self._bodies.get(key)
+
+    def store(self, key, content, headers=None) -> CachedBody:
+        body = dumps(content)
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        entry = CachedBody(etag=etag, body=body, headers=headers or {})
+        self._bodies.set(key, entry)
+        return entry
+
+    def invalidate_catalog(self):
+        self._versions.incr("generation")
+
+    def invalidate_book(self, book_id: int):
+        self._versions.incr(f"book:{book_id}")
+        self._versions.incr("generation")
+
+    def clear(self):
+        self._bodies.clear()
+
+
+def cached_response(request: Request, entry: CachedBody, max_age=CATALOG_MAX_AGE):
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+        **entry.headers,
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
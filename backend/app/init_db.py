@@ -1,8 +1,15 @@
-from .database import Base, engine, SessionLocal
-from .models_db import Book
+from .catalog_io import import_books
+from .database import engine, SessionLocal
+from .migrations import run_migrations
+from .search import search_index
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        search_index.ensure(db)
+    finally:
+        db.close()
 
 def seed_books():
     db = SessionLocal()
@@ -73,11 +80,7 @@ def seed_books():
         },
     ]
 
-    for b in books:
-        existing = db.query(Book).filter(Book.title == b["title"]).first()
-        if not existing:
-            book = Book(**b)
-            db.add(book)
-
-    db.commit()
-    db.close()
+    try:
+        import_books(db, enumerate(books, start=1))
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+"""Per-request latency and SQL accounting.
+
+`InstrumentationMiddleware` opens a `RequestStats` for each HTTP request in
+a context variable. Engine hooks (installed by `instrument_engine`) add
+every statement that runs while it is open, including the ones run from the
+threadpool or through AsyncSession, because both copy the request context.
+At the end of the request the numbers go to /metrics, and a
+``Server-Timing`` header reports them to the client.
+"""
+import logging
+import os
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# a request running the same statement more than this many times is an N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+request_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by method, route and status"
+)
+request_db_seconds = REGISTRY.histogram(
+    "http_request_db_seconds", "Time spent in SQL per request, by route"
+)
+request_queries = REGISTRY.histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request, by route",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+slow_queries = REGISTRY.counter(
+    "db_slow_queries_total", f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)"
+)
+n_plus_one = REGISTRY.counter(
+    "db_n_plus_one_total", "Requests that repeated one statement above N_PLUS_ONE_THRESHOLD"
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements", "started")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = StatementCounter()
+        self.started = time.perf_counter()
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold=None):
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(sql, count) for sql, count in self.statements.items() if count > threshold]
+
+    def server_timing(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries", '
+            f"app;dur={total_ms:.2f}"
+        )
+
+
+_current: ContextVar = ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc()
+        logger.warning("slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; without this its
+    # start time would stay on the pooled connection and skew later timings
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started and started[-1][0] is exception_context.execution_context:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Count and time every statement `engine` (sync or async facade) runs."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+    return engine
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    # unmatched paths share one label so scanners can't blow up cardinality
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app, server_timing=SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._finish(scope, stats, status_code)
+
+    @staticmethod
+    def _finish(scope, stats, status_code):
+        route = _route_label(scope)
+        elapsed = time.perf_counter() - stats.started
+        request_seconds.observe(
+            elapsed, method=scope["method"], route=route, status=str(status_code)
+        )
+        request_db_seconds.observe(stats.db_seconds, route=route)
+        request_queries.observe(stats.queries, route=route)
+        repeated = stats.repeated()
+        if repeated:
+            n_plus_one.inc(route=route)
+        for statement, count in repeated:
+            logger.warning(
+                "possible N+1 on %s %s: statement ran %d times: %s",
+                scope["method"], route, count, statement,
+            )
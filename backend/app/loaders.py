@@ -0,0 +1,103 @@
+"""Request-scoped batching of lookups by key, in the DataLoader style.
+
+Code that needs one row by key awaits ``loader.load(key)``. Keys asked for
+in the same turn of the event loop (e.g. by several coroutines under one
+``asyncio.gather``) are collected and fetched by the loader's batch
+function in one query. A key is fetched at most once per request; asking
+again returns the same result.
+
+Loaders hang off the request (`get_loaders`), so nothing outlives the
+request whose session read it. All loaders of a request share its session
+and run their batches one at a time on it.
+"""
+import asyncio
+
+from fastapi import Depends, Request
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .database import get_db, run_db
+from .models_db import Book
+from .schemas.book_schema import BOOK_FIELDS
+
+# keys per query; well under SQLite's bound-parameter limit
+MAX_BATCH = 500
+
+
+class Loader:
+    """Batches and memoizes `batch(session, keys) -> {key: value}` for one request."""
+
+    def __init__(self, db, batch, lock, max_batch=MAX_BATCH):
+        self.db = db
+        self.batch = batch
+        self.max_batch = max_batch
+        self._lock = lock
+        self._results = {}  # key -> future of its value, None when missing
+        self._pending = []
+        self._tasks = set()  # dispatches in flight, kept from garbage collection
+
+    def load(self, key) -> asyncio.Future:
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._results[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                # runs once everything already scheduled has asked for its keys
+                loop.call_soon(self._schedule)
+        return future
+
+    def _schedule(self):
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def load_many(self, keys) -> dict:
+        """`{key: value}` for the `keys` that were found, in `keys` order."""
+        keys = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(key) for key in keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def _dispatch(self):
+        keys, self._pending = self._pending, []
+        async with self._lock:
+            for start in range(0, len(keys), self.max_batch):
+                chunk = keys[start:start + self.max_batch]
+                try:
+                    found = await run_db(self.db, self.batch, chunk)
+                except Exception as exc:
+                    for key in keys[start:]:
+                        # not memoized: a later load may try again
+                        self._results.pop(key).set_exception(exc)
+                    return
+                for key in chunk:
+                    self._results[key].set_result(found.get(key))
+
+
+class Loaders:
+    """The loaders of one request, one per batch function, made on first use."""
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = asyncio.Lock()
+        self._loaders = {}
+
+    def __call__(self, batch) -> Loader:
+        loader = self._loaders.get(batch)
+        if loader is None:
+            loader = self._loaders[batch] = Loader(self.db, batch, self._lock)
+        return loader
+
+
+def get_loaders(request: Request, db: Session = Depends(get_db)) -> Loaders:
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = request.state.loaders = Loaders(db)
+    return loaders
+
+
+def books_by_id(db: Session, ids) -> dict:
+    """Catalog fields of the books with these `ids`, by id, in one query."""
+    columns = [getattr(Book, name) for name in BOOK_FIELDS]
+    rows = db.execute(select(*columns).where(Book.id.in_(ids)))
+    return {row.id: row._asdict() for row in rows}
@@ -1,29 +1,103 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .auth import router as auth_router
 from fastapi.middleware.cors import CORSMiddleware
-from .init_db import init_db
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from . import database
+from .admission import ADMISSION_ENABLED, AdmissionMiddleware
+from .auth import router as auth_router
+from .init_db import init_db, seed_books
+from .instrumentation import InstrumentationMiddleware
+from .metrics import shared_metrics
+from .passwords import password_hasher
+from .progress import PROGRESS_WRITE_MODE, progress_buffer
+from .responses import FastJSONResponse
 from .routes.books import router as books_router
+from .routes.events import router as events_router
+from .routes.files import router as files_router
+from .routes.stats import router as stats_router
+from .routes.sync import router as sync_router
 from .routes.users import router as user_router
-from .init_db import seed_books
+from .suggest import SUGGEST_PRELOAD, book_suggestions
+
+logger = logging.getLogger(__name__)
+
+# Schema setup is a deploy step (`python -m app.cli init-db --seed`), not
+# something every worker repeats. INIT_DB_ON_STARTUP=1 brings it back for a
+# single-process dev server.
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "0") == "1"
+
+
+def _init_and_seed():
+    init_db()
+    seed_books()
+
+
+def _load_suggestions():
+    with database.SessionLocal() as db:
+        try:
+            book_suggestions.load(db)
+        except SQLAlchemyError:
+            # e.g. no schema yet; /books/suggest loads the index on first use
+            logger.warning("typeahead index not preloaded", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if INIT_DB_ON_STARTUP:
+        await run_in_threadpool(_init_and_seed)
+    if SUGGEST_PRELOAD:
+        await run_in_threadpool(_load_suggestions)
+    if PROGRESS_WRITE_MODE == "buffered":
+        progress_buffer.start()
+    shared_metrics.start()
+    yield
+    await shared_metrics.stop()
+    # buffered progress must reach the database before the engines go away
+    await progress_buffer.stop()
+    await run_in_threadpool(password_hasher.shutdown)
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+    database.engine.dispose()
+
 
-app = FastAPI()
+def create_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+    app.include_router(auth_router)
+    app.include_router(books_router, prefix="/books")
+    app.include_router(files_router, prefix="/books")
+    app.include_router(user_router)
+    app.include_router(stats_router)
+    app.include_router(events_router)
+    app.include_router(sync_router)
+    if ADMISSION_ENABLED:
+        # inside CORS, so browsers can read 429/503 answers
+        app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "Retry-After"],
+    )
+    # added last so it is outermost and times the whole stack
+    app.add_middleware(InstrumentationMiddleware)
 
-app.include_router(auth_router)
-app.include_router(books_router, prefix="/books")
-app.include_router(user_router)
+    @app.get("/")
+    def read_root():
+        return {"message": "Welcome to the Library API!"}
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return shared_metrics.render()
 
-init_db()
-seed_books()
+    return app
 
 
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to the Library API!"}
+app = create_app()
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+from starlette.concurrency import run_in_threadpool
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# seconds; spans a cached hit (~1 ms) to a slow bulk export
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# how often each worker copies its metrics to the shared cache backend
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self, samples=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples() if samples is None else samples:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram, rendered as _bucket/_sum/_count series."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, amount, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            state[0][bisect_left(self.buckets, amount)] += 1
+            state[1] += amount
+
+    def value(self, **labels):
+        """Number of observations."""
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def total(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = key + (("le", _format_bound(bound)),)
+                    samples.append((self.name + "_bucket", labels, cumulative))
+                samples.append((self.name + "_sum", key, total))
+                samples.append((self.name + "_count", key, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, help_text, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **options)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def snapshot(self):
+        """``(totals, gauges)``: the samples of counters and histograms, and of gauges, by metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        totals, gauges = {}, {}
+        for metric in metrics:
+            (gauges if metric.kind == "gauge" else totals)[metric.name] = metric.samples()
+        return totals, gauges
+
+    def render(self, samples=None):
+        """Prometheus text exposition format, of `samples` by metric if given."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(None if samples is None else samples.get(metric.name, [])))
+        return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(totals, gauges):
+    """Sum counters and histograms over workers; give each worker's gauges a ``worker`` label.
+
+    `totals` is a list of `Registry.snapshot()` totals, `gauges` maps a
+    worker's slot to its gauges.
+    """
+    merged = {}
+    for snapshot in totals:
+        for name, samples in snapshot.items():
+            values = merged.setdefault(name, {})
+            for sample, labels, value in samples:
+                values[(sample, labels)] = values.get((sample, labels), 0) + value
+    for slot, snapshot in gauges.items():
+        for name, samples in snapshot.items():
+            values = merged.setdefault(name, {})
+            for sample, labels, value in samples:
+                values[(sample, labels + (("worker", str(slot)),))] = value
+    return {
+        name: [(sample, labels, value) for (sample, labels), value in values.items()]
+        for name, values in merged.items()
+    }
+
+
+class SharedMetrics:
+    """/metrics for all workers at once, through a shared cache backend.
+
+    Each worker takes a slot number and stores a snapshot of its registry
+    there every METRICS_PUBLISH_INTERVAL seconds and whenever it renders.
+    Counters and histograms of workers that exited stay, so totals never go
+    back; their gauges expire after a few intervals. With the memory
+    backend (one worker) this is just the registry.
+    """
+
+    def __init__(self, registry, interval=METRICS_PUBLISH_INTERVAL, backend=None):
+        self.registry = registry
+        self.interval = interval
+        self._totals = cache.NamespacedCache("metrics", backend=backend)
+        self._gauges = cache.NamespacedCache("metrics-gauges", ttl=3 * interval, backend=backend)
+        self._slot = None  # (pid, slot); a forked worker takes its own
+        self._task = None
+
+    @property
+    def shared(self):
+        return self._totals.backend.shared
+
+    def _own_slot(self):
+        if self._slot is None or self._slot[0] != os.getpid():
+            self._slot = (os.getpid(), self._totals.incr("workers"))
+        return self._slot[1]
+
+    def publish(self):
+        slot = self._own_slot()
+        totals, gauges = self.registry.snapshot()
+        self._totals.set(slot, totals)
+        self._gauges.set(slot, gauges)
+
+    def render(self):
+        if not self.shared:
+            return self.registry.render()
+        self.publish()
+        slots = range(1, self._totals.get("workers", 0) + 1)
+        totals = [snapshot for snapshot in map(self._totals.get, slots) if snapshot]
+        gauges = {slot: self._gauges.get(slot) for slot in slots}
+        return self.registry.render(
+            merge_snapshots(totals, {slot: snapshot for slot, snapshot in gauges.items() if snapshot})
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.publish)
+            except Exception:
+                logger.exception("publishing metrics failed; will retry")
+
+    def start(self):
+        if self.shared and self._task is None:
+            # take a slot now, so a scrape sees this worker from the start
+            self.publish()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # the final counts of this worker
+            await run_in_threadpool(self.publish)
+
+
+REGISTRY = Registry()
+shared_metrics = SharedMetrics(REGISTRY)
@@ -0,0 +1,62 @@
+"""Minimal in-repo schema migration runner.
+
+Each ``vNNNN_<name>.py`` module in this package defines ``upgrade(conn)``.
+Applied versions are recorded in ``schema_migrations``; every pending
+migration runs in its own transaction, in version order. Migrations must
+tolerate a schema that ``Base.metadata.create_all`` already brought up to
+date (the test suite and fresh databases start that way). They spell out
+the schema as it was at their version instead of using app.models_db, so
+later model changes cannot alter what an old migration does.
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+
+_MODULE_RE = re.compile(r"^v(\d{4})_(\w+)$")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def discover():
+    """Return ``[(version, name, module)]`` sorted by version."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append((int(match.group(1)), match.group(2), module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def run_migrations(engine):
+    """Apply pending migrations and return the versions that ran."""
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    ran = []
+    for version, name, module in discover():
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(
+                schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.now(timezone.utc)
+                )
+            )
+        ran.append(version)
+    return ran
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Enum, ForeignKey, Integer, MetaData, String, Table
+
+# the schema as it existed before migrations were introduced, frozen here so
+# later model changes are left to the migrations that make them
+metadata = MetaData()
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, nullable=False),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("password", String, nullable=False),
+    Column("role", String, nullable=False),
+)
+
+books = Table(
+    "books",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, index=True),
+    Column("author", String),
+    Column("year", Integer),
+    Column("description", String, nullable=True),
+    Column("cover_url", String, nullable=True),
+    Column("pdf_url", String, nullable=True),
+)
+
+user_books = Table(
+    "user_books",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("book_id", Integer, ForeignKey("books.id")),
+    # stored by member name, like models_db.ReadingStatus
+    Column("status", Enum("unread", "reading", "read", name="readingstatus")),
+    Column("progress", Integer),
+    Column("current_page", Integer),
+    Column("total_pages", Integer),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,20 @@
+from sqlalchemy import text
+
+# the indexes as this migration introduced them
+INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_books_user_book ON user_books (user_id, book_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_books_book_id ON user_books (book_id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author ON books (author)",
+)
+
+
+def upgrade(conn):
+    # the old read-then-insert could race; keep the oldest row of each pair
+    conn.execute(
+        text(
+            "DELETE FROM user_books WHERE id NOT IN "
+            "(SELECT MIN(id) FROM user_books GROUP BY user_id, book_id)"
+        )
+    )
+    for statement in INDEXES:
+        conn.execute(text(statement))
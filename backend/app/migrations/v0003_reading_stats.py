@@ -0,0 +1,58 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, select, text
+
+# the tables as this migration introduced them
+metadata = MetaData()
+
+
+def _totals():
+    return [
+        Column(name, Integer, nullable=False, default=0)
+        for name in ("books", "unread", "reading", "read", "pages_read", "total_pages")
+    ]
+
+
+user_stats = Table("user_stats", metadata, Column("user_id", Integer, primary_key=True), *_totals())
+library_stats = Table("library_stats", metadata, Column("id", Integer, primary_key=True), *_totals())
+book_shelf_stats = Table(
+    "book_shelf_stats",
+    metadata,
+    Column("book_id", Integer, primary_key=True),
+    Column("shelved", Integer, nullable=False, default=0, index=True),
+)
+author_shelf_stats = Table(
+    "author_shelf_stats",
+    metadata,
+    Column("author", String, primary_key=True),
+    Column("shelved", Integer, nullable=False, default=0, index=True),
+)
+
+# user_books.status holds ReadingStatus member names
+_TOTALS = (
+    "count(*), "
+    "coalesce(sum(CASE WHEN status = 'unread' THEN 1 ELSE 0 END), 0), "
+    "coalesce(sum(CASE WHEN status = 'reading' THEN 1 ELSE 0 END), 0), "
+    "coalesce(sum(CASE WHEN status = 'read' THEN 1 ELSE 0 END), 0), "
+    "coalesce(sum(coalesce(current_page, 0)), 0), "
+    "coalesce(sum(coalesce(total_pages, 0)), 0)"
+)
+BACKFILL = (
+    "INSERT INTO user_stats (user_id, books, unread, reading, read, pages_read, total_pages) "
+    f"SELECT user_id, {_TOTALS} FROM user_books GROUP BY user_id",
+    "INSERT INTO library_stats (id, books, unread, reading, read, pages_read, total_pages) "
+    f"SELECT 1, {_TOTALS} FROM user_books",
+    "INSERT INTO book_shelf_stats (book_id, shelved) "
+    "SELECT book_id, count(*) FROM user_books GROUP BY book_id",
+    "INSERT INTO author_shelf_stats (author, shelved) "
+    "SELECT books.author, count(*) FROM books JOIN user_books ON user_books.book_id = books.id "
+    "WHERE books.author IS NOT NULL GROUP BY books.author",
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
+    # a create_all schema has the tables already; backfill only if never filled
+    if not conn.scalar(select(func.count()).select_from(library_stats)):
+        for table in metadata.sorted_tables:
+            conn.execute(table.delete())
+        for statement in BACKFILL:
+            conn.execute(text(statement))
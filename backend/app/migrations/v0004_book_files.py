@@ -0,0 +1,21 @@
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+
+# the table as this migration introduced it
+metadata = MetaData()
+
+# only what book_files' foreign key refers to; never created here
+Table("books", metadata, Column("id", Integer, primary_key=True))
+
+book_files = Table(
+    "book_files",
+    metadata,
+    Column("book_id", Integer, ForeignKey("books.id"), primary_key=True),
+    Column("digest", String(64), nullable=False, index=True),
+    Column("media_type", String, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("filename", String, nullable=True),
+)
+
+
+def upgrade(conn):
+    book_files.create(conn, checkfirst=True)
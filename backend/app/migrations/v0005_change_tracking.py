@@ -0,0 +1,44 @@
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, Table, func, insert, inspect, select, text,
+)
+
+# the tables and indexes as this migration introduced them
+metadata = MetaData()
+
+sync_state = Table(
+    "sync_state",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("revision", Integer, nullable=False, default=0),
+    Column("horizon", Integer, nullable=False, default=0),
+)
+tombstones = Table(
+    "tombstones",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("revision", Integer, nullable=False),
+    Column("book_id", Integer, nullable=False),
+    Column("user_id", Integer, nullable=True),
+    Column("deleted_at", DateTime, nullable=False),
+    Index("ix_tombstones_user_revision", "user_id", "revision"),
+)
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_books_revision ON books (revision)",
+    "CREATE INDEX IF NOT EXISTS ix_user_books_user_revision ON user_books (user_id, revision)",
+)
+
+
+def upgrade(conn):
+    for table in ("books", "user_books"):
+        columns = {column["name"] for column in inspect(conn).get_columns(table)}
+        if "revision" not in columns:
+            # existing rows count as revision 0: part of any full sync
+            conn.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            )
+    for statement in INDEXES:
+        conn.execute(text(statement))
+    metadata.create_all(conn, checkfirst=True)
+    if not conn.scalar(select(func.count()).select_from(sync_state)):
+        conn.execute(insert(sync_state).values(id=1, revision=0, horizon=0))
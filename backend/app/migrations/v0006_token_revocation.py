@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table
+
+# the tables as this migration introduced them
+metadata = MetaData()
+
+token_families = Table(
+    "token_families",
+    metadata,
+    Column("id", String(32), primary_key=True),
+    Column("user_id", Integer, nullable=False, index=True),
+    Column("generation", Integer, nullable=False, default=0),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+revoked_tokens = Table(
+    "revoked_tokens",
+    metadata,
+    Column("token_id", String(32), primary_key=True),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
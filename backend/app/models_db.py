@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 from enum import Enum
 from sqlalchemy import Enum as SqlEnum
@@ -22,11 +22,13 @@ class Book(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    author = Column(String)
+    author = Column(String, index=True)
     year = Column(Integer)
     description = Column(String, nullable=True)
     cover_url = Column(String, nullable=True)
     pdf_url = Column(String, nullable=True)
+    # stamped by app.sync on every write
+    revision = Column(Integer, nullable=False, default=0, index=True)
 
     book_users = relationship("UserBook", back_populates="book")
 
@@ -39,6 +41,14 @@ class ReadingStatus(str, Enum):
 
 class UserBook(Base):
     __tablename__ = "user_books"
+    __table_args__ = (
+        # every shelf operation looks up (user_id, book_id); also makes adds race-free
+        Index("uq_user_books_user_book", "user_id", "book_id", unique=True),
+        # delete_book removes all shelf rows of a book
+        Index("ix_user_books_book_id", "book_id"),
+        # GET /sync reads one user's changes since a revision
+        Index("ix_user_books_user_revision", "user_id", "revision"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -47,6 +57,103 @@ class UserBook(Base):
     progress = Column(Integer, default=0)
     current_page = Column(Integer, default=0)
     total_pages = Column(Integer, default=0)
+    revision = Column(Integer, nullable=False, default=0)
 
     user = relationship("User", back_populates="user_books")
     book = relationship("Book", back_populates="book_users")
+
+
+class _ReadingTotals:
+    """Counters kept in step with user_books by app.stats."""
+
+    books = Column(Integer, nullable=False, default=0)
+    unread = Column(Integer, nullable=False, default=0)
+    reading = Column(Integer, nullable=False, default=0)
+    read = Column(Integer, nullable=False, default=0)
+    pages_read = Column(Integer, nullable=False, default=0)
+    total_pages = Column(Integer, nullable=False, default=0)
+
+
+class UserStats(_ReadingTotals, Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, primary_key=True)
+
+
+class LibraryStats(_ReadingTotals, Base):
+    __tablename__ = "library_stats"
+
+    # a single row, id = 1
+    id = Column(Integer, primary_key=True)
+
+
+class BookShelfStats(Base):
+    __tablename__ = "book_shelf_stats"
+
+    book_id = Column(Integer, primary_key=True)
+    shelved = Column(Integer, nullable=False, default=0, index=True)
+
+
+class AuthorShelfStats(Base):
+    __tablename__ = "author_shelf_stats"
+
+    author = Column(String, primary_key=True)
+    shelved = Column(Integer, nullable=False, default=0, index=True)
+
+
+class BookFile(Base):
+    """A book's uploaded PDF/EPUB, stored in app.blobs under its content hash."""
+
+    __tablename__ = "book_files"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    # blobs are shared between books with identical files
+    digest = Column(String(64), nullable=False, index=True)
+    media_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    filename = Column(String, nullable=True)
+
+
+class SyncState(Base):
+    """Change-tracking counters for app.sync; a single row, id = 1."""
+
+    __tablename__ = "sync_state"
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, default=0)
+    # tombstones up to this revision have been pruned
+    horizon = Column(Integer, nullable=False, default=0)
+
+
+class Tombstone(Base):
+    """A deleted book (user_id NULL) or a book taken off a user's shelf."""
+
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_user_revision", "user_id", "revision"),)
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False)
+    book_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    deleted_at = Column(DateTime, nullable=False)
+
+
+class TokenFamily(Base):
+    """One sign-in's chain of rotating refresh tokens (see app.tokens)."""
+
+    __tablename__ = "token_families"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    # only the refresh token of this generation may be used
+    generation = Column(Integer, nullable=False, default=0)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class RevokedToken(Base):
+    """A revoked token family or token id, denied until it would have expired."""
+
+    __tablename__ = "revoked_tokens"
+
+    token_id = Column(String(32), primary_key=True)
+    expires_at = Column(Float, nullable=False, index=True)
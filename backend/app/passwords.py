@@ -0,0 +1,140 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from .metrics import REGISTRY
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# jobs allowed in flight (running + waiting) before requests are shed with 503
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+# bcrypt releases the GIL, so threads scale; "process" isolates the CPU work entirely
+HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+_BCRYPT_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+hash_jobs = REGISTRY.counter(
+    "password_hash_jobs_total", "Password hash/verify jobs by operation and outcome"
+)
+hash_seconds = REGISTRY.counter(
+    "password_hash_seconds_total", "Time spent hashing or verifying passwords"
+)
+hash_pending = REGISTRY.gauge(
+    "password_hash_pending", "Password jobs running or waiting for a worker"
+)
+
+
+# bcrypt is imported inside the workers: most processes (CLI, tests that never
+# sign in) don't need it at startup.
+def _hash(password: bytes, rounds: int) -> str:
+    import bcrypt
+
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    import bcrypt
+
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # malformed hash in the database
+        return False
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool instead of the event loop."""
+
+    def __init__(
+        self,
+        rounds=BCRYPT_ROUNDS,
+        workers=HASH_WORKERS,
+        max_pending=HASH_QUEUE_LIMIT,
+        executor=HASH_EXECUTOR,
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_kind = executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="password-hash"
+                        )
+        return self._executor
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def _submit(self, operation, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                hash_jobs.inc(operation=operation, outcome="rejected")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in requests, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        hash_pending.inc()
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            hash_pending.dec()
+            hash_seconds.inc(time.perf_counter() - started, operation=operation)
+        hash_jobs.inc(operation=operation, outcome="completed")
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _hash, password.encode(), self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._submit("verify", _verify, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        match = _BCRYPT_COST.match(hashed)
+        return match is None or int(match.group(1)) != self.rounds
+
+    async def verify_and_update(self, password: str, hashed: str):
+        """Verify a password and return ``(valid, new_hash)``.
+
+        `new_hash` is set when the stored hash uses a different cost factor
+        than the configured one and should be written back.
+        """
+        if not await self.verify(password, hashed):
+            return False, None
+        if self.needs_rehash(hashed):
+            try:
+                return True, await self.hash(password)
+            except HTTPException:
+                # the upgrade can wait for the next login when the pool is saturated
+                return True, None
+        return True, None
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
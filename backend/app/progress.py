@@ -0,0 +1,262 @@
+"""Write-coalescing buffer for reading-progress updates.
+
+With PROGRESS_WRITE_MODE=buffered, PUT /books/user-books/{id} validates the
+update against the latest known state and parks the result here instead of
+committing. Page turns for the same ``(user, book)`` overwrite each other in
+memory, and a background task writes what is left every
+PROGRESS_FLUSH_INTERVAL seconds (and at shutdown) as one executemany UPDATE
+per database. Shelf reads overlay pending entries, so a client always reads
+its own writes.
+
+The buffer is per process, so two workers could each hold an update for the
+same pair and the later flush would win. Buffered mode therefore refuses to
+start with several workers (WEB_CONCURRENCY > 1 or a shared cache backend).
+PROGRESS_WRITE_MODE=direct writes through `write_pending` as well, in the
+request's own transaction.
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import bindparam, select, tuple_, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import cache
+from .metrics import REGISTRY
+from .models_db import ReadingStatus, UserBook
+from .stats import ShelfState, record_shelf_changes
+from .sync import next_revision
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_WRITE_MODE = os.getenv("PROGRESS_WRITE_MODE", "direct")
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1.0"))
+# flush inline once this many (user, book) pairs are waiting
+PROGRESS_BUFFER_MAX = int(os.getenv("PROGRESS_BUFFER_MAX", "10000"))
+
+progress_events = REGISTRY.counter(
+    "progress_events_total", "Buffered progress updates, by whether they replaced a pending one"
+)
+progress_flushed = REGISTRY.counter(
+    "progress_flushed_rows_total", "Progress rows written by buffer flushes"
+)
+progress_pending = REGISTRY.gauge("progress_pending", "Progress updates waiting to be flushed")
+
+
+@dataclass
+class PendingProgress:
+    """Latest shelf state of one (user, book); the shape apply_progress edits."""
+
+    book_id: int
+    title: str
+    author: str
+    year: int
+    status: ReadingStatus
+    progress: int
+    current_page: int
+    total_pages: int
+
+    def as_response(self):
+        entry = asdict(self)
+        entry["status"] = ReadingStatus(self.status)
+        return entry
+
+
+# table-level (not ORM) UPDATE so a parameter list runs as one executemany
+_user_books = UserBook.__table__
+_flush_statement = (
+    update(_user_books)
+    .where(
+        _user_books.c.user_id == bindparam("match_user_id"),
+        _user_books.c.book_id == bindparam("match_book_id"),
+    )
+    .values(
+        status=bindparam("new_status"),
+        progress=bindparam("new_progress"),
+        current_page=bindparam("new_current_page"),
+        total_pages=bindparam("new_total_pages"),
+        revision=bindparam("new_revision"),
+    )
+)
+
+
+# pairs per "(user_id, book_id) IN (...)" lookup, well under SQLite's variable limit
+_LOOKUP_CHUNK = 500
+
+
+def _stored_states(db: Session, keys):
+    states = {}
+    for start in range(0, len(keys), _LOOKUP_CHUNK):
+        rows = db.execute(
+            select(
+                _user_books.c.user_id,
+                _user_books.c.book_id,
+                _user_books.c.status,
+                _user_books.c.current_page,
+                _user_books.c.total_pages,
+            ).where(
+                tuple_(_user_books.c.user_id, _user_books.c.book_id).in_(
+                    keys[start:start + _LOOKUP_CHUNK]
+                )
+            )
+        )
+        states.update({(row.user_id, row.book_id): ShelfState.of(row) for row in rows})
+    return states
+
+
+def write_pending(db: Session, entries):
+    """UPDATE the given ``{(user_id, book_id): (bind, PendingProgress)}`` in `db`'s transaction."""
+    if not entries:
+        return
+    stored = _stored_states(db, list(entries))
+    record_shelf_changes(
+        db,
+        [
+            (user_id, book_id, None, stored[(user_id, book_id)], ShelfState.of(entry))
+            for (user_id, book_id), (_, entry) in entries.items()
+            if (user_id, book_id) in stored
+        ],
+    )
+    revision = next_revision(db)
+    db.execute(
+        _flush_statement,
+        [
+            {
+                "match_user_id": user_id,
+                "match_book_id": book_id,
+                "new_status": ReadingStatus(entry.status),
+                "new_progress": entry.progress,
+                "new_current_page": entry.current_page,
+                "new_total_pages": entry.total_pages,
+                "new_revision": revision,
+            }
+            for (user_id, book_id), (_, entry) in entries.items()
+        ],
+    )
+
+
+class ProgressBuffer:
+    def __init__(self, max_pending=PROGRESS_BUFFER_MAX):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # (user_id, book_id) -> (bind, PendingProgress)
+        self._pending = {}
+        # taken by a flush that has not committed yet; still served to readers
+        self._flushing = {}
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def full(self):
+        return len(self._pending) >= self.max_pending
+
+    def _latest(self, key):
+        return self._pending.get(key) or self._flushing.get(key)
+
+    def get(self, user_id, book_id):
+        with self._lock:
+            pending = self._latest((user_id, book_id))
+        return None if pending is None else PendingProgress(**asdict(pending[1]))
+
+    def put(self, user_id, book_id, bind, entry: PendingProgress):
+        with self._lock:
+            replaced = self._latest((user_id, book_id)) is not None
+            self._pending[(user_id, book_id)] = (bind, entry)
+            progress_pending.set(len(self._pending))
+        progress_events.inc(outcome="coalesced" if replaced else "buffered")
+
+    def for_user(self, user_id):
+        with self._lock:
+            return {
+                book_id: entry
+                for source in (self._flushing, self._pending)
+                for (owner, book_id), (_, entry) in source.items()
+                if owner == user_id
+            }
+
+    def take(self, user_id=None, book_id=None):
+        """Remove and return pending entries, optionally only one user's or book's."""
+        with self._lock:
+            taken = {
+                key: value
+                for key, value in self._pending.items()
+                if (user_id is None or key[0] == user_id)
+                and (book_id is None or key[1] == book_id)
+            }
+            for key in taken:
+                del self._pending[key]
+            progress_pending.set(len(self._pending))
+        return taken
+
+    def restore(self, entries):
+        """Put back entries from `take` whose write was rolled back."""
+        self._settle(entries, failed=True)
+
+    def _settle(self, entries, failed):
+        with self._lock:
+            for key, value in entries.items():
+                if self._flushing.get(key) is value:
+                    del self._flushing[key]
+                if failed:
+                    # unless a newer event for the same pair arrived meanwhile
+                    self._pending.setdefault(key, value)
+            progress_pending.set(len(self._pending))
+
+    def flush(self):
+        """Write everything pending, one transaction per database."""
+        with self._lock:
+            taken, self._pending = self._pending, {}
+            self._flushing.update(taken)
+            progress_pending.set(0)
+        by_bind = {}
+        for key, value in taken.items():
+            by_bind.setdefault(value[0], {})[key] = value
+        error = None
+        for bind, entries in by_bind.items():
+            try:
+                with Session(bind=bind) as db:
+                    write_pending(db, entries)
+                    db.commit()
+            except Exception as exc:
+                self._settle(entries, failed=True)
+                error = error or exc
+                continue
+            self._settle(entries, failed=False)
+            progress_flushed.inc(len(entries))
+        if error is not None:
+            raise error
+        return len(taken)
+
+    async def _run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("progress flush failed; will retry")
+
+    def start(self, interval=PROGRESS_FLUSH_INTERVAL):
+        if cache.cache_backend.shared or int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            raise RuntimeError(
+                "PROGRESS_WRITE_MODE=buffered needs a single worker; use direct with several"
+            )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await run_in_threadpool(self.flush)
+
+
+progress_buffer = ProgressBuffer()
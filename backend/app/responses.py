@@ -0,0 +1,32 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+if orjson is not None:
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def dumps(content) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """ORJSONResponse when orjson is installed, compact stdlib JSON otherwise."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def row_dicts(rows, columns, keys):
+    """Turn row tuples selected as `columns` into dicts holding only `keys`."""
+    positions = [columns.index(key) for key in keys]
+    return [{key: row[position] for key, position in zip(keys, positions)} for row in rows]
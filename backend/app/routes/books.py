@@ -1,16 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from ..auth import get_current_user, DBUser
-from ..models_db import Book, UserBook
-from ..database import get_db
+import io
+from dataclasses import asdict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from ..auth import Principal, get_current_user
+from ..models_db import Book, BookFile, UserBook
+from ..catalog_io import (
+    IMPORT_CHUNK_SIZE,
+    ImportReport,
+    csv_header,
+    detect_format,
+    export_chunk,
+    export_query,
+    import_books,
+    iter_records,
+)
+from ..database import detached_session, get_db, run_db, stream_partitions, sync_bind
+from ..loaders import Loaders, books_by_id, get_loaders
+from ..pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    STREAM_CHUNK_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
 from ..schemas.book_schema import UserBookUpdate, UserBookResponse
-from typing import List
-from ..schemas.book_schema import BookCreate
+from typing import List, Literal, Optional
+from ..schemas.book_schema import (
+    BOOK_FIELDS,
+    BookBatch,
+    BookBatchRequest,
+    BookCreate,
+    BookResponse,
+    BookSuggestion,
+    ShelfBatch,
+    ShelfBatchResult,
+)
+from ..progress import PROGRESS_WRITE_MODE, PendingProgress, progress_buffer, write_pending
+from ..responses import FastJSONResponse, dumps, row_dicts
+from ..events import CATALOG, event_bus, user_topic
+from ..covers import COVER_MAX_AGE, COVER_SIZES, CoverCache, CoverFetchError, get_cover_cache
+from ..http_cache import cached_response, etag_matches, response_cache
+from ..search import search_index
+from ..suggest import MAX_SUGGEST_LIMIT, SUGGEST_LIMIT, book_suggestions
+from ..stats import ShelfState, forget_book, record_author_change, record_shelf_changes
 
 router = APIRouter(tags=["Books"])
 
 
-def require_librarian(user: DBUser = Depends(get_current_user)):
+async def require_librarian(user: Principal = Depends(get_current_user)):
     if user.role != "librarian":
         raise HTTPException(
             status_code=403, detail="Only librarians can perform this action"
@@ -18,105 +59,7 @@ def require_librarian(user: DBUser = Depends(get_current_user)):
     return user
 
 
-@router.get("/")
-def get_books(search: str = "", db: Session = Depends(get_db)):
-    query = db.query(Book)
-
-    if search:
-        search_term = f"%{search.lower()}%"
-        query = query.filter(
-            (Book.title.ilike(search_term)) | (Book.author.ilike(search_term))
-        )
-
-    return query.all()
-
-
-@router.post("/user-books/{book_id}", response_model=UserBookResponse)
-def add_book_to_user_profile(
-    book_id: int,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user),
-):
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    existing = (
-        db.query(UserBook)
-        .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
-        .first()
-    )
-    if existing:
-        raise HTTPException(status_code=400, detail="Book already in your profile")
-
-    userbook = UserBook(
-        user_id=current_user.id,
-        book_id=book_id,
-        status="Not started",
-        progress=0,
-    )
-    db.add(userbook)
-    db.commit()
-    db.refresh(userbook)
-
-    return UserBookResponse(
-        book_id=book.id,
-        title=book.title,
-        author=book.author,
-        year=book.year,
-        status=userbook.status,
-        progress=userbook.progress,
-        current_page=userbook.current_page,
-        total_pages=userbook.total_pages,
-    )
-
-
-@router.get("/user-books", response_model=List[UserBookResponse])
-def get_user_books(
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user),
-):
-    userbooks = (
-        db.query(UserBook)
-        .options(joinedload(UserBook.book))
-        .filter(UserBook.user_id == current_user.id)
-        .all()
-    )
-
-    response = []
-    # optimize - joined query, relation book = relationship("Book") in UserBook model
-    for ub in userbooks:
-        book = db.query(Book).filter(Book.id == ub.book_id).first()
-        response.append(
-            UserBookResponse(
-                book_id=book.id,
-                title=book.title,
-                author=book.author,
-                year=book.year,
-                status=ub.status,
-                progress=ub.progress,
-                current_page=ub.current_page,
-                total_pages=ub.total_pages,
-            )
-        )
-    return response
-
-
-@router.put("/user-books/{book_id}", response_model=UserBookResponse)
-def update_user_book(
-    book_id: int,
-    userbook_data: UserBookUpdate,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user),
-):
-    userbook = (
-        db.query(UserBook)
-        .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
-        .first()
-    )
-    if not userbook:
-        raise HTTPException(status_code=404, detail="Book not found in your profile")
-
+def apply_progress(userbook: UserBook, userbook_data: UserBookUpdate):
     # Validate total_pages first
     if userbook_data.total_pages is not None:
         if userbook_data.total_pages < 0:
@@ -158,73 +101,628 @@ def update_user_book(
     else:
         userbook.progress = 0
 
-    db.commit()
-    db.refresh(userbook)
 
-    book = db.query(Book).filter(Book.id == book_id).first()
+SHELF_FIELDS = list(UserBookResponse.model_fields)
+
+
+def _shelf_query(db: Session):
+    # one joined, column-projected read shaped like UserBookResponse
+    return db.query(
+        Book.id.label("book_id"),
+        Book.title,
+        Book.author,
+        Book.year,
+        UserBook.status,
+        UserBook.progress,
+        UserBook.current_page,
+        UserBook.total_pages,
+    ).join(Book, Book.id == UserBook.book_id)
 
-    return UserBookResponse(
-        book_id=book.id,
-        title=book.title,
-        author=book.author,
-        year=book.year,
-        status=userbook.status,
-        progress=userbook.progress,
-        current_page=userbook.current_page,
-        total_pages=userbook.total_pages,
+
+def _shelf_entry(book, userbook: UserBook):
+    return {
+        "book_id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "year": book.year,
+        "status": userbook.status,
+        "progress": userbook.progress,
+        "current_page": userbook.current_page,
+        "total_pages": userbook.total_pages,
+    }
+
+
+def book_dict(book: Book):
+    return {name: getattr(book, name) for name in BOOK_FIELDS}
+
+
+def _projection(fields: Optional[str]):
+    if not fields:
+        return list(BOOK_FIELDS)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(BOOK_FIELDS))
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    # id is always returned so clients can address the book
+    return ["id"] + [name for name in BOOK_FIELDS if name in requested and name != "id"]
+
+
+def _catalog_query(selected, sort, after, limit):
+    stmt = select(*[getattr(Book, name) for name in selected])
+    if sort == "title":
+        if after:
+            position = decode_cursor(after)
+            stmt = stmt.where(
+                or_(
+                    Book.title > position.get("title"),
+                    and_(Book.title == position.get("title"), Book.id > position.get("id")),
+                )
+            )
+        stmt = stmt.order_by(Book.title, Book.id)
+    else:
+        if after:
+            stmt = stmt.where(Book.id > decode_cursor(after).get("id"))
+        stmt = stmt.order_by(Book.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _rows_for_ids(db: Session, selected, ids):
+    columns = [getattr(Book, name) for name in selected]
+    rows = {row.id: row for row in db.execute(select(*columns).where(Book.id.in_(ids)))}
+    return [rows[book_id] for book_id in ids if book_id in rows]
+
+
+async def _stream_catalog(db, selected, keys, stmt=None, ranked_ids=None):
+    # runs after the request's session is gone, so it owns its own session
+    async with detached_session(db) as session:
+        if ranked_ids is not None:
+            for start in range(0, len(ranked_ids), STREAM_CHUNK_SIZE):
+                chunk = ranked_ids[start:start + STREAM_CHUNK_SIZE]
+                rows = await run_db(session, _rows_for_ids, selected, chunk)
+                yield _ndjson(rows, selected, keys)
+        else:
+            async for rows in stream_partitions(session, stmt, STREAM_CHUNK_SIZE):
+                yield _ndjson(rows, selected, keys)
+
+
+def _ndjson(rows, selected, keys):
+    return b"".join(dumps(row) + b"\n" for row in row_dicts(rows, selected, keys))
+
+
+def _search_offset(after: Optional[str]):
+    # search results are ordered by rank, so the cursor is a rank offset
+    offset = decode_cursor(after).get("offset", 0) if after else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return offset
+
+
+async def _catalog_page(db, search, limit, after, sort, keys, selected):
+    """Return one page of the listing and the cursor of the next page."""
+    if search:
+        offset = _search_offset(after)
+        ranked_ids = await run_db(db, search_index.search, search, limit=limit + 1, offset=offset)
+        rows = await run_db(db, _rows_for_ids, selected, ranked_ids[:limit])
+        next_cursor = None
+        if len(ranked_ids) > limit:
+            next_cursor = encode_cursor({"offset": offset + limit})
+        return row_dicts(rows, selected, keys), next_cursor
+
+    # one extra row tells us whether there is a next page
+    stmt = _catalog_query(selected, sort, after, limit + 1)
+    rows = await run_db(db, lambda session: session.execute(stmt).all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        position = {"id": last.id}
+        if sort == "title":
+            position["title"] = last.title
+        next_cursor = encode_cursor(position)
+    return row_dicts(rows, selected, keys), next_cursor
+
+
+@router.get("/", response_model=List[BookResponse])
+async def get_books(
+    request: Request,
+    search: str = "",
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    sort: Literal["id", "title"] = "id",
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_db),
+):
+    keys = _projection(fields)
+    # keyset columns are always selected so the next cursor can be built
+    selected = list(dict.fromkeys(keys + ["id", "title"]))
+
+    # exports stream the whole result unless a limit is asked for explicitly
+    if format == "ndjson":
+        if search:
+            ranked_ids = await run_db(
+                db, search_index.search, search, limit=limit, offset=_search_offset(after)
+            )
+            rows = _stream_catalog(db, selected, keys, ranked_ids=ranked_ids)
+        else:
+            stmt = _catalog_query(selected, sort, after, limit)
+            rows = _stream_catalog(db, selected, keys, stmt=stmt)
+        return StreamingResponse(rows, media_type="application/x-ndjson")
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    # the key is taken before reading, so a page built from data that a
+    # concurrent write just replaced is filed under the old generation
+    cache_key = response_cache.catalog_key(search, limit, after, sort, tuple(keys))
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        content, next_cursor = await _catalog_page(db, search, limit, after, sort, keys, selected)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        entry = response_cache.store(cache_key, content, headers)
+    return cached_response(request, entry)
+
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=MAX_SUGGEST_LIMIT),
+    db: Session = Depends(get_db),
+):
+    if not book_suggestions.current:
+        await run_db(db, book_suggestions.refresh)
+    # a memory lookup: cheaper inline than a hop to the thread pool
+    return FastJSONResponse(
+        [{"id": book_id, "title": title} for book_id, title in book_suggestions.suggest(q, limit)]
     )
 
 
+def _book_ids(ids: str) -> List[int]:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not 0 < len(parsed) <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_PAGE_SIZE} ids, please")
+    return parsed
+
+
+async def _book_batch(ids: List[int], loaders: Loaders):
+    books = await loaders(books_by_id).load_many(ids)
+    missing = [book_id for book_id in dict.fromkeys(ids) if book_id not in books]
+    return {"books": books, "missing": missing}
+
+
+# declared before /{book_id}, which would otherwise take "batch" as an id
+@router.get("/batch", response_model=BookBatch)
+async def get_book_batch(ids: str, loaders: Loaders = Depends(get_loaders)):
+    """Several books in one round trip: ``?ids=1,2,3``, keyed by id."""
+    return await _book_batch(_book_ids(ids), loaders)
+
+
+@router.post("/batch", response_model=BookBatch)
+async def post_book_batch(batch: BookBatchRequest, loaders: Loaders = Depends(get_loaders)):
+    """`get_book_batch` for id lists too long for a URL."""
+    return await _book_batch(batch.ids, loaders)
+
+
+@router.post("/import", dependencies=[Depends(require_librarian)])
+async def import_catalog(
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db),
+):
+    format = format or detect_format(file.filename or "", file.content_type or "")
+    if format is None:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .ndjson file")
+
+    report = ImportReport()
+
+    def work():
+        # the upload is spooled to disk by the multipart parser, so this
+        # streams through it chunk by chunk on a worker thread
+        stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+        session = Session(bind=sync_bind(db))
+        try:
+            import_books(session, iter_records(stream, format), chunk_size, report)
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Upload must be UTF-8 text; {report.imported} books were imported before the error",
+            )
+        finally:
+            session.close()
+            stream.detach()
+
+    try:
+        await run_in_threadpool(work)
+    finally:
+        # every chunk commits on its own, so an error can follow committed rows
+        if report.imported:
+            response_cache.invalidate_catalog()
+            event_bus.publish(CATALOG, "catalog.imported", {"imported": report.imported})
+    return asdict(report)
+
+
+@router.get("/export", dependencies=[Depends(require_librarian)])
+async def export_catalog(
+    format: Literal["csv", "ndjson"] = "ndjson",
+    db: Session = Depends(get_db),
+):
+    async def chunks():
+        if format == "csv":
+            yield csv_header()
+        async with detached_session(db) as session:
+            async for rows in stream_partitions(session, export_query(), STREAM_CHUNK_SIZE):
+                yield export_chunk(rows, format)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="catalog.{format}"'},
+    )
+
+
+@router.post("/user-books/batch", response_model=ShelfBatchResult)
+async def batch_update_user_books(
+    batch: ShelfBatch,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    # buffered page turns go first so the batch builds on the latest progress
+    pending = progress_buffer.take(user_id=current_user.id)
+
+    def work(db: Session):
+        # in a transaction of their own, so a failed batch cannot lose them
+        try:
+            write_pending(db, pending)
+            db.commit()
+        except Exception:
+            db.rollback()
+            progress_buffer.restore(pending)
+            raise
+        book_ids = {operation.book_id for operation in batch.operations}
+        books = {
+            book.id: book
+            for book in db.query(Book.id, Book.title, Book.author, Book.year).filter(
+                Book.id.in_(book_ids)
+            )
+        }
+        shelf = {
+            userbook.book_id: userbook
+            for userbook in db.query(UserBook).filter(
+                UserBook.user_id == current_user.id, UserBook.book_id.in_(book_ids)
+            )
+        }
+        before = {book_id: ShelfState.of(userbook) for book_id, userbook in shelf.items()}
+
+        touched = {}
+        removed = set()
+        try:
+            for position, operation in enumerate(batch.operations):
+                try:
+                    if operation.op == "add":
+                        if operation.book_id not in books:
+                            raise HTTPException(status_code=404, detail="Book not found")
+                        if operation.book_id in shelf:
+                            raise HTTPException(
+                                status_code=400, detail="Book already in your profile"
+                            )
+                        userbook = UserBook(
+                            user_id=current_user.id,
+                            book_id=operation.book_id,
+                            status="Not started",
+                            progress=0,
+                            current_page=0,
+                            total_pages=0,
+                        )
+                        db.add(userbook)
+                        shelf[operation.book_id] = userbook
+                        apply_progress(userbook, operation)
+                    else:
+                        userbook = shelf.get(operation.book_id)
+                        if userbook is None:
+                            raise HTTPException(
+                                status_code=404, detail="Book not found in your profile"
+                            )
+                        if operation.op == "update":
+                            apply_progress(userbook, operation)
+                        else:
+                            db.delete(userbook)
+                            del shelf[operation.book_id]
+                except HTTPException as exc:
+                    raise HTTPException(
+                        status_code=exc.status_code,
+                        detail=f"Operation {position} ({operation.op} {operation.book_id}): {exc.detail}",
+                    )
+
+                if operation.op == "remove":
+                    touched.pop(operation.book_id, None)
+                    removed.add(operation.book_id)
+                else:
+                    touched[operation.book_id] = shelf[operation.book_id]
+                    removed.discard(operation.book_id)
+
+            result = {
+                "shelf": [
+                    _shelf_entry(books[book_id], userbook)
+                    for book_id, userbook in touched.items()
+                ],
+                "removed": sorted(removed),
+            }
+            record_shelf_changes(
+                db,
+                [
+                    (
+                        current_user.id,
+                        book_id,
+                        books[book_id].author,
+                        before.get(book_id),
+                        ShelfState.of(touched[book_id]) if book_id in touched else None,
+                    )
+                    for book_id in touched.keys() | removed
+                ],
+            )
+            db.commit()
+        except IntegrityError:
+            # a concurrent request shelved one of these books first
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Book already in your profile")
+        except Exception:
+            db.rollback()
+            raise
+        event_bus.publish(user_topic(current_user.id), "shelf.batch", result)
+        return result
+
+    return await run_db(db, work)
+
+
+@router.post("/user-books/{book_id}", response_model=UserBookResponse)
+async def add_book_to_user_profile(
+    book_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    def work(db: Session):
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+        userbook = UserBook(
+            user_id=current_user.id,
+            book_id=book_id,
+            status="Not started",
+            progress=0,
+        )
+        db.add(userbook)
+        record_shelf_changes(
+            db, [(current_user.id, book_id, book.author, None, ShelfState.of(userbook))]
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            # uq_user_books_user_book: the book is already on this shelf
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Book already in your profile")
+        db.refresh(userbook)
+
+        response = UserBookResponse(
+            book_id=book.id,
+            title=book.title,
+            author=book.author,
+            year=book.year,
+            status=userbook.status,
+            progress=userbook.progress,
+            current_page=userbook.current_page,
+            total_pages=userbook.total_pages,
+        )
+        event_bus.publish(user_topic(current_user.id), "shelf.added", response.model_dump())
+        return response
+
+    return await run_db(db, work)
+
+
+@router.get("/user-books", response_model=List[UserBookResponse])
+async def get_user_books(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    def work(db: Session):
+        rows = (
+            _shelf_query(db)
+            .filter(UserBook.user_id == current_user.id)
+            .order_by(UserBook.id)
+        )
+        shelf = row_dicts(rows, SHELF_FIELDS, SHELF_FIELDS)
+        pending = progress_buffer.for_user(current_user.id)
+        if pending:
+            shelf = [
+                pending[entry["book_id"]].as_response() if entry["book_id"] in pending else entry
+                for entry in shelf
+            ]
+        return FastJSONResponse(shelf)
+
+    return await run_db(db, work)
+
+
+async def _buffer_progress(book_id, userbook_data, db, current_user):
+    entry = progress_buffer.get(current_user.id, book_id)
+    if entry is None:
+        def load(db: Session):
+            return (
+                _shelf_query(db)
+                .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
+                .first()
+            )
+
+        row = await run_db(db, load)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Book not found in your profile")
+        entry = PendingProgress(**row._asdict())
+
+    apply_progress(entry, userbook_data)
+    progress_buffer.put(current_user.id, book_id, sync_bind(db), entry)
+    if progress_buffer.full:
+        await run_in_threadpool(progress_buffer.flush)
+    response = entry.as_response()
+    event_bus.publish(user_topic(current_user.id), "shelf.updated", response)
+    return FastJSONResponse(response)
+
+
+@router.put("/user-books/{book_id}", response_model=UserBookResponse)
+async def update_user_book(
+    book_id: int,
+    userbook_data: UserBookUpdate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    return await save_progress(book_id, userbook_data, db, current_user)
+
+
+async def save_progress(book_id, userbook_data, db, current_user):
+    """Apply a progress update in the configured PROGRESS_WRITE_MODE."""
+    if PROGRESS_WRITE_MODE == "buffered":
+        return await _buffer_progress(book_id, userbook_data, db, current_user)
+
+    def work(db: Session):
+        row = (
+            _shelf_query(db)
+            .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
+            .first()
+        )
+        if row is None:
+            raise HTTPException(status_code=404, detail="Book not found in your profile")
+        entry = PendingProgress(**row._asdict())
+        apply_progress(entry, userbook_data)
+        write_pending(db, {(current_user.id, book_id): (None, entry)})
+        db.commit()
+
+        response = entry.as_response()
+        event_bus.publish(user_topic(current_user.id), "shelf.updated", response)
+        return FastJSONResponse(response)
+
+    return await run_db(db, work)
+
+
 @router.delete("/user-books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_book_from_user_profile(
+async def remove_book_from_user_profile(
     book_id: int,
     db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    userbook = (
-        db.query(UserBook)
-        .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
-        .first()
-    )
-    if not userbook:
-        raise HTTPException(status_code=404, detail="Book not found in your profile")
+    def work(db: Session):
+        userbook = (
+            db.query(UserBook)
+            .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
+            .first()
+        )
+        if not userbook:
+            raise HTTPException(status_code=404, detail="Book not found in your profile")
+
+        author = db.query(Book.author).filter(Book.id == book_id).scalar()
+        record_shelf_changes(
+            db, [(current_user.id, book_id, author, ShelfState.of(userbook), None)]
+        )
+        db.delete(userbook)
+        db.commit()
+        progress_buffer.take(current_user.id, book_id)
+        event_bus.publish(user_topic(current_user.id), "shelf.removed", {"book_id": book_id})
+        return
+
+    return await run_db(db, work)
 
-    db.delete(userbook)
-    db.commit()
-    return
 
+@router.get("/{book_id}", response_model=BookResponse)
+async def get_book(request: Request, book_id: int, db: Session = Depends(get_db)):
+    cache_key = response_cache.book_key(book_id)
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        def work(db: Session):
+            book = db.query(Book).filter(Book.id == book_id).first()
+            if not book:
+                raise HTTPException(status_code=404, detail="Book not found")
+            return book_dict(book)
 
-@router.get("/{book_id}")
-def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
+        entry = response_cache.store(cache_key, await run_db(db, work))
+    return cached_response(request, entry)
+
+
+@router.get("/{book_id}/cover", response_class=FileResponse)
+async def get_book_cover(
+    request: Request,
+    book_id: int,
+    size: Literal[tuple(COVER_SIZES)] = "medium",
+    db: Session = Depends(get_db),
+    covers: CoverCache = Depends(get_cover_cache),
+):
+    def work(db: Session):
+        return db.execute(select(Book.cover_url).where(Book.id == book_id)).first()
+
+    row = await run_db(db, work)
+    if row is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    if not row.cover_url:
+        raise HTTPException(status_code=404, detail="Book has no cover")
+    try:
+        cover = await covers.get(row.cover_url, size)
+    except CoverFetchError:
+        raise HTTPException(status_code=502, detail="Cover could not be fetched")
+
+    headers = {
+        "ETag": f'"{cover.etag}"',
+        "Cache-Control": f"public, max-age={COVER_MAX_AGE}",
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(cover.path, media_type=cover.media_type, headers=headers)
 
 
 # libarians
-@router.post("/", dependencies=[Depends(require_librarian)])
-def create_book(book: BookCreate, db: Session = Depends(get_db)):
-    book_data = book.model_dump()
-    new_book = Book(**book_data)
-    db.add(new_book)
-    db.commit()
-    db.refresh(new_book)
-    return new_book
-
-
-@router.put("/{book_id}", dependencies=[Depends(require_librarian)])
-def update_book(book_id: int, book: BookCreate, db: Session = Depends(get_db)):
-    db_book = db.query(Book).filter(Book.id == book_id).first()
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Book not found")
+@router.post("/", response_model=BookResponse, dependencies=[Depends(require_librarian)])
+async def create_book(book: BookCreate, db: Session = Depends(get_db)):
+    def work(db: Session):
+        book_data = book.model_dump()
+        new_book = Book(**book_data)
+        db.add(new_book)
+        db.flush()
+        search_index.index_book(db, new_book)
+        db.commit()
+        # ids can be reused after the highest one is deleted
+        response_cache.invalidate_book(new_book.id)
+        book_suggestions.add_books([(new_book.id, new_book.title, new_book.author)])
+        db.refresh(new_book)
+        event_bus.publish(CATALOG, "book.created", book_dict(new_book))
+        return new_book
+
+    return await run_db(db, work)
+
+
+@router.put("/{book_id}", response_model=BookResponse, dependencies=[Depends(require_librarian)])
+async def update_book(book_id: int, book: BookCreate, db: Session = Depends(get_db)):
+    def work(db: Session):
+        db_book = db.query(Book).filter(Book.id == book_id).first()
+        if not db_book:
+            raise HTTPException(status_code=404, detail="Book not found")
 
-    for key, value in book.model_dump().items():
-        setattr(db_book, key, value)
+        old_author = db_book.author
+        for key, value in book.model_dump().items():
+            setattr(db_book, key, value)
 
-    db.commit()
-    db.refresh(db_book)
-    return db_book
+        record_author_change(db, book_id, old_author, db_book.author)
+        search_index.index_book(db, db_book)
+        db.commit()
+        response_cache.invalidate_book(book_id)
+        book_suggestions.add_books([(book_id, db_book.title, db_book.author)])
+        db.refresh(db_book)
+        event_bus.publish(CATALOG, "book.updated", book_dict(db_book))
+        return db_book
+
+    return await run_db(db, work)
 
 
 @router.delete(
@@ -232,18 +730,36 @@ def update_book(book_id: int, book: BookCreate, db: Session = Depends(get_db)):
     status_code=status.HTTP_204_NO_CONTENT,
     dependencies=[Depends(require_librarian)],
 )
-def delete_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    try:
-        db.query(UserBook).filter(UserBook.book_id == book_id).delete()
-
-        db.delete(book)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-
-    return
+async def delete_book(book_id: int, db: Session = Depends(get_db)):
+    def work(db: Session):
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+        try:
+            shelves = db.query(
+                UserBook.user_id, UserBook.status, UserBook.current_page, UserBook.total_pages
+            ).filter(UserBook.book_id == book_id)
+            record_shelf_changes(
+                db,
+                [(row.user_id, book_id, book.author, ShelfState.of(row), None) for row in shelves],
+            )
+            forget_book(db, book_id)
+            db.query(UserBook).filter(UserBook.book_id == book_id).delete()
+            # the blob itself is left to BlobStore.collect_garbage
+            db.query(BookFile).filter(BookFile.book_id == book_id).delete()
+
+            db.delete(book)
+            search_index.remove_book(db, book_id)
+            db.commit()
+            response_cache.invalidate_book(book_id)
+            book_suggestions.remove_book(book_id)
+            progress_buffer.take(book_id=book_id)
+            event_bus.publish(CATALOG, "book.deleted", {"id": book_id})
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=str(e))
+
+        return
+
+    return await run_db(db, work)
@@ -0,0 +1,109 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_current_user
+from ..database import get_db, release_session
+from ..events import CATALOG, EVENT_HEARTBEAT, RESYNC, TooManySubscribers, event_bus, user_topic
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# a new connection waits this long (ms) before reconnecting after a drop
+SSE_RETRY_MS = 5000
+_PING = '{"type":"ping"}'
+
+
+async def _principal(authorization: Optional[str], token: Optional[str], db) -> Optional[Principal]:
+    # browsers cannot set headers on EventSource or WebSocket, hence ?token=
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        credentials = token
+    if not credentials:
+        return None
+    try:
+        return await get_current_user(
+            HTTPAuthorizationCredentials(scheme="Bearer", credentials=credentials), db
+        )
+    finally:
+        # the connection can stay open for hours; it must not hold a database one
+        await release_session(db)
+
+
+def _subscribe(principal: Optional[Principal]):
+    topics = [CATALOG] if principal is None else [CATALOG, user_topic(principal.id)]
+    return event_bus.subscribe(topics)
+
+
+async def _sse(subscription):
+    async with subscription:
+        yield b"retry: %d\n\n" % SSE_RETRY_MS
+        while True:
+            event = await subscription.next()
+            if event is None:
+                yield b": ping\n\n"
+                continue
+            yield event.sse()
+            if event is RESYNC:
+                return
+
+
+@router.get("")
+async def stream_events(request: Request, token: Optional[str] = None, db: Session = Depends(get_db)):
+    """Server-Sent Events: catalog changes, plus the caller's shelf when signed in."""
+    principal = await _principal(request.headers.get("authorization"), token, db)
+    try:
+        subscription = _subscribe(principal)
+    except TooManySubscribers:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many listeners")
+    return StreamingResponse(
+        _sse(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _until_disconnect(websocket: WebSocket):
+    # client messages carry nothing; reading them is how a close is noticed
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, token: Optional[str] = None, db: Session = Depends(get_db)):
+    """The same events as JSON text frames: ``{"id", "type", "data"}``."""
+    try:
+        principal = await _principal(websocket.headers.get("authorization"), token, db)
+        subscription = _subscribe(principal)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except TooManySubscribers:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    async with subscription:
+        closed = asyncio.ensure_future(_until_disconnect(websocket))
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscription.next())
+                await asyncio.wait((getter, closed), return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    getter.cancel()
+                    return
+                event = getter.result()
+                # a client that stops reading is dropped rather than buffered for
+                await asyncio.wait_for(
+                    websocket.send_text(_PING if event is None else event.json()), EVENT_HEARTBEAT
+                )
+                if event is RESYNC:
+                    await websocket.close()
+                    return
+        except asyncio.TimeoutError:
+            return
+        finally:
+            closed.cancel()
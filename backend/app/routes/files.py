@@ -0,0 +1,170 @@
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_optional_user
+from ..blobs import FORMATS, BlobStore, BlobTooLarge, get_blob_store
+from ..database import get_db, run_db
+from ..events import CATALOG, event_bus
+from ..http_cache import response_cache
+from ..models_db import Book, BookFile, UserBook
+from ..progress import progress_buffer
+from ..schemas.book_schema import BookFileResponse, UserBookUpdate
+from .books import book_dict, require_librarian, save_progress
+
+router = APIRouter(tags=["Book files"])
+
+FILE_MAX_AGE = 3600
+_SINGLE_RANGE = re.compile(r"^bytes=(\d+)-(\d+)$")
+
+
+def file_path(book_id: int):
+    """The pdf_url of a book whose file is hosted here."""
+    return f"/books/{book_id}/file"
+
+
+def page_for_range(range_header: Optional[str], size: int, total_pages: int):
+    """Estimate the page a reader is on from the byte range it asked for.
+
+    Only a single closed range counts, and not one reaching the end of the
+    file, where readers fetch the PDF trailer or EPUB index before any page.
+    """
+    match = _SINGLE_RANGE.match(range_header or "")
+    if not match or total_pages <= 0 or size <= 0:
+        return None
+    start, end = int(match.group(1)), int(match.group(2))
+    if end < start or end >= size - 1:
+        return None
+    return min(total_pages, start * total_pages // size + 1)
+
+
+@router.put(
+    "/{book_id}/file",
+    response_model=BookFileResponse,
+    dependencies=[Depends(require_librarian)],
+)
+async def upload_book_file(
+    request: Request,
+    book_id: int,
+    filename: Optional[str] = None,
+    db: Session = Depends(get_db),
+    blobs: BlobStore = Depends(get_blob_store),
+):
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type not in FORMATS:
+        raise HTTPException(
+            status_code=415, detail=f"Upload one of: {', '.join(FORMATS)}"
+        )
+    if not await run_db(db, lambda db: db.get(Book, book_id)):
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    try:
+        stored = await blobs.save(request.stream(), magic=FORMATS[media_type])
+    except BlobTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    def work(db: Session):
+        book = db.get(Book, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        db.merge(
+            BookFile(
+                book_id=book_id,
+                digest=stored.digest,
+                media_type=media_type,
+                size=stored.size,
+                filename=filename,
+            )
+        )
+        book.pdf_url = file_path(book_id)
+        db.commit()
+        response_cache.invalidate_book(book_id)
+        db.refresh(book)
+        event_bus.publish(CATALOG, "book.updated", book_dict(book))
+
+    await run_db(db, work)
+    return {
+        "book_id": book_id,
+        "digest": stored.digest,
+        "media_type": media_type,
+        "size": stored.size,
+        "filename": filename,
+        "deduplicated": stored.deduplicated,
+    }
+
+
+@router.delete(
+    "/{book_id}/file",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_librarian)],
+)
+async def delete_book_file(book_id: int, db: Session = Depends(get_db)):
+    def work(db: Session):
+        book_file = db.get(BookFile, book_id)
+        if not book_file:
+            raise HTTPException(status_code=404, detail="Book has no file")
+        db.delete(book_file)
+        book = db.get(Book, book_id)
+        unlinked = book is not None and book.pdf_url == file_path(book_id)
+        if unlinked:
+            book.pdf_url = None
+        db.commit()
+        response_cache.invalidate_book(book_id)
+        if unlinked:
+            db.refresh(book)
+            event_bus.publish(CATALOG, "book.updated", book_dict(book))
+
+    await run_db(db, work)
+
+
+@router.get("/{book_id}/file", response_class=FileResponse)
+async def get_book_file(
+    request: Request,
+    book_id: int,
+    db: Session = Depends(get_db),
+    blobs: BlobStore = Depends(get_blob_store),
+    current_user: Optional[Principal] = Depends(get_optional_user),
+):
+    def work(db: Session):
+        book_file = db.get(BookFile, book_id)
+        if current_user is None or book_file is None:
+            return book_file, None
+        shelf = (
+            db.query(UserBook.current_page, UserBook.total_pages)
+            .filter(UserBook.user_id == current_user.id, UserBook.book_id == book_id)
+            .first()
+        )
+        return book_file, shelf
+
+    book_file, shelf = await run_db(db, work)
+    if book_file is None:
+        raise HTTPException(status_code=404, detail="Book has no file")
+
+    # signed-in readers with the book on their shelf get progress from ranges
+    if shelf is not None:
+        state = progress_buffer.get(current_user.id, book_id) or shelf
+        page = page_for_range(request.headers.get("range"), book_file.size, state.total_pages or 0)
+        # reading only moves progress forward; jumping back is a PUT away
+        if page is not None and page > (state.current_page or 0):
+            await save_progress(book_id, UserBookUpdate(current_page=page), db, current_user)
+
+    path = blobs.path(book_file.digest)
+    if not os.path.isfile(path):
+        # e.g. a blob directory that was not restored along with the database
+        raise HTTPException(status_code=404, detail="Book file is missing")
+    return FileResponse(
+        path,
+        media_type=book_file.media_type,
+        filename=book_file.filename,
+        content_disposition_type="inline",
+        headers={
+            "ETag": f'"{book_file.digest}"',
+            "Cache-Control": f"private, max-age={FILE_MAX_AGE}",
+        },
+    )
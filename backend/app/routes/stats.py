@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..auth import Principal
+from ..database import get_db, run_db
+from ..schemas.stats_schema import LibraryStatsResponse
+from ..stats import TOP_SHELVED, library_stats
+from .books import require_librarian
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+
+@router.get("", response_model=LibraryStatsResponse)
+async def read_library_stats(
+    top: int = Query(TOP_SHELVED, ge=1, le=100),
+    db: Session = Depends(get_db),
+    librarian: Principal = Depends(require_librarian),
+):
+    return await run_db(db, lambda db: library_stats(db, top))
@@ -0,0 +1,75 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..auth import Principal, get_optional_user
+from ..database import get_db, run_db
+from ..pagination import decode_cursor, encode_cursor
+from ..progress import progress_buffer
+from ..responses import FastJSONResponse
+from ..schemas.sync_schema import SyncResponse
+from ..sync import SYNC_PAGE_SIZE, changes_since
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+_SHELF_FIELDS = (
+    "book_id", "title", "author", "year", "status", "progress", "current_page", "total_pages",
+)
+
+
+def _page_position(after: Optional[str]):
+    """``(since, first page's revision, (revision, id) of the last book sent)``"""
+    if after is None:
+        return None, None, None
+    position = decode_cursor(after)
+    try:
+        return (
+            int(position["since"]),
+            int(position["to"]),
+            (int(position["revision"]), int(position["id"])),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+    since: int = Query(0, ge=0),
+    after: Optional[str] = None,
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: Optional[Principal] = Depends(get_optional_user),
+):
+    """What changed after revision `since`: apply the deletions, then the rest."""
+    cursor_since, first_revision, position = _page_position(after)
+    since = since if cursor_since is None else cursor_since
+    user_id = None if current_user is None else current_user.id
+
+    changes = await run_db(db, lambda db: changes_since(db, since, user_id, position, limit))
+    shelf = [dict(zip(_SHELF_FIELDS, row)) for row in changes.shelf]
+    if user_id is not None and position is None:
+        # buffered page turns are newer than anything stored
+        pending = progress_buffer.for_user(user_id)
+        if pending:
+            shelf = [entry for entry in shelf if entry["book_id"] not in pending]
+            shelf.extend(entry.as_response() for entry in pending.values())
+
+    # every page reports the first one's revision: only that page carried
+    # the tombstones and shelf changes up to it
+    revision = changes.revision if first_revision is None else first_revision
+    next_cursor = None
+    if changes.after is not None:
+        last_revision, book_id = changes.after
+        next_cursor = encode_cursor(
+            {"since": since, "to": revision, "revision": last_revision, "id": book_id}
+        )
+    return FastJSONResponse({
+        "revision": revision,
+        "reset": changes.reset,
+        "books": changes.books,
+        "deleted_books": changes.deleted_books,
+        "shelf": shelf,
+        "removed_shelf": changes.removed_shelf,
+        "next": next_cursor,
+    })
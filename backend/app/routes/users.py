@@ -1,71 +1,93 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, run_db
 from ..models_db import User
+from ..schemas.stats_schema import ReadingStatsResponse
 from ..schemas.user_schema import UserUpdate, UserResponse
-from ..auth import get_current_user, DBUser
-from passlib.context import CryptContext
+from ..stats import user_stats
+from ..auth import Principal, get_current_user, invalidate_principal
+from ..passwords import password_hasher
 from typing import List
 
 router = APIRouter(prefix="/users", tags=["Users"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.get("/", response_model=List[UserResponse])
-def get_all_users(
+async def get_all_users(
     db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
 
     if current_user.role != "Librarian":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    users = db.query(User).all()
-    return users
+    return await run_db(db, lambda db: db.query(User).all())
 
 @router.get("/me", response_model=UserResponse)
-def read_user_me(current_user: DBUser = Depends(get_current_user)):
+async def read_user_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
+@router.get("/me/stats", response_model=ReadingStatsResponse)
+async def read_user_stats(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    user_id = current_user.id
+    return await run_db(db, lambda db: user_stats(db, user_id))
+
 @router.put("/update")
-def update_user_profile(
+async def update_user_profile(
         user_data: UserUpdate,
         db: Session = Depends(get_db),
-        current_user: DBUser = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    hashed_password = None
+    if user_data.password and user_data.password.strip():
+        hashed_password = await password_hasher.hash(user_data.password)
+    user_id = current_user.id
+
+    def work(db: Session):
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-    if user.email != user_data.email:
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
-        if existing_user and existing_user.id != user.id:
-            raise HTTPException(status_code=400, detail="Email is already in use.")
-        user.email = user_data.email
-    user.name = user_data.name
+        if user.email != user_data.email:
+            existing_user = db.query(User).filter(User.email == user_data.email).first()
+            if existing_user and existing_user.id != user.id:
+                raise HTTPException(status_code=400, detail="Email is already in use.")
+            user.email = user_data.email
+        user.name = user_data.name
 
-    if user_data.password.strip():
-        hashed_password = pwd_context.hash(user_data.password)
-        user.password = hashed_password
+        if hashed_password:
+            user.password = hashed_password
 
-    db.commit()
-    db.refresh(user)
+        db.commit()
+        db.refresh(user)
+        invalidate_principal(user_id)
 
-    return {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-    }
+        return {
+            "id": user.id,
+            "name": user.name,
+            "email": user.email,
+        }
+
+    return await run_db(db, work)
 
 
 @router.delete("/delete")
-def delete_user_profile(
+async def delete_user_profile(
         db: Session = Depends(get_db),
-        current_user: DBUser = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user_id = current_user.id
+
+    def work(db: Session):
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        db.delete(user)
+        db.commit()
+        invalidate_principal(user_id)
+        return {"message": "User deleted"}
 
-    db.delete(user)
-    db.commit()
-    return {"message": "User deleted"}
+    return await run_db(db, work)
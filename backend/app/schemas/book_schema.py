@@ -1,7 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 from ..models_db import ReadingStatus
 
+BOOK_FIELDS = ("id", "title", "author", "year", "description", "cover_url", "pdf_url")
 
 class BookCreate(BaseModel):
     title: str
@@ -12,6 +13,34 @@ class BookCreate(BaseModel):
     pdf_url: Optional[str] = None
 
 
+class BookResponse(BaseModel):
+    id: int
+    title: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[int] = None
+    description: Optional[str] = None
+    cover_url: Optional[str] = None
+    pdf_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BookBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class BookBatch(BaseModel):
+    books: Dict[int, BookResponse]
+    # requested ids with no such book
+    missing: List[int]
+
+
+class BookSuggestion(BaseModel):
+    id: int
+    title: str
+
+
 class UserBookUpdate(BaseModel):
     status: Optional[ReadingStatus] = None
     progress: Optional[int] = None
@@ -31,3 +60,27 @@ class UserBookResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ShelfOperation(UserBookUpdate):
+    op: Literal["add", "update", "remove"]
+    book_id: int
+
+
+class ShelfBatch(BaseModel):
+    operations: List[ShelfOperation] = Field(min_length=1, max_length=1000)
+
+
+class ShelfBatchResult(BaseModel):
+    shelf: List[UserBookResponse]
+    removed: List[int]
+
+
+class BookFileResponse(BaseModel):
+    book_id: int
+    digest: str
+    media_type: str
+    size: int
+    filename: Optional[str] = None
+    # the same content was already stored for this or another book
+    deduplicated: bool
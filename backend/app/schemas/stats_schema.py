@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Dict, List
+
+
+class ReadingStatsResponse(BaseModel):
+    books: int
+    # keyed by ReadingStatus value: "Not started", "Started", "Finished"
+    by_status: Dict[str, int]
+    pages_read: int
+    total_pages: int
+    completion_rate: float
+
+
+class ShelvedBook(BaseModel):
+    book_id: int
+    title: str
+    author: str
+    shelved: int
+
+
+class ShelvedAuthor(BaseModel):
+    author: str
+    shelved: int
+
+
+class LibraryStatsResponse(ReadingStatsResponse):
+    most_shelved_books: List[ShelvedBook]
+    most_shelved_authors: List[ShelvedAuthor]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+from .book_schema import BookResponse, UserBookResponse
+
+
+class SyncResponse(BaseModel):
+    # pass back as ?since= once `next` is null
+    revision: int
+    # the client's copy is too old (or empty): replace it with this snapshot
+    reset: bool
+    books: List[BookResponse]
+    deleted_books: List[int]
+    # only for a signed-in caller
+    shelf: List[UserBookResponse]
+    removed_shelf: List[int]
+    # more changed books: request again with ?after=
+    next: Optional[str] = None
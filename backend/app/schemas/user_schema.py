@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from typing import Optional
 
 
 class UserBase(BaseModel):
@@ -16,8 +17,12 @@ class UserSignin(BaseModel):
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class UserUpdate(UserBase):
-    pass
+    password: Optional[str] = None
 
 
 class UserResponse(UserBase):
@@ -0,0 +1,334 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import Session
+
+from .cache import NamespacedCache
+from .models_db import Book
+
+# "auto" uses SQLite FTS5 when the database supports it and falls back to the
+# in-process inverted index otherwise; "fts5" / "memory" force one backend.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+
+FIELDS = ("title", "author", "description")
+# bm25 column weights: a hit in the title outranks one in the description
+FIELD_WEIGHTS = (10.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "title, author, description, tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_FTS = "DROP TABLE IF EXISTS books_fts"
+
+
+def tokenize(value):
+    if not value:
+        return []
+    if value.isascii():
+        # nothing to decompose or strip
+        return _TOKEN_RE.findall(value.lower())
+    folded = unicodedata.normalize("NFKD", value.lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(folded)
+
+
+def _sqlite_has_fts5():
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+_FTS5_COMPILED = _sqlite_has_fts5()
+
+
+def uses_fts5(bind):
+    if SEARCH_BACKEND == "memory":
+        return False
+    return bind.dialect.name == "sqlite" and _FTS5_COMPILED
+
+
+def _fts_ddl_applies(ddl, target, bind, **kw):
+    return uses_fts5(bind)
+
+
+# Keep the FTS table's lifetime tied to `books` so create_all/drop_all
+# (including the test fixtures) never leave stale index rows behind.
+event.listen(
+    Book.__table__,
+    "after_create",
+    DDL(CREATE_FTS).execute_if(callable_=_fts_ddl_applies),
+)
+event.listen(
+    Book.__table__,
+    "before_drop",
+    DDL(DROP_FTS).execute_if(callable_=_fts_ddl_applies),
+)
+
+
+class InvertedIndex:
+    """Pure-Python BM25 index used when FTS5 is unavailable."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # token -> {book_id: [tf per field]}
+            self._postings = defaultdict(dict)
+            self._doc_tokens = {}
+            self._doc_lengths = {}
+            self._total_lengths = [0] * len(FIELDS)
+            self._vocabulary = []
+            self._vocabulary_dirty = False
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, book_id, title, author, description):
+        with self._lock:
+            self.remove(book_id)
+            lengths = []
+            tokens = set()
+            for position, value in enumerate((title, author, description)):
+                field_tokens = tokenize(value)
+                lengths.append(len(field_tokens))
+                self._total_lengths[position] += len(field_tokens)
+                for token in field_tokens:
+                    posting = self._postings[token]
+                    if book_id not in posting:
+                        posting[book_id] = [0] * len(FIELDS)
+                        if len(posting) == 1:
+                            self._vocabulary_dirty = True
+                    posting[book_id][position] += 1
+                    tokens.add(token)
+            self._doc_tokens[book_id] = tokens
+            self._doc_lengths[book_id] = lengths
+
+    def remove(self, book_id):
+        with self._lock:
+            tokens = self._doc_tokens.pop(book_id, None)
+            if tokens is None:
+                return
+            lengths = self._doc_lengths.pop(book_id)
+            for position, length in enumerate(lengths):
+                self._total_lengths[position] -= length
+            for token in tokens:
+                posting = self._postings[token]
+                posting.pop(book_id, None)
+                if not posting:
+                    del self._postings[token]
+                    self._vocabulary_dirty = True
+
+    def _expand(self, prefix):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def search(self, query, limit=None, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            averages = [max(total / doc_count, 1.0) for total in self._total_lengths]
+
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._expand(term):
+                    posting = self._postings[token]
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for book_id, frequencies in posting.items():
+                        lengths = self._doc_lengths[book_id]
+                        for position, tf in enumerate(frequencies):
+                            if not tf:
+                                continue
+                            norm = 1 - self.b + self.b * lengths[position] / averages[position]
+                            term_scores[book_id] += (
+                                FIELD_WEIGHTS[position] * idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                            )
+                # every query term has to match (same semantics as FTS5's implicit AND)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        book_id: score + term_scores[book_id]
+                        for book_id, score in scores.items()
+                        if book_id in term_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        end = None if limit is None else offset + limit
+        ranked = ranked[offset:end]
+        return [book_id for book_id, _ in ranked]
+
+
+class BookSearchIndex:
+    """Full-text index over title, author and description of the catalog."""
+
+    def __init__(self):
+        self.memory = InvertedIndex()
+        self._memory_loaded = False
+        self._load_lock = threading.Lock()
+        # bumped by every in-memory index write in any worker; a worker whose
+        # copy is behind reloads it before searching
+        self._versions = NamespacedCache("search")
+        self._memory_version = 0
+
+    def _use_fts5(self, db: Session):
+        return uses_fts5(db.get_bind())
+
+    def ensure(self, db: Session):
+        """Create (and backfill) the index for an existing database."""
+        if self._use_fts5(db):
+            db.execute(text(CREATE_FTS))
+            indexed = db.execute(text("SELECT count(*) FROM books_fts")).scalar()
+            if not indexed:
+                db.execute(
+                    text(
+                        "INSERT INTO books_fts(rowid, title, author, description) "
+                        "SELECT id, title, author, description FROM books"
+                    )
+                )
+            db.commit()
+        else:
+            self.rebuild(db)
+
+    def rebuild(self, db: Session):
+        if self._use_fts5(db):
+            db.execute(text("DELETE FROM books_fts"))
+            db.execute(
+                text(
+                    "INSERT INTO books_fts(rowid, title, author, description) "
+                    "SELECT id, title, author, description FROM books"
+                )
+            )
+            db.commit()
+            return
+        with self._load_lock:
+            self._load_memory(db)
+
+    def _load_memory(self, db: Session):
+        version = self._versions.get("memory", 0)
+        self.memory.clear()
+        rows = db.query(Book.id, Book.title, Book.author, Book.description)
+        for row in rows.yield_per(1000):
+            self.memory.add(*row)
+        self._memory_version = version
+        self._memory_loaded = True
+
+    def _memory_current(self):
+        return self._memory_loaded and self._memory_version == self._versions.get("memory", 0)
+
+    def _ensure_memory(self, db: Session):
+        if not self._memory_current():
+            with self._load_lock:
+                # searches that queued behind another reload find it done
+                if not self._memory_current():
+                    self._load_memory(db)
+
+    def _memory_changed(self):
+        version = self._versions.incr("memory")
+        if version == self._memory_version + 1:
+            # nobody else wrote since our copy was loaded, so it stays current
+            self._memory_version = version
+
+    def index_book(self, db: Session, book: Book):
+        """Index `book`; FTS5 rows join the caller's transaction."""
+        if self._use_fts5(db):
+            db.execute(text("DELETE FROM books_fts WHERE rowid = :id"), {"id": book.id})
+            db.execute(
+                text(
+                    "INSERT INTO books_fts(rowid, title, author, description) "
+                    "VALUES (:id, :title, :author, :description)"
+                ),
+                {
+                    "id": book.id,
+                    "title": book.title,
+                    "author": book.author,
+                    "description": book.description,
+                },
+            )
+        else:
+            if self._memory_loaded:
+                self.memory.add(book.id, book.title, book.author, book.description)
+            self._memory_changed()
+
+    def index_many(self, db: Session, rows):
+        """Index freshly inserted books given as dicts with id/title/author/description."""
+        if not rows:
+            return
+        if self._use_fts5(db):
+            db.execute(
+                text(
+                    "INSERT INTO books_fts(rowid, title, author, description) "
+                    "VALUES (:id, :title, :author, :description)"
+                ),
+                rows,
+            )
+        else:
+            if self._memory_loaded:
+                for row in rows:
+                    self.memory.add(row["id"], row["title"], row["author"], row["description"])
+            self._memory_changed()
+
+    def remove_book(self, db: Session, book_id: int):
+        if self._use_fts5(db):
+            db.execute(text("DELETE FROM books_fts WHERE rowid = :id"), {"id": book_id})
+        else:
+            if self._memory_loaded:
+                self.memory.remove(book_id)
+            self._memory_changed()
+
+    def search(self, db: Session, query: str, limit=None, offset=0):
+        """Return matching book ids, best BM25 match first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if not self._use_fts5(db):
+            self._ensure_memory(db)
+            return self.memory.search(query, limit, offset)
+
+        # every term is a quoted prefix query, so user input can't inject FTS syntax
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS)
+        sql = (
+            f"SELECT rowid FROM books_fts WHERE books_fts MATCH :match "
+            f"ORDER BY bm25(books_fts, {weights}), rowid"
+        )
+        params = {"match": match}
+        if limit is not None or offset:
+            sql += " LIMIT :limit OFFSET :offset"
+            params["limit"] = -1 if limit is None else limit
+            params["offset"] = offset
+        return [row[0] for row in db.execute(text(sql), params)]
+
+
+search_index = BookSearchIndex()
@@ -0,0 +1,209 @@
+"""Reading statistics kept in aggregate tables instead of scanned from user_books.
+
+Every shelf write reports ``(user_id, book_id, author, before, after)`` to
+`record_shelf_changes` in the same transaction. `before`/`after` are
+`ShelfState` snapshots, or None when the shelf row did not / no longer
+exists. The deltas are applied as upserts, so reading a user's or the
+library's numbers is a primary-key lookup. The most-shelved lists are an
+index scan over the top rows. `rebuild_stats` recomputes everything from
+user_books, for the migration backfill and for repairs.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import case, delete, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models_db import (
+    AuthorShelfStats,
+    Book,
+    BookShelfStats,
+    LibraryStats,
+    ReadingStatus,
+    UserBook,
+    UserStats,
+)
+
+TOTALS = ("books", "unread", "reading", "read", "pages_read", "total_pages")
+LIBRARY_ROW = 1
+TOP_SHELVED = 10
+
+
+@dataclass(frozen=True)
+class ShelfState:
+    status: str  # ReadingStatus member name, which is also the counter column
+    current_page: int
+    total_pages: int
+
+    @classmethod
+    def of(cls, userbook):
+        return cls(
+            status=ReadingStatus(userbook.status).name,
+            current_page=userbook.current_page or 0,
+            total_pages=userbook.total_pages or 0,
+        )
+
+
+def _totals_delta(before, after):
+    delta = dict.fromkeys(TOTALS, 0)
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            delta["books"] += sign
+            delta[state.status] += sign
+            delta["pages_read"] += sign * state.current_page
+            delta["total_pages"] += sign * state.total_pages
+    return delta
+
+
+def _upsert_increments(db, model, key, rows):
+    """Add each row's counters to the existing ones, inserting missing keys."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model.__table__)
+    else:
+        stmt = sqlite.insert(model.__table__)
+    columns = [name for name in rows[0] if name != key]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={name: model.__table__.c[name] + stmt.excluded[name] for name in columns},
+    )
+    db.execute(stmt, rows)
+
+
+def record_shelf_changes(db, changes):
+    """Apply the stat deltas of shelf changes inside `db`'s transaction.
+
+    `author` is only needed when a row is added or removed.
+    """
+    users = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+    library = dict.fromkeys(TOTALS, 0)
+    books = defaultdict(int)
+    authors = defaultdict(int)
+    for user_id, book_id, author, before, after in changes:
+        if before == after:
+            continue
+        for name, value in _totals_delta(before, after).items():
+            users[user_id][name] += value
+            library[name] += value
+        shelved = (after is not None) - (before is not None)
+        if shelved:
+            books[book_id] += shelved
+            authors[author] += shelved
+
+    _upsert_increments(
+        db, UserStats, "user_id",
+        [{"user_id": user_id, **delta} for user_id, delta in users.items() if any(delta.values())],
+    )
+    if any(library.values()):
+        _upsert_increments(db, LibraryStats, "id", [{"id": LIBRARY_ROW, **library}])
+    _upsert_increments(
+        db, BookShelfStats, "book_id",
+        [{"book_id": book_id, "shelved": count} for book_id, count in books.items() if count],
+    )
+    _upsert_increments(
+        db, AuthorShelfStats, "author",
+        [
+            {"author": author, "shelved": count}
+            for author, count in authors.items()
+            if count and author is not None
+        ],
+    )
+
+
+def record_author_change(db, book_id, old_author, new_author):
+    """Move a book's shelf count when a librarian edits its author."""
+    if old_author == new_author:
+        return
+    shelved = db.scalar(select(BookShelfStats.shelved).where(BookShelfStats.book_id == book_id))
+    if shelved:
+        _upsert_increments(
+            db, AuthorShelfStats, "author",
+            [{"author": old_author, "shelved": -shelved}, {"author": new_author, "shelved": shelved}],
+        )
+
+
+def forget_book(db, book_id):
+    db.execute(delete(BookShelfStats).where(BookShelfStats.book_id == book_id))
+
+
+def _reading_stats(row):
+    values = dict.fromkeys(TOTALS, 0) if row is None else {name: getattr(row, name) for name in TOTALS}
+    return {
+        "books": values["books"],
+        "by_status": {member.value: values[member.name] for member in ReadingStatus},
+        "pages_read": values["pages_read"],
+        "total_pages": values["total_pages"],
+        "completion_rate": round(values["read"] / values["books"], 4) if values["books"] else 0.0,
+    }
+
+
+def user_stats(db, user_id):
+    return _reading_stats(db.get(UserStats, user_id))
+
+
+def library_stats(db, top=TOP_SHELVED):
+    stats = _reading_stats(db.get(LibraryStats, LIBRARY_ROW))
+    books = db.execute(
+        select(BookShelfStats.book_id, Book.title, Book.author, BookShelfStats.shelved)
+        .join(Book, Book.id == BookShelfStats.book_id)
+        .where(BookShelfStats.shelved > 0)
+        .order_by(BookShelfStats.shelved.desc(), BookShelfStats.book_id)
+        .limit(top)
+    )
+    authors = db.execute(
+        select(AuthorShelfStats.author, AuthorShelfStats.shelved)
+        .where(AuthorShelfStats.shelved > 0)
+        .order_by(AuthorShelfStats.shelved.desc(), AuthorShelfStats.author)
+        .limit(top)
+    )
+    stats["most_shelved_books"] = [row._asdict() for row in books]
+    stats["most_shelved_authors"] = [row._asdict() for row in authors]
+    return stats
+
+
+def _totals_columns():
+    return [
+        func.count().label("books"),
+        *[
+            func.coalesce(func.sum(case((UserBook.status == member, 1), else_=0)), 0).label(
+                member.name
+            )
+            for member in ReadingStatus
+        ],
+        func.coalesce(func.sum(func.coalesce(UserBook.current_page, 0)), 0).label("pages_read"),
+        func.coalesce(func.sum(func.coalesce(UserBook.total_pages, 0)), 0).label("total_pages"),
+    ]
+
+
+def rebuild_stats(conn):
+    """Recompute every aggregate table from user_books."""
+    for model in (UserStats, LibraryStats, BookShelfStats, AuthorShelfStats):
+        conn.execute(delete(model))
+
+    conn.execute(
+        insert(UserStats).from_select(
+            ["user_id", *TOTALS], select(UserBook.user_id, *_totals_columns()).group_by(UserBook.user_id)
+        )
+    )
+    conn.execute(
+        insert(LibraryStats).from_select(
+            ["id", *TOTALS], select(literal(LIBRARY_ROW), *_totals_columns()).select_from(UserBook)
+        )
+    )
+    conn.execute(
+        insert(BookShelfStats).from_select(
+            ["book_id", "shelved"],
+            select(UserBook.book_id, func.count()).group_by(UserBook.book_id),
+        )
+    )
+    conn.execute(
+        insert(AuthorShelfStats).from_select(
+            ["author", "shelved"],
+            select(Book.author, func.count())
+            .join(UserBook, UserBook.book_id == Book.id)
+            .where(Book.author.is_not(None))
+            .group_by(Book.author),
+        )
+    )
@@ -0,0 +1,290 @@
+"""Typeahead over book titles and authors, answered from memory.
+
+`PrefixIndex` keeps a sorted array with one packed int per word start of
+every normalized title and author: ``slot << 9 | is_author << 8 | offset``.
+An entry's key is its text from `offset` on, so a query is one bisect to the
+first key >= the query plus a short forward scan, and "war" finds both
+"War and Peace" and "Peace and War". Entries cost 8 bytes each on top of
+the normalized strings; repeated authors share one string.
+
+Every process holds its own copy. Writes bump a shared version counter, and
+a worker whose copy is older reloads it before answering, as the in-memory
+search index does.
+"""
+import logging
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from .cache import NamespacedCache
+from .metrics import REGISTRY
+from .models_db import Book
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+# entries examined per query, which bounds the latency of very common prefixes
+SUGGEST_SCAN = int(os.getenv("SUGGEST_SCAN", "128"))
+# ~300 bytes per title, so a 1M-title catalog fits
+SUGGEST_MEMORY_BUDGET = int(os.getenv("SUGGEST_MEMORY_BUDGET_MB", "320")) * 1024 * 1024
+# load at startup instead of on the first /books/suggest
+SUGGEST_PRELOAD = os.getenv("SUGGEST_PRELOAD", "1") == "1"
+
+_AUTHOR = 1 << 8
+# sorts after every string that starts with a given prefix
+_AFTER_ALL = chr(0x10FFFF)
+# word starts past this offset are not indexed
+_MAX_OFFSET = 0xFF
+
+suggest_index_bytes = REGISTRY.gauge(
+    "suggest_index_bytes", "Estimated memory held by the typeahead index at its last load"
+)
+
+
+def normalize(value):
+    return " ".join(tokenize(value))
+
+
+def _word_starts(text):
+    starts = [0]
+    position = text.find(" ", 0, _MAX_OFFSET)
+    while position != -1:
+        starts.append(position + 1)
+        position = text.find(" ", position + 1, _MAX_OFFSET)
+    return starts
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = array("Q")
+            # per slot; a freed slot holds 0 / None until it is reused
+            self._ids = array("q")
+            self._titles = []
+            self._keys = []
+            self._authors = []
+            self._slots = {}  # book id -> slot
+            self._free = []
+            self._interned = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _key(self, packed):
+        slot = packed >> 9
+        text = self._authors[slot] if packed & _AUTHOR else self._keys[slot]
+        return text[packed & 0xFF:]
+
+    def _store(self, book_id, title, author):
+        key = normalize(title)
+        author_key = normalize(author)
+        author_key = self._interned.setdefault(author_key, author_key)
+        record = (book_id, title or "", key, author_key)
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot], self._titles[slot], self._keys[slot], self._authors[slot] = record
+        else:
+            slot = len(self._ids)
+            for column, value in zip(
+                (self._ids, self._titles, self._keys, self._authors), record
+            ):
+                column.append(value)
+        self._slots[book_id] = slot
+        return slot
+
+    def _packed(self, slot):
+        """``(packed entry, text)`` for every word start of the slot's title and author."""
+        packed = []
+        for field, text in ((0, self._keys[slot]), (_AUTHOR, self._authors[slot])):
+            if text:
+                packed.extend((slot << 9 | field | offset, text) for offset in _word_starts(text))
+        return packed
+
+    def load(self, rows):
+        """Replace the contents with ``(book_id, title, author)`` rows."""
+        with self._lock:
+            self.clear()
+            # sorting per two-character bucket keeps only one bucket's keys
+            # materialized at a time; bucket order is the overall order
+            buckets = defaultdict(lambda: array("Q"))
+            for book_id, title, author in rows:
+                slot = self._store(book_id, title, author)
+                for packed, text in self._packed(slot):
+                    offset = packed & 0xFF
+                    buckets[text[offset:offset + 2]].append(packed)
+            for prefix in sorted(buckets):
+                self._entries.extend(sorted(buckets.pop(prefix), key=self._key))
+
+    def add(self, book_id, title, author):
+        with self._lock:
+            self.remove(book_id)
+            slot = self._store(book_id, title, author)
+            for packed, _ in self._packed(slot):
+                insort(self._entries, packed, key=self._key)
+
+    def add_many(self, rows):
+        """Add or replace ``(book_id, title, author)`` rows.
+
+        The new entries are sorted and merged in one pass over the existing
+        ones, instead of one insort (a bisect and an array shift) each.
+        """
+        with self._lock:
+            added = []
+            for book_id, title, author in rows:
+                self.remove(book_id)
+                slot = self._store(book_id, title, author)
+                added.extend(packed for packed, _ in self._packed(slot))
+            if not added:
+                return
+            added.sort(key=self._key)
+            entries, merged, start = self._entries, array("Q"), 0
+            for packed in added:
+                position = bisect_left(entries, self._key(packed), start, key=self._key)
+                merged.extend(entries[start:position])
+                merged.append(packed)
+                start = position
+            merged.extend(entries[start:])
+            self._entries = merged
+
+    def remove(self, book_id):
+        with self._lock:
+            slot = self._slots.pop(book_id, None)
+            if slot is None:
+                return
+            for packed, _ in self._packed(slot):
+                position = bisect_left(self._entries, self._key(packed), key=self._key)
+                while self._entries[position] != packed:
+                    position += 1
+                del self._entries[position]
+            self._ids[slot] = 0
+            self._titles[slot] = self._keys[slot] = self._authors[slot] = None
+            self._free.append(slot)
+
+    def suggest(self, query, limit=SUGGEST_LIMIT):
+        """Return up to `limit` ``(book_id, title)`` pairs whose title or author
+        has a word starting with `query`.
+
+        Title starts rank before other title words, which rank before
+        authors; then shorter titles first.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            entries, keys, ids = self._entries, self._keys, self._ids
+            start = bisect_left(entries, prefix, key=self._key)
+            end = bisect_left(entries, prefix + _AFTER_ALL, start, key=self._key)
+            window = entries[start:min(end, start + SUGGEST_SCAN)]
+            window = sorted(
+                window,
+                key=lambda packed: (
+                    packed & _AUTHOR,
+                    (packed & 0xFF) != 0,
+                    len(keys[packed >> 9]),
+                    ids[packed >> 9],
+                ),
+            )
+            results, seen = [], set()
+            for packed in window:
+                slot = packed >> 9
+                if slot not in seen:
+                    seen.add(slot)
+                    results.append((ids[slot], self._titles[slot]))
+                    if len(results) == limit:
+                        break
+            return results
+
+    def footprint(self):
+        """Estimated bytes held by the index."""
+        with self._lock:
+            strings = {
+                id(value): sys.getsizeof(value)
+                for column in (self._titles, self._keys, self._authors)
+                for value in column
+                if value is not None
+            }
+            return (
+                sum(strings.values())
+                + sum(sys.getsizeof(column) for column in (self._entries, self._ids))
+                + sum(sys.getsizeof(column) for column in (self._titles, self._keys, self._authors))
+                # the book id keys are int objects of their own
+                + sys.getsizeof(self._slots) + 28 * len(self._slots)
+                + sys.getsizeof(self._interned)
+            )
+
+
+class BookSuggestions:
+    """The catalog's PrefixIndex, kept in step with librarian writes."""
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._versions = NamespacedCache("search")
+        self._version = 0
+
+    @property
+    def current(self):
+        return self._loaded and self._version == self._versions.get("suggest", 0)
+
+    def load(self, db: Session):
+        with self._load_lock:
+            self._load(db)
+
+    def refresh(self, db: Session):
+        """Load the index unless it is current.
+
+        Requests that all found it stale queue on the lock; only the first
+        reloads it.
+        """
+        with self._load_lock:
+            if not self.current:
+                self._load(db)
+
+    def _load(self, db: Session):
+        version = self._versions.get("suggest", 0)
+        rows = db.query(Book.id, Book.title, Book.author).yield_per(10_000)
+        self.index.load(tuple(row) for row in rows)
+        self._version = version
+        self._loaded = True
+        footprint = self.index.footprint()
+        suggest_index_bytes.set(footprint)
+        if footprint > SUGGEST_MEMORY_BUDGET:
+            logger.warning(
+                "typeahead index holds ~%d MB, over its %d MB budget",
+                footprint // 2**20, SUGGEST_MEMORY_BUDGET // 2**20,
+            )
+
+    def _changed(self):
+        version = self._versions.incr("suggest")
+        if version == self._version + 1:
+            # nobody else wrote since our copy was loaded, so it stays current
+            self._version = version
+
+    def add_books(self, rows):
+        """Index committed books given as ``(id, title, author)``."""
+        if self._loaded:
+            self.index.add_many(rows)
+        self._changed()
+
+    def remove_book(self, book_id):
+        if self._loaded:
+            self.index.remove(book_id)
+        self._changed()
+
+    def suggest(self, query, limit=SUGGEST_LIMIT):
+        return self.index.suggest(query, limit)
+
+
+book_suggestions = BookSuggestions()
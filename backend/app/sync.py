@@ -0,0 +1,159 @@
+"""Change tracking for delta sync.
+
+Each transaction that writes books or shelf rows takes the next value of
+one counter (sync_state.revision) and stamps it on every row it writes;
+deleting a book, or taking one off a shelf, leaves a tombstone with that
+revision. The counter row stays locked until the transaction ends, so
+revisions become visible in order: a client that has seen revision N gets
+every later change from the rows and tombstones above N.
+
+ORM writes are stamped by a ``before_flush`` hook; statements that bypass
+the ORM (bulk imports, buffered progress) call `next_revision` themselves.
+Removing a book's shelf rows along with the book leaves only the book's
+tombstone. Tombstones are pruned after SYNC_TOMBSTONE_DAYS, and a client
+whose revision is older than that gets a full snapshot instead.
+"""
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .models_db import Book, SyncState, Tombstone, UserBook
+from .schemas.book_schema import BOOK_FIELDS
+
+SYNC_PAGE_SIZE = 1000
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+
+_STATE_ROW = 1
+_state = SyncState.__table__
+
+
+def next_revision(db: Session) -> int:
+    """The revision of `db`'s current transaction, taken on first use."""
+    revision = db.info.get("revision")
+    if revision is None:
+        conn = db.connection()
+        revision = conn.execute(
+            update(_state)
+            .where(_state.c.id == _STATE_ROW)
+            .values(revision=_state.c.revision + 1)
+            .returning(_state.c.revision)
+        ).scalar()
+        if revision is None:
+            # a create_all schema that no migration has seeded yet
+            conn.execute(insert(_state).values(id=_STATE_ROW, revision=1, horizon=0))
+            revision = 1
+        db.info["revision"] = revision
+    return revision
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    tracked = [
+        obj for obj in (*session.new, *session.dirty)
+        if isinstance(obj, (Book, UserBook)) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, (Book, UserBook))]
+    if not tracked and not deleted:
+        return
+    revision = next_revision(session)
+    for obj in tracked:
+        obj.revision = revision
+    now = datetime.now(timezone.utc)
+    for obj in deleted:
+        user_id = obj.user_id if isinstance(obj, UserBook) else None
+        book_id = obj.book_id if isinstance(obj, UserBook) else obj.id
+        session.add(Tombstone(revision=revision, book_id=book_id, user_id=user_id, deleted_at=now))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_revision(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("revision", None)
+
+
+@dataclass
+class Changes:
+    revision: int
+    reset: bool
+    books: list = field(default_factory=list)
+    deleted_books: list = field(default_factory=list)
+    shelf: list = field(default_factory=list)
+    removed_shelf: list = field(default_factory=list)
+    after: tuple = None  # (revision, id) of the last book, when there are more
+
+
+def _state_row(db: Session):
+    return db.execute(select(_state.c.revision, _state.c.horizon)).first() or (0, 0)
+
+
+def changes_since(db: Session, since, user_id=None, after=None, limit=SYNC_PAGE_SIZE) -> Changes:
+    """Books, shelf rows and tombstones changed after revision `since`.
+
+    Changed books come `limit` at a time in (revision, id) order; `after`
+    continues from a previous page's `Changes.after`, and only the first
+    page carries tombstones and shelf changes.
+    """
+    # read first: everything at or below it is committed, later rows may
+    # show up too and are simply sent again next time
+    revision, horizon = _state_row(db)
+    reset = since <= 0 or since < horizon
+    if reset:
+        since = -1
+    changes = Changes(revision=revision, reset=reset)
+
+    stmt = select(*(getattr(Book, name) for name in BOOK_FIELDS), Book.revision)
+    if after is None:
+        stmt = stmt.where(Book.revision > since)
+    else:
+        stmt = stmt.where(tuple_(Book.revision, Book.id) > tuple_(*after))
+    rows = db.execute(stmt.order_by(Book.revision, Book.id).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        changes.after = (rows[-1].revision, rows[-1].id)
+    changes.books = [{name: getattr(row, name) for name in BOOK_FIELDS} for row in rows]
+    if after is not None:
+        return changes
+
+    if not reset:
+        changes.deleted_books = list(db.scalars(
+            select(Tombstone.book_id)
+            .where(Tombstone.user_id.is_(None), Tombstone.revision > since)
+            .order_by(Tombstone.revision)
+        ))
+    if user_id is not None:
+        changes.shelf = db.execute(
+            select(
+                UserBook.book_id, Book.title, Book.author, Book.year, UserBook.status,
+                UserBook.progress, UserBook.current_page, UserBook.total_pages,
+            )
+            .join(Book, Book.id == UserBook.book_id)
+            .where(UserBook.user_id == user_id)
+            .where(or_(UserBook.revision > since, Book.revision > since))
+            .order_by(UserBook.revision, UserBook.book_id)
+        ).all()
+        if not reset:
+            changes.removed_shelf = list(db.scalars(
+                select(Tombstone.book_id)
+                .where(Tombstone.user_id == user_id, Tombstone.revision > since)
+                .order_by(Tombstone.revision)
+            ))
+    return changes
+
+
+def prune_tombstones(db: Session, days=SYNC_TOMBSTONE_DAYS) -> int:
+    """Delete tombstones older than `days`; return how many went."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    newest = db.scalar(select(func.max(Tombstone.revision)).where(Tombstone.deleted_at < cutoff))
+    if newest is None:
+        return 0
+    removed = db.execute(delete(Tombstone).where(Tombstone.revision <= newest)).rowcount
+    db.execute(
+        update(_state)
+        .where(_state.c.id == _STATE_ROW, _state.c.horizon < newest)
+        .values(horizon=newest)
+    )
+    db.commit()
+    return removed
@@ -0,0 +1,157 @@
+"""Refresh-token rotation and the revocation deny-list.
+
+A sign-in starts a token family. Every token carries the family id
+(``fam``) and its own id (``jti``); refresh tokens also carry the family
+generation they were issued for (``gen``). Refreshing moves the family to
+the next generation with one conditional UPDATE, so each refresh token works
+once. Presenting an older one means it was copied, and the whole family is
+revoked.
+
+Revoked family and token ids are stored in revoked_tokens until the tokens
+they cover would have expired anyway. Each process holds the same ids in
+memory: a set to look them up in, so checking a token is two set lookups
+and never touches the database, and hourly expiry buckets to drop them
+from. Revoking bumps a version counter in the shared cache. Every
+REVOCATION_SYNC_INTERVAL seconds a process compares that counter with the
+version it last loaded and, if it changed, reloads the ids from the
+database. A revocation on one worker therefore reaches the others within
+that interval.
+"""
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from .cache import NamespacedCache
+from .models_db import RevokedToken, TokenFamily
+
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "1"))
+# ids are dropped an expiry bucket at a time
+_BUCKET_SECONDS = 3600
+
+
+def new_token_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RevocationList:
+    """Unexpired revoked ids, also bucketed by the hour their tokens expire."""
+
+    def __init__(self, sync_interval=REVOCATION_SYNC_INTERVAL, clock=time.time):
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = set()
+        self._buckets = {}  # expiry hour -> ids in it
+        self._versions = NamespacedCache("auth")
+        self._version = None  # shared version last loaded, None before the first load
+        self._checked = float("-inf")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, token_id):
+        return token_id in self._ids
+
+    def revoked(self, claims) -> bool:
+        return claims.get("fam") in self or claims.get("jti") in self
+
+    def add(self, token_id, expires_at):
+        with self._lock:
+            self._purge()
+            self._buckets.setdefault(int(expires_at // _BUCKET_SECONDS), []).append(token_id)
+            self._ids.add(token_id)
+
+    def _purge(self):
+        current = int(self._clock() // _BUCKET_SECONDS)
+        for hour in [hour for hour in self._buckets if hour < current]:
+            self._ids.difference_update(self._buckets.pop(hour))
+
+    @property
+    def stale(self) -> bool:
+        """Whether another process revoked something since the last load.
+
+        Looks at the shared counter at most once per sync interval.
+        """
+        if self._version is None:
+            return True
+        now = time.monotonic()
+        if now - self._checked < self.sync_interval:
+            return False
+        self._checked = now
+        return self._versions.get("revocations", 0) != self._version
+
+    def load(self, db: Session):
+        # read the version first: a revocation racing this load bumps it again
+        version = self._versions.get("revocations", 0)
+        now = self._clock()
+        rows = db.execute(
+            select(RevokedToken.token_id, RevokedToken.expires_at).where(
+                RevokedToken.expires_at > now
+            )
+        )
+        ids, buckets = set(), {}
+        for token_id, expires_at in rows:
+            buckets.setdefault(int(expires_at // _BUCKET_SECONDS), []).append(token_id)
+            ids.add(token_id)
+        with self._lock:
+            self._ids, self._buckets = ids, buckets
+            self._version = version
+            self._checked = time.monotonic()
+
+    def revoke(self, db: Session, token_id, expires_at):
+        """Deny `token_id` until `expires_at` (epoch seconds); commits `db`."""
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= self._clock()))
+        db.merge(RevokedToken(token_id=token_id, expires_at=expires_at))
+        db.commit()
+        self.add(token_id, expires_at)
+        version = self._versions.incr("revocations")
+        if version == (self._version or 0) + 1:
+            # nobody else revoked since our load, so the local copy is complete
+            self._version = version
+
+
+revocations = RevocationList()
+
+
+def start_family(db: Session, user_id, expires_at) -> str:
+    """Record a new sign-in's token family and return its id; commits `db`."""
+    family = new_token_id()
+    db.execute(delete(TokenFamily).where(TokenFamily.expires_at <= time.time()))
+    db.add(TokenFamily(id=family, user_id=user_id, generation=0, expires_at=expires_at))
+    db.commit()
+    return family
+
+
+def rotate_family(db: Session, family, generation, expires_at) -> bool:
+    """Move `family` past `generation`; False when that refresh token was already used."""
+    rotated = db.execute(
+        update(TokenFamily)
+        .where(
+            TokenFamily.id == family,
+            TokenFamily.generation == generation,
+            TokenFamily.expires_at > time.time(),
+        )
+        .values(generation=generation + 1, expires_at=expires_at)
+    ).rowcount
+    db.commit()
+    return rotated == 1
+
+
+def revoke_family(db: Session, family, expires_at=None):
+    """Deny every token of `family`, e.g. on logout or refresh-token reuse; commits `db`.
+
+    `expires_at` is the expiry of the token that named the family, for when
+    the family row itself is gone.
+    """
+    row = db.get(TokenFamily, family)
+    if row is not None:
+        expires_at = max(expires_at or 0, row.expires_at)
+        db.delete(row)
+    if expires_at is not None:
+        revocations.revoke(db, family, expires_at)
+    else:
+        db.commit()
@@ -0,0 +1,133 @@
+"""Latency of well-behaved users while one client floods search and sign-in.
+
+Signed-in users browse at a steady pace while an anonymous client keeps
+--flood-concurrency searches and wrong-password sign-ins (a bcrypt each) in
+flight from another process. Runs without the flood ("quiet"), then with it
+and admission control off and on; with it on, the flooder gets 429/503
+answers instead of work, so the users' p99 should stay near the quiet one.
+
+    python -m benchmarks.bench_admission --users 8 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from .loadgen import drive, running_server, summarize, temp_database
+
+ACCOUNT_PASSWORD = "bench-password"
+
+
+async def sign_in_users(client, count):
+    headers = []
+    for index in range(count):
+        account = {"email": f"reader{index}@example.com", "password": ACCOUNT_PASSWORD}
+        await client.post("/auth/signup", json={**account, "name": f"Reader {index}", "role": "user"})
+        response = await client.post("/auth/signin", json=account)
+        headers.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+    return headers
+
+
+async def browse(client, headers, duration, pause):
+    """One user: a request, then `pause` seconds of reading, until `duration` is up."""
+    latencies, errors = [], 0
+    pages = itertools.cycle([
+        ("/books/", {"limit": 20}),
+        ("/books/", {"search": "wild"}),
+        ("/books/user-books", {}),
+        ("/books/suggest", {"q": "ro"}),
+    ])
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        url, params = next(pages)
+        started = time.perf_counter()
+        response = await client.get(url, params=params, headers=headers)
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(pause)
+    return latencies, errors
+
+
+FLOOD = [
+    ("GET", "/books/", {"params": {"search": "the"}}),
+    ("POST", "/auth/signin", {"json": {"email": "reader0@example.com", "password": "wrong"}}),
+]
+
+
+async def _flood(base_url, concurrency, duration):
+    flood = itertools.cycle(FLOOD)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await drive(client, lambda _: next(flood), concurrency, duration, summary=False)
+
+
+def _flood_process(base_url, concurrency, duration):
+    return asyncio.run(_flood(base_url, concurrency, duration))
+
+
+async def _browse_all(base_url, users, duration, pause, start_flood):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        headers = await sign_in_users(client, users)
+        flooder = start_flood()
+        started = time.monotonic()
+        readers = await asyncio.gather(*(browse(client, user, duration, pause) for user in headers))
+        return readers, time.monotonic() - started, flooder
+
+
+def measure(admission, users, flood_concurrency, duration, pause):
+    env = {
+        "ADMISSION_ENABLED": "1" if admission else "0",
+        # every account is set up from this one address
+        "RATE_LIMIT_AUTH": f"{2 * users}/minute",
+    }
+    with temp_database() as url:
+        with running_server(env={"DATABASE_URL": url, **env}) as base_url:
+            # the flooder gets a process of its own so it cannot slow the readers' client
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                readers, elapsed, flooder = asyncio.run(_browse_all(
+                    base_url, users, duration, pause,
+                    lambda: flood_concurrency and pool.submit(
+                        _flood_process, base_url, flood_concurrency, duration
+                    ),
+                ))
+                flooder = flooder.result() if flooder else ([], 0, duration)
+    return {
+        "users": summarize(
+            [latency for latencies, _ in readers for latency in latencies],
+            sum(errors for _, errors in readers),
+            elapsed,
+        ),
+        "flooder": summarize(*flooder),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--flood-concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--pause", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {}
+    for label, admission, flood in (("quiet", True, 0), ("off", False, 1), ("on", True, 1)):
+        results[label] = measure(
+            admission, args.users, flood * args.flood_concurrency, args.duration, args.pause
+        )
+        users, flooder = results[label]["users"], results[label]["flooder"]
+        print(
+            f"{label:>5}: users p50 {users['p50_ms']} ms  p99 {users['p99_ms']} ms  "
+            f"errors {users['errors']}  |  flooder served {flooder['requests']}  "
+            f"turned away {flooder['errors']}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Requests/sec of the API in sync vs async database mode.
+
+    python -m benchmarks.bench_db_modes --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+import httpx
+
+from .loadgen import drive, running_server, temp_database
+
+
+async def prepare(base_url):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        account = {"name": "Bench", "email": "bench@example.com", "password": "bench-password"}
+        await client.post("/auth/signup", json={**account, "role": "user"})
+        response = await client.post(
+            "/auth/signin", json={"email": account["email"], "password": account["password"]}
+        )
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        books = (await client.get("/books/", params={"fields": "id"})).json()
+        for book in books:
+            await client.post(f"/books/user-books/{book['id']}", headers=headers)
+        return headers, [book["id"] for book in books]
+
+
+async def measure(mode, concurrency, duration):
+    with temp_database() as url:
+        with running_server(env={"DATABASE_URL": url, "DB_MODE": mode}) as base_url:
+            headers, book_ids = await prepare(base_url)
+            mix = itertools.cycle(
+                [("GET", "/books/", {"params": {"limit": 20}})]
+                + [("GET", f"/books/{book_id}", {}) for book_id in book_ids[:3]]
+                + [("GET", "/books/user-books", {"headers": headers})]
+                + [("GET", "/books/", {"params": {"search": "wild"}})]
+            )
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+                await drive(client, lambda _: next(mix), concurrency, 1)  # warm up
+                return await drive(client, lambda _: next(mix), concurrency, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("sync", "async"):
+        results[mode] = asyncio.run(measure(mode, args.concurrency, args.duration))
+        stats = results[mode]
+        print(
+            f"{mode:>5}: {stats['rps']:>8} req/s  p50 {stats['p50_ms']} ms  "
+            f"p99 {stats['p99_ms']} ms  errors {stats['errors']}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Concurrent small write transactions against SQLite, untuned vs tuned engine.
+
+Every writer thread repeatedly updates one reading-progress row and
+commits, the way PUT /books/user-books/{id} does on each page turn.
+
+    python -m benchmarks.bench_db_writes --writers 16 --duration 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db_config import configure_engine, engine_options
+from app.models_db import Base
+
+
+def make_engine(url, tuned):
+    if tuned:
+        return configure_engine(create_engine(url, **engine_options(url, name="bench")), name="bench")
+    # what database.py used before: default pool, no pragmas
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def run(url, tuned, writers, duration):
+    engine = make_engine(url, tuned)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM user_books"))
+        for writer in range(writers):
+            conn.execute(
+                text(
+                    "INSERT INTO user_books (id, user_id, book_id, status, progress, current_page, total_pages) "
+                    "VALUES (:id, 1, :id, 'reading', 0, 0, 1000)"
+                ),
+                {"id": writer + 1},
+            )
+
+    commits = 0
+    locked = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def writer(row_id):
+        nonlocal commits, locked
+        page = 0
+        while time.monotonic() < deadline:
+            page = (page + 1) % 1000
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("UPDATE user_books SET current_page = :page, progress = :page / 10 WHERE id = :id"),
+                        {"page": page, "id": row_id},
+                    )
+                with lock:
+                    commits += 1
+            except OperationalError:
+                with lock:
+                    locked += 1
+
+    threads = [threading.Thread(target=writer, args=(index + 1,)) for index in range(writers)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    engine.dispose()
+    return commits / elapsed, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for tuned in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            url = f"sqlite:///{os.path.join(directory, 'writes.db')}"
+            rate, locked = run(url, tuned, args.writers, args.duration)
+        label = "tuned (WAL, synchronous=NORMAL, busy_timeout)" if tuned else "untuned (defaults)"
+        print(f"{label:<48} {rate:9.1f} commits/s   'database is locked' errors: {locked}")
+
+
+if __name__ == "__main__":
+    main()
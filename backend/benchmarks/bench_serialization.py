@@ -0,0 +1,80 @@
+"""Per-row JSON serialization cost of a 10k-book listing.
+
+Compares the old path (ORM objects through FastAPI's jsonable_encoder and
+JSONResponse, one Pydantic UserBookResponse per shelf row) with the new one
+(row tuples -> dicts -> FastJSONResponse).
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models_db import Book, ReadingStatus
+from app.responses import FastJSONResponse, orjson, row_dicts
+from app.schemas.book_schema import BOOK_FIELDS, UserBookResponse
+
+SHELF_FIELDS = list(UserBookResponse.model_fields)
+
+
+def make_rows(count):
+    books = [
+        (
+            i,
+            f"Title {i}",
+            f"Author {i % 500}",
+            1900 + i % 120,
+            "A long description of the book. " * 12,
+            f"https://example.com/covers/{i}.jpg",
+            f"https://example.com/books/{i}.epub",
+        )
+        for i in range(count)
+    ]
+    shelf = [
+        (i, f"Title {i}", f"Author {i % 500}", 1900 + i % 120, ReadingStatus.reading, 40, 120, 300)
+        for i in range(count)
+    ]
+    return books, shelf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    book_rows, shelf_rows = make_rows(args.rows)
+    orm_books = [Book(**dict(zip(BOOK_FIELDS, row))) for row in book_rows]
+    columns = list(BOOK_FIELDS)
+    grid_keys = [key for key in BOOK_FIELDS if key != "description"]
+
+    cases = {
+        "books: ORM + jsonable_encoder + JSONResponse": lambda: JSONResponse(
+            jsonable_encoder(orm_books)
+        ),
+        "books: row tuples + FastJSONResponse": lambda: FastJSONResponse(
+            row_dicts(book_rows, columns, columns)
+        ),
+        "books grid (fields= without description)": lambda: FastJSONResponse(
+            row_dicts(book_rows, columns, grid_keys)
+        ),
+        "shelf: UserBookResponse per row + JSONResponse": lambda: JSONResponse(
+            jsonable_encoder(
+                [UserBookResponse(**dict(zip(SHELF_FIELDS, row))) for row in shelf_rows]
+            )
+        ),
+        "shelf: row tuples + FastJSONResponse": lambda: FastJSONResponse(
+            row_dicts(shelf_rows, SHELF_FIELDS, SHELF_FIELDS)
+        ),
+    }
+
+    print(f"{args.rows} rows, best of {args.repeat}, orjson={'yes' if orjson else 'no'}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:<50} {best * 1000:8.1f} ms  {best / args.rows * 1e6:6.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
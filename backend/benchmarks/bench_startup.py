@@ -0,0 +1,80 @@
+"""Import-to-first-request time of the app in a fresh interpreter.
+
+Each run starts a new Python process that imports ``app.main`` and serves
+``GET /`` in-process, against an empty temporary database. The test suite
+runs one measurement (tests/test_startup.py) so startup regressions fail CI.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from .loadgen import BACKEND_DIR, temp_database
+
+# modules that should only load once a request actually needs them
+LAZY_MODULES = ("bcrypt", "jose", "passlib", "flask")
+
+PROBE = f"""
+import asyncio, json, sys, time
+import httpx
+
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        return await client.get("/")
+
+status = asyncio.run(first_request()).status_code
+served = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_request_s": served - imported,
+    "total_s": served - started,
+    "status": status,
+    "loaded_lazy_modules": [name for name in {LAZY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_startup(database_url):
+    """Run the probe once and return its timings plus whether the DB was touched."""
+    env = {**os.environ, "DATABASE_URL": database_url, "INIT_DB_ON_STARTUP": "0"}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    path = database_url.removeprefix("sqlite:///")
+    result["database_created"] = os.path.exists(path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        with temp_database() as url:
+            runs.append(measure_startup(url))
+    for key in ("import_s", "first_request_s", "total_s"):
+        values = [run[key] * 1000 for run in runs]
+        print(f"{key[:-2]:>15}: median {statistics.median(values):7.1f} ms  max {max(values):7.1f} ms")
+    print(f"lazy modules loaded at startup: {runs[-1]['loaded_lazy_modules'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
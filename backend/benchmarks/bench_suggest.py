@@ -0,0 +1,90 @@
+"""Build time, memory and lookup latency of the typeahead index.
+
+Loads a PrefixIndex with synthetic titles and authors (the benchmark
+catalog's generator, no database), then times typed-so-far prefixes the way
+search-as-you-type sends them. Exits non-zero when the index is over its
+memory budget or p99 lookup latency is over --p99-budget-ms.
+
+    python -m benchmarks.bench_suggest --titles 1000000
+"""
+import argparse
+import json
+import random
+import resource
+import statistics
+import sys
+import time
+
+from app.suggest import SUGGEST_MEMORY_BUDGET, PrefixIndex
+
+from .seed import FIRST, LAST, WORDS, title_words
+
+
+def _rows(count, rng):
+    for book_id in range(1, count + 1):
+        yield book_id, f"{title_words(rng)} {book_id}", f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+
+
+def _queries(count, rng):
+    for _ in range(count):
+        word = rng.choice(WORDS + LAST)
+        typed = word[: rng.randint(1, len(word))]
+        yield f"{rng.choice(WORDS)} {typed}" if rng.random() < 0.3 else typed
+
+
+def _max_rss():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(titles, queries, seed=11):
+    rng = random.Random(seed)
+    index = PrefixIndex()
+    rows = list(_rows(titles, rng))
+    rss_before = _max_rss()
+    started = time.perf_counter()
+    index.load(rows)
+    build_s = time.perf_counter() - started
+    footprint = index.footprint()
+    del rows
+
+    timings = []
+    for query in _queries(queries, rng):
+        started = time.perf_counter()
+        index.suggest(query)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    started = time.perf_counter()
+    for book_id in range(titles + 1, titles + 101):
+        index.add(book_id, f"{title_words(rng)} {book_id}", "Jane Austen")
+    add_ms = (time.perf_counter() - started) * 10  # per add, in ms
+
+    return {
+        "titles": titles,
+        "build_s": round(build_s, 2),
+        "footprint_mb": round(footprint / 2**20, 1),
+        "bytes_per_title": round(footprint / titles),
+        "peak_rss_growth_mb": round((_max_rss() - rss_before) / 2**20, 1),
+        "budget_mb": SUGGEST_MEMORY_BUDGET // 2**20,
+        "p50_us": round(statistics.median(timings) * 1e6, 1),
+        "p99_us": round(timings[int(len(timings) * 0.99)] * 1e6, 1),
+        "add_ms": round(add_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--titles", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--p99-budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    result = measure(args.titles, args.queries)
+    print(json.dumps(result, indent=2))
+    if result["footprint_mb"] > result["budget_mb"] or result["p99_us"] > args.p99_budget_ms * 1000:
+        sys.exit("typeahead index over its memory or latency budget")
+
+
+if __name__ == "__main__":
+    main()
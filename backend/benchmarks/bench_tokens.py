@@ -0,0 +1,110 @@
+"""Per-request cost of validating an access token.
+
+Times each step of what `get_current_user` does before it reaches the
+principal: verifying the JWT, checking its claims, and looking its family
+and id up in the revocation list holding --revoked ids. For comparison it
+also times the same lookup as a primary-key query against revoked_tokens,
+which is what the in-memory list saves on every request. Also reports the
+list's memory, and how long a worker takes to reload it after another one
+revoked something.
+
+    python -m benchmarks.bench_tokens --revoked 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.auth import ACCESS, create_access_token, decode_token, token_claims
+from app.models_db import RevokedToken
+from app.tokens import RevocationList, new_token_id
+
+
+def _timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "p50_us": round(statistics.median(timings) * 1e6, 2),
+        "p99_us": round(timings[int(len(timings) * 0.99)] * 1e6, 2),
+    }
+
+
+def measure(revoked, repeat):
+    now = time.time()
+    rows = [
+        # spread over a week, like refresh-token lifetimes
+        {"token_id": new_token_id(), "expires_at": now + 60 + index * 604800 / revoked}
+        for index in range(revoked)
+    ]
+    token = create_access_token(
+        {"sub": "1", "role": "user", "name": "Reader", "email": "reader@example.com"},
+        new_token_id(),
+    )
+    payload = decode_token(token)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'tokens.db')}")
+        RevokedToken.__table__.create(engine)
+        with Session(engine) as db:
+            db.execute(insert(RevokedToken), rows)
+            db.commit()
+
+            revocations = RevocationList(sync_interval=0)
+            started = time.perf_counter()
+            revocations.load(db)
+            load_ms = (time.perf_counter() - started) * 1000
+            # again, traced: tracing slows the load down
+            tracemalloc.start()
+            probe = RevocationList(sync_interval=0)
+            probe.load(db)
+            footprint = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del probe
+
+            lookup = select(RevokedToken.token_id).where(
+                RevokedToken.token_id.in_((payload["fam"], payload["jti"]))
+            )
+            database = _timed(lambda: db.execute(lookup).first(), repeat)
+        engine.dispose()
+
+    revocations.sync_interval = 3600  # the hot path between syncs
+    steps = {
+        "decode": _timed(lambda: decode_token(token), repeat),
+        "claims": _timed(lambda: token_claims(token, ACCESS), repeat),
+        "revocation_check": _timed(lambda: revocations.revoked(payload), repeat),
+        "stale_check": _timed(lambda: revocations.stale, repeat),
+        "database_check": database,
+    }
+    return {
+        "revoked": revoked,
+        "memory_mb": round(footprint / 2**20, 1),
+        "bytes_per_id": round(footprint / max(revoked, 1)),
+        "reload_ms": round(load_ms, 1),
+        "steps": steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20_000)
+    args = parser.parse_args()
+
+    result = measure(args.revoked, args.repeat)
+    for name, step in result["steps"].items():
+        print(f"{name:>16}: p50 {step['p50_us']} us  p99 {step['p99_us']} us")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Throughput of GET /books/ as the number of server workers grows.
+
+Starts the production server (gunicorn + uvicorn workers, shared SQLite
+cache backend) with 1, 2, 4, ... workers and drives it from several client
+processes so the load generator is not the bottleneck.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 4 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from .loadgen import drive, running_server, summarize, temp_database
+
+MIX = [
+    ("GET", "/books/", {"params": {"limit": 20}}),
+    ("GET", "/books/", {"params": {"limit": 20, "sort": "title"}}),
+    ("GET", "/books/", {"params": {"search": "wild"}}),
+    ("GET", "/books/", {}),
+]
+
+
+async def _client(base_url, concurrency, duration):
+    mix = itertools.cycle(MIX)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await drive(client, lambda _: next(mix), concurrency, 0.5)  # warm up
+        return await drive(client, lambda _: next(mix), concurrency, duration, summary=False)
+
+
+def _client_process(base_url, concurrency, duration):
+    return asyncio.run(_client(base_url, concurrency, duration))
+
+
+def measure(workers, server, clients, concurrency, duration):
+    with temp_database() as url:
+        env = {
+            "DATABASE_URL": url,
+            "CACHE_BACKEND": "sqlite",
+            "CACHE_PATH": url.removeprefix("sqlite:///") + ".cache",
+        }
+        with running_server(env=env, workers=workers, server=server) as base_url:
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                runs = list(
+                    pool.map(
+                        _client_process,
+                        [base_url] * clients,
+                        [concurrency] * clients,
+                        [duration] * clients,
+                    )
+                )
+    latencies = [latency for run in runs for latency in run[0]]
+    errors = sum(run[1] for run in runs)
+    return summarize(latencies, errors, max(run[2] for run in runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn"), default="gunicorn")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--concurrency", type=int, default=32, help="in flight per client")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = {}
+    for workers in args.workers:
+        stats = measure(workers, args.server, args.clients, args.concurrency, args.duration)
+        results[workers] = stats
+        speedup = stats["rps"] / results[args.workers[0]]["rps"] if results[args.workers[0]]["rps"] else 0
+        print(
+            f"{workers:>3} workers: {stats['rps']:>8} req/s  x{speedup:.2f}  "
+            f"p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  errors {stats['errors']}"
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compare a benchmark report against a baseline and fail on regressions.
+
+    python -m benchmarks.compare benchmarks/baseline.json results.json --tolerance 0.25
+
+A scenario regresses when its RPS drops, or its p50/p95 latency grows, by
+more than `tolerance` (a fraction of the baseline), or when it starts
+returning errors. Scenarios missing from either report are skipped.
+"""
+import argparse
+import json
+import sys
+
+# metric -> True when bigger is better
+METRICS = {"rps": True, "p50_ms": False, "p95_ms": False}
+
+
+def compare(baseline, current, tolerance):
+    """Return ``(rows, regressions)``; rows are printable comparison lines."""
+    rows, regressions = [], []
+    for target, scenarios in current["results"].items():
+        for scenario, stats in scenarios.items():
+            before = baseline["results"].get(target, {}).get(scenario)
+            if before is None:
+                continue
+            name = f"{target}/{scenario}"
+            for metric, higher_is_better in METRICS.items():
+                old, new = before[metric], stats[metric]
+                if not old:
+                    continue
+                change = (new - old) / old
+                worse = -change if higher_is_better else change
+                line = f"{name:<20} {metric:<7} {old:>10} -> {new:<10} {change:+.0%}"
+                rows.append(line)
+                if worse > tolerance:
+                    regressions.append(line)
+            if stats["errors"] and not before["errors"]:
+                regressions.append(f"{name:<20} errors  0 -> {stats['errors']}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with open(args.baseline) as stream:
+        baseline = json.load(stream)
+    with open(args.current) as stream:
+        current = json.load(stream)
+
+    rows, regressions = compare(baseline, current, args.tolerance)
+    print("\n".join(rows))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Small helpers shared by the benchmark scripts.
+
+Benchmarks are run by hand from the backend directory, e.g.
+``python -m benchmarks.bench_db_modes``; they are not part of the test suite
+(except the startup probe, which tests/test_startup.py runs once).
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def temp_database():
+    with tempfile.TemporaryDirectory() as directory:
+        yield f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+
+@contextlib.contextmanager
+def running_server(env=None, workers=1, extra_args=(), server="uvicorn"):
+    """Initialise the database, start the server on a free port and yield its base URL.
+
+    `server` is "uvicorn" (``--workers``) or "gunicorn" (gunicorn.conf.py).
+    """
+    # one load generator would trip the per-client rate limits
+    env = {"ADMISSION_ENABLED": "0", **os.environ, **(env or {})}
+    subprocess.run(
+        [sys.executable, "-m", "app.cli", "init-db", "--seed"], cwd=BACKEND_DIR, env=env, check=True
+    )
+    port = free_port()
+    if server == "gunicorn":
+        command = [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+            "--log-level", "warning", *extra_args, "app.main:app",
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", *extra_args,
+        ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("server did not start")
+            time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(0.50), 2),
+        "p95_ms": round(percentile(0.95), 2),
+        "p99_ms": round(percentile(0.99), 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def drive(client, next_request, concurrency, duration, summary=True):
+    """Keep `concurrency` requests in flight for `duration` seconds.
+
+    `next_request(worker_index)` returns ``(method, url, kwargs)``. With
+    ``summary=False`` the raw ``(latencies, errors, elapsed)`` come back, for
+    merging runs from several client processes.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(index):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            method, url, kwargs = next_request(index)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.monotonic() - started
+    if not summary:
+        return latencies, errors, elapsed
+    return summarize(latencies, errors, elapsed)
@@ -0,0 +1,141 @@
+"""Deterministic synthetic catalogs for the benchmark suite.
+
+    python -m benchmarks.seed --catalog 100k --users 10000
+
+Seeded databases are cached by size and seed under BENCH_DATA_DIR (the
+system temp directory by default), so a 1M-book catalog is built once.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.models_db import Base, Book, User, UserBook
+from app.passwords import BCRYPT_ROUNDS, _hash
+from app.search import search_index
+from app.stats import rebuild_stats
+
+CATALOGS = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DATA_DIR = os.getenv("BENCH_DATA_DIR", os.path.join(tempfile.gettempdir(), "library-bench"))
+PASSWORD = "bench-password"
+TOTAL_PAGES = 300
+CHUNK = 10_000
+
+WORDS = (
+    "shadow river winter garden silent empire stone crown ocean forest storm glass "
+    "night memory island letter iron summer wild journey secret mountain broken fire "
+    "last golden house city song dream star lost hidden voyage north king daughter "
+    "war peace light dark road wind time heart sea sky blood moon paper bridge"
+).split()
+FIRST = "Anna Jack Leo Mary Charles Arthur Jane Emily Oscar Virginia Franz Herman".split()
+LAST = "London Tolstoy Wells Doyle Dickens Austen Bronte Wilde Woolf Kafka Melville".split()
+
+
+def title_words(rng):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4)))
+
+
+def _book_rows(count, rng):
+    for book_id in range(1, count + 1):
+        words = title_words(rng)
+        yield {
+            "id": book_id,
+            # the id suffix keeps titles unique, like a real catalog's editions
+            "title": f"{words} {book_id}",
+            "author": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            "year": rng.randint(1600, 2024),
+            "description": f"{words}. " + " ".join(rng.choice(WORDS) for _ in range(40)),
+            "cover_url": f"https://covers.example.com/{book_id}.jpg",
+            "pdf_url": None,
+        }
+
+
+def _chunks(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed(url, books, users, shelf_size, seed=42):
+    """Create the schema and fill it with `books`, `users` and their shelves."""
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    # one hash for everyone: signing in still pays the full bcrypt cost
+    password = _hash(PASSWORD.encode(), BCRYPT_ROUNDS)
+    with Session(engine) as db:
+        for chunk in _chunks(_book_rows(books, rng)):
+            db.execute(insert(Book), chunk)
+        db.execute(
+            insert(User),
+            [
+                {
+                    "id": user_id,
+                    "name": f"Reader {user_id}",
+                    "email": f"reader{user_id}@example.com",
+                    "password": password,
+                    "role": "user",
+                }
+                for user_id in range(1, users + 1)
+            ],
+        )
+        shelves = (
+            {
+                "user_id": user_id,
+                "book_id": book_id,
+                "status": "Started",
+                "progress": 0,
+                "current_page": 1,
+                "total_pages": TOTAL_PAGES,
+            }
+            for user_id in range(1, users + 1)
+            for book_id in rng.sample(range(1, books + 1), min(shelf_size, books))
+        )
+        for chunk in _chunks(shelves):
+            db.execute(insert(UserBook), chunk)
+        rebuild_stats(db)
+        db.commit()
+        search_index.rebuild(db)
+    engine.dispose()
+
+
+def seeded_database(catalog, users, shelf_size, seed_value=42):
+    """Path of a cached database for these parameters, seeding it if needed."""
+    books = CATALOGS[catalog]
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(
+        DATA_DIR, f"{catalog}-u{users}-s{shelf_size}-r{BCRYPT_ROUNDS}-{seed_value}.db"
+    )
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        seed(f"sqlite:///{partial}", books, users, shelf_size, seed_value)
+        os.replace(partial, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--catalog", choices=CATALOGS, default="1k")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--shelf", type=int, default=20, help="books per user shelf")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = seeded_database(args.catalog, args.users, args.shelf, args.seed)
+    print(f"{path} ready in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Reproducible API benchmark: realistic request mixes over a synthetic catalog.
+
+Seeds (or reuses) a catalog, then drives each scenario for `--duration`
+seconds against the in-process ASGI app (httpx.ASGITransport, no network)
+and/or a local uvicorn, and writes p50/p95/p99/RPS per scenario as JSON.
+
+    python -m benchmarks.suite --catalog 100k --targets asgi uvicorn --output results.json
+    python -m benchmarks.compare benchmarks/baseline.json results.json
+
+Set BCRYPT_ROUNDS low (e.g. 4) to keep the signin scenario from being all
+bcrypt; the value is recorded in the report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import httpx
+
+from .loadgen import BACKEND_DIR, drive, running_server
+
+TOKEN_USERS = 1000
+PAGE_SIZE = 20
+
+# weights of the "mixed" scenario: mostly catalog reads, some shelf traffic
+MIXED = {"search": 50, "browse": 20, "shelf": 15, "progress": 10, "signin": 5}
+
+
+class Workload:
+    """Request generators over one seeded database."""
+
+    def __init__(self, path, users, seed=7):
+        # app modules are imported late, see main()
+        from sqlalchemy import create_engine, select
+
+        from app.auth import create_access_token, principal_claims
+        from app.models_db import UserBook
+
+        from .seed import PASSWORD, TOTAL_PAGES, WORDS
+
+        self.rng = random.Random(seed)
+        self.words = WORDS
+        self.password = PASSWORD
+        self.total_pages = TOTAL_PAGES
+        self.users = users
+        engine = create_engine(f"sqlite:///{path}")
+        token_users = range(1, min(users, TOKEN_USERS) + 1)
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(UserBook.user_id, UserBook.book_id).where(
+                    UserBook.user_id <= token_users[-1]
+                )
+            )
+            self.shelves = {}
+            for user_id, book_id in rows:
+                self.shelves.setdefault(user_id, []).append(book_id)
+            self.books = conn.exec_driver_sql("SELECT max(id) FROM books").scalar()
+        engine.dispose()
+        # tokens are minted directly; signing in is its own scenario
+        self.headers = {
+            user_id: {
+                "Authorization": "Bearer "
+                + create_access_token(
+                    principal_claims(
+                        SimpleNamespace(
+                            id=user_id,
+                            role="user",
+                            name=f"Reader {user_id}",
+                            email=f"reader{user_id}@example.com",
+                        )
+                    )
+                )
+            }
+            for user_id in self.shelves
+        }
+
+    def search(self):
+        # search-as-you-type: one word, as much of it as has been typed so far
+        word = self.rng.choice(self.words)
+        prefix = word[: self.rng.randint(2, len(word))]
+        return "GET", "/books/", {"params": {"search": prefix, "limit": PAGE_SIZE}}
+
+    def browse(self):
+        if self.rng.random() < 0.5:
+            return "GET", f"/books/{self.rng.randint(1, self.books)}", {}
+        return "GET", "/books/", {"params": {"limit": PAGE_SIZE}}
+
+    def shelf(self):
+        user_id = self.rng.choice(list(self.headers))
+        return "GET", "/books/user-books", {"headers": self.headers[user_id]}
+
+    def progress(self):
+        user_id = self.rng.choice(list(self.headers))
+        book_id = self.rng.choice(self.shelves[user_id])
+        body = {"current_page": self.rng.randint(1, self.total_pages - 1)}
+        return "PUT", f"/books/user-books/{book_id}", {
+            "headers": self.headers[user_id],
+            "json": body,
+        }
+
+    def signin(self):
+        user_id = self.rng.randint(1, self.users)
+        body = {"email": f"reader{user_id}@example.com", "password": self.password}
+        return "POST", "/auth/signin", {"json": body}
+
+    def scenario(self, name):
+        if name != "mixed":
+            generator = getattr(self, name)
+            return lambda _: generator()
+        names, weights = zip(*MIXED.items())
+        return lambda _: getattr(self, self.rng.choices(names, weights)[0])()
+
+
+SCENARIOS = ("search", "browse", "shelf", "progress", "signin", "mixed")
+
+
+async def run_scenarios(client, workload, scenarios, concurrency, duration):
+    results = {}
+    for name in scenarios:
+        next_request = workload.scenario(name)
+        await drive(client, next_request, concurrency, min(1.0, duration))  # warm up
+        results[name] = await drive(client, next_request, concurrency, duration)
+        stats = results[name]
+        print(
+            f"  {name:>9}: {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>7} ms  "
+            f"p95 {stats['p95_ms']:>7} ms  p99 {stats['p99_ms']:>7} ms  errors {stats['errors']}",
+            file=sys.stderr,
+        )
+    return results
+
+
+async def bench_asgi(workload, scenarios, concurrency, duration):
+    from app import database
+    from app.main import create_app
+
+    transport = httpx.ASGITransport(app=create_app())
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=60
+        ) as client:
+            return await run_scenarios(client, workload, scenarios, concurrency, duration)
+    finally:
+        # close pooled connections before the next target replaces the file
+        database.engine.dispose()
+        if database.async_engine is not None:
+            await database.async_engine.dispose()
+
+
+async def bench_server(url, workload, scenarios, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await run_scenarios(client, workload, scenarios, concurrency, duration)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--catalog", choices=("1k", "100k", "1m"), default="1k")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--shelf", type=int, default=20)
+    parser.add_argument("--targets", nargs="+", choices=("asgi", "uvicorn"), default=["asgi"])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="library-suite-")
+    working_copy = os.path.join(workdir, "bench.db")
+    # app.database binds its engine to DATABASE_URL on import, so point it at
+    # the working copy before any app module is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{working_copy}"
+    # one load generator would trip the per-client rate limits, as in
+    # loadgen.running_server; bench_admission measures the limiter itself
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+    from .seed import seeded_database
+
+    try:
+        source = seeded_database(args.catalog, args.users, args.shelf)
+        report = {
+            "meta": {
+                "catalog": args.catalog,
+                "users": args.users,
+                "shelf": args.shelf,
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "bcrypt_rounds": int(os.getenv("BCRYPT_ROUNDS", "12")),
+                "db_mode": os.getenv("DB_MODE", "sync"),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "revision": _git_revision(),
+            },
+            "results": {},
+        }
+        for target in args.targets:
+            # every target starts from the pristine seeded catalog
+            shutil.copyfile(source, working_copy)
+            workload = Workload(working_copy, args.users)
+            print(f"{target}:", file=sys.stderr)
+            if target == "asgi":
+                results = asyncio.run(
+                    bench_asgi(workload, args.scenarios, args.concurrency, args.duration)
+                )
+            else:
+                with running_server(env={"DATABASE_URL": os.environ["DATABASE_URL"]}) as url:
+                    results = asyncio.run(
+                        bench_server(url, workload, args.scenarios, args.concurrency, args.duration)
+                    )
+            report["results"][target] = results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as stream:
+            stream.write(rendered + "\n")
+    else:
+        print(rendered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py app.main:app``.
+
+gunicorn supervises uvicorn workers: it restarts crashed workers, recycles
+them after MAX_REQUESTS, and on SIGHUP replaces them one generation at a
+time while in-flight requests finish (up to GRACEFUL_TIMEOUT seconds).
+With preload_app the app is imported once in the master and forked, so a
+HUP re-forks the loaded code. Ship new code by restarting the container, or
+send USR2 and then TERM to the old master.
+
+``uvicorn app.main:app --workers N`` also works for a quick multi-process run
+(no preload, same caches), see benchmarks/bench_workers.py.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8003")
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+# passed through to uvicorn as timeout_keep_alive; keep it above the load
+# balancer's idle timeout so it never reuses a connection we just closed
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("ACCESS_LOG", None)
+errorlog = "-"
+
+# Caches must agree across workers. This file is read before the app is
+# imported, so the default lands in time for app.cache.
+if workers > 1:
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+
+def on_starting(server):
+    # counters and principals from a previous run may describe another database
+    from app.cache import cache_backend
+
+    cache_backend.clear()
+
+
+def post_fork(server, worker):
+    # pooled connections opened in the master must not be shared with children
+    from app import database
+
+    database.engine.dispose(close=False)
+    if database.async_engine is not None:
+        database.async_engine.sync_engine.dispose(close=False)
@@ -2,3 +2,7 @@ import os
 import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# the suite signs in and searches far faster than the production limits allow;
+# tests/test_admission.py covers the middleware on its own app
+os.environ.setdefault("ADMISSION_ENABLED", "0")
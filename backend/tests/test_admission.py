@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import cache
+from app.admission import (
+    ADMISSION_MAX_BUCKETS,
+    AdmissionMiddleware,
+    Limit,
+    Rule,
+    admission_rejected,
+    default_rules,
+)
+from app.auth import encode_token
+from app.cache import MemoryBackend, NamespacedCache, SQLiteBackend
+
+now = [1000.0]
+release = asyncio.Event()
+
+app = FastAPI()
+
+
+@app.post("/auth/signin")
+def signin():
+    return {"ok": True}
+
+
+@app.get("/books/")
+async def list_books(search: str = ""):
+    if search == "slow":
+        await release.wait()
+    return {"search": search}
+
+
+def _middleware(max_in_flight=32):
+    store = NamespacedCache("admission", backend=MemoryBackend(clock=lambda: now[0]))
+    rules = (
+        Rule("auth", Limit.parse("2/minute"), methods=("POST",), paths=("/auth/signin",),
+             per_address=True, expensive=True),
+        Rule("search", Limit.parse("3/second"), methods=("GET",), paths=("/books/",),
+             param="search", expensive=True),
+        Rule("default", Limit.parse("5/second")),
+    )
+    return AdmissionMiddleware(app, rules=rules, store=store, max_in_flight=max_in_flight)
+
+
+def _client(middleware, address):
+    transport = httpx.ASGITransport(app=middleware, client=(address, 1234))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_limit_parse():
+    assert Limit.parse("10/minute") == Limit(interval=6, burst=10)
+    assert Limit.parse("off") is None
+    with pytest.raises(ValueError):
+        Limit.parse("10 per minute")
+    assert [rule.name for rule in default_rules()] == ["auth", "search", "default"]
+
+
+def test_buckets_are_per_client_and_per_rule():
+    async def scenario():
+        middleware = _middleware()
+        before = admission_rejected.value(rule="search", reason="rate")
+        async with _client(middleware, "10.0.0.1") as flooder, _client(middleware, "10.0.0.2") as other:
+            statuses = [(await flooder.get("/books/?search=war")).status_code for _ in range(4)]
+            assert statuses == [200, 200, 200, 429]
+            rejected = await flooder.get("/books/?search=war")
+            assert rejected.headers["retry-after"] == "1"
+
+            # other routes and other clients have their own buckets
+            assert (await flooder.get("/books/")).status_code == 200
+            assert (await other.get("/books/?search=war")).status_code == 200
+
+            now[0] += 1
+            assert (await flooder.get("/books/?search=war")).status_code == 200
+        assert admission_rejected.value(rule="search", reason="rate") == before + 2
+
+    asyncio.run(scenario())
+
+
+def test_signed_in_users_are_limited_by_user_except_on_sign_in():
+    async def scenario():
+        middleware = _middleware()
+        headers = {"Authorization": f"Bearer {encode_token({'sub': '7'})}"}
+        async with _client(middleware, "10.0.0.3") as first, _client(middleware, "10.0.0.4") as second:
+            # one user behind two addresses shares one bucket
+            for _ in range(3):
+                assert (await first.get("/books/?search=a", headers=headers)).status_code == 200
+            assert (await second.get("/books/?search=a", headers=headers)).status_code == 429
+            # a forged token counts against the address instead
+            forged = {"Authorization": "Bearer not-a-token"}
+            assert (await second.get("/books/?search=a", headers=forged)).status_code == 200
+
+            # sign-in is per address, whatever token is sent
+            for _ in range(2):
+                assert (await first.post("/auth/signin", headers=headers)).status_code == 200
+            response = await first.post("/auth/signin", headers=headers)
+            assert response.status_code == 429
+            assert response.headers["retry-after"] == "30"
+            assert (await second.post("/auth/signin", headers=headers)).status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_expensive_requests_over_the_cap_are_shed():
+    async def scenario():
+        middleware = _middleware(max_in_flight=1)
+        release.clear()
+        async with _client(middleware, "10.0.0.5") as slow, _client(middleware, "10.0.0.6") as other:
+            pending = asyncio.ensure_future(slow.get("/books/?search=slow"))
+            while middleware.in_flight == 0:
+                await asyncio.sleep(0)
+
+            shed = await other.get("/books/?search=war")
+            assert shed.status_code == 503 and shed.headers["retry-after"] == "1"
+            # cheap routes are not capped
+            assert (await other.get("/books/")).status_code == 200
+
+            release.set()
+            assert (await pending).status_code == 200
+            assert middleware.in_flight == 0
+            assert (await other.get("/books/?search=war")).status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_buckets_stay_out_of_the_shared_memory_cache(tmp_path, monkeypatch):
+    store = AdmissionMiddleware(app).store
+    assert store.backend is not cache.cache_backend
+    assert store.backend.maxsize == ADMISSION_MAX_BUCKETS
+
+    # a shared backend has no LRU to flood, and keeps workers' limits in step
+    shared = SQLiteBackend(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "cache_backend", shared)
+    assert AdmissionMiddleware(app).store.backend is shared
@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.auth import principal_cache
 from app.database import get_db
 from app.models_db import Base
 from sqlalchemy import create_engine
@@ -33,6 +34,8 @@ def setup_database():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    # ids are reused once the tables are dropped
+    principal_cache.clear()
 
 
 def test_register_user():
@@ -87,3 +90,245 @@ def test_login_invalid_credentials():
     assert response.status_code == 400
     data = response.json()
     assert "detail" in data
+
+
+def test_login_rehashes_when_cost_changes(monkeypatch):
+    from app.models_db import User
+    from app.passwords import password_hasher
+
+    client.post(
+        "/auth/signup",
+        json={
+            "name": "Test User",
+            "email": "test@example.com",
+            "password": "testpassword123",
+            "role": "user",
+        },
+    )
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+
+    response = client.post(
+        "/auth/signin",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(User).filter(User.email == "test@example.com").one().password
+    finally:
+        db.close()
+    assert stored.startswith("$2b$05$")
+
+
+def _use_async_sessions(monkeypatch):
+    """Serve requests the way DB_MODE=async does."""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from app.database import async_database_url
+
+    async def async_db():
+        # TestClient may run each request on a new event loop
+        async_engine = create_async_engine(
+            async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool
+        )
+        try:
+            # expire_on_commit left at its default, as in AsyncSessionLocal
+            async with AsyncSession(async_engine) as db:
+                yield db
+        finally:
+            await async_engine.dispose()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, async_db)
+
+
+def test_async_login_rehashes_when_cost_changes(monkeypatch):
+    from app.models_db import User
+    from app.passwords import password_hasher
+
+    client.post(
+        "/auth/signup",
+        json={
+            "name": "Test User",
+            "email": "test@example.com",
+            "password": "testpassword123",
+            "role": "user",
+        },
+    )
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    _use_async_sessions(monkeypatch)
+
+    response = client.post(
+        "/auth/signin",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).json()["email"] == "test@example.com"
+
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(User).filter(User.email == "test@example.com").one().password
+    finally:
+        db.close()
+    assert stored.startswith("$2b$05$")
+
+
+def test_metrics_endpoint_reports_password_jobs():
+    client.post(
+        "/auth/signin",
+        json={"email": "nobody@example.com", "password": "wrongpassword"},
+    )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE password_hash_jobs_total counter" in response.text
+
+
+def _signup_and_signin():
+    client.post(
+        "/auth/signup",
+        json={
+            "name": "Test User",
+            "email": "test@example.com",
+            "password": "testpassword123",
+            "role": "user",
+        },
+    )
+    response = client.post(
+        "/auth/signin",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_principal_cache_is_invalidated_on_profile_update():
+    from app.auth import principal_cache
+
+    principal_cache.clear()
+    headers = _signup_and_signin()
+    assert client.get("/users/me", headers=headers).json()["name"] == "Test User"
+    hits = principal_cache.hits
+    assert client.get("/users/me", headers=headers).json()["name"] == "Test User"
+    assert principal_cache.hits == hits + 1
+
+    response = client.put(
+        "/users/update",
+        json={"name": "Renamed User", "email": "test@example.com", "password": ""},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert client.get("/users/me", headers=headers).json()["name"] == "Renamed User"
+
+    client.delete("/users/delete", headers=headers)
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_stateless_mode_authorizes_from_claims(monkeypatch):
+    from app import auth
+
+    headers = _signup_and_signin()
+    # loads the revocation list, which is then checked from memory
+    assert client.get("/users/me", headers=headers).status_code == 200
+    monkeypatch.setattr(auth, "AUTH_STATELESS", True)
+    auth.principal_cache.clear()
+
+    def no_database():
+        # any query against this "session" would fail the request
+        yield object()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, no_database)
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == "test@example.com"
+
+
+def _signin_tokens():
+    _signup_and_signin()
+    return client.post(
+        "/auth/signin",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    ).json()
+
+
+def test_refresh_rotates_and_rejects_access_tokens():
+    tokens = _signin_tokens()
+    access = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.post("/auth/refresh", headers=access).status_code == 401
+    # a refresh token is not an access token either
+    refresh = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    assert client.get("/users/me", headers=refresh).status_code == 401
+
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    rotated = rotated.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/users/me", headers=headers).json()["email"] == "test@example.com"
+    again = client.post("/auth/refresh", headers={"Authorization": f"Bearer {rotated['refresh_token']}"})
+    assert again.status_code == 200
+
+
+def test_reusing_a_refresh_token_revokes_its_family():
+    tokens = _signin_tokens()
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    replay = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replay.status_code == 401
+    # the legitimate holder's newer tokens are revoked with it
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+    # other sign-ins are unaffected
+    headers = {"Authorization": f"Bearer {_signin_tokens()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_logout_revokes_the_sign_in():
+    tokens = _signin_tokens()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+
+def test_revocations_reach_other_workers_and_expire():
+    from app.tokens import RevocationList
+
+    now = [1_000_000.0]
+    worker, other = (RevocationList(sync_interval=0, clock=lambda: now[0]) for _ in range(2))
+    db = TestingSessionLocal()
+    try:
+        worker.load(db)
+        other.load(db)
+        worker.revoke(db, "family-a", now[0] + 60)
+        worker.revoke(db, "family-b", now[0] + 7200)
+        assert "family-a" in worker and not worker.stale
+
+        assert other.stale and "family-a" not in other
+        other.load(db)
+        assert other.revoked({"fam": "family-a", "jti": "x"}) and "family-b" in other
+
+        # expired ids go an hour bucket at a time, and are not reloaded
+        now[0] += 3600
+        worker.add("family-c", now[0] + 60)
+        assert "family-a" not in worker and "family-b" in worker
+        other.load(db)
+        assert len(other) == 1
+    finally:
+        db.close()
+
+
+def test_async_sign_in_refresh_and_logout(monkeypatch):
+    _use_async_sessions(monkeypatch)
+    tokens = _signin_tokens()
+    assert "access_token" in tokens
+
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    headers = {"Authorization": f"Bearer {rotated.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+    assert client.get("/users/me", headers=headers).status_code == 401
@@ -0,0 +1,19 @@
+from benchmarks.compare import compare
+
+
+def _report(rps, p95, errors=0):
+    stats = {"rps": rps, "p50_ms": 10.0, "p95_ms": p95, "errors": errors}
+    return {"results": {"asgi": {"search": stats}}}
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = _report(rps=1000, p95=20.0)
+
+    _, regressions = compare(baseline, _report(rps=900, p95=22.0), tolerance=0.25)
+    assert regressions == []
+    # getting faster is never a regression
+    _, regressions = compare(baseline, _report(rps=3000, p95=5.0), tolerance=0.25)
+    assert regressions == []
+
+    _, regressions = compare(baseline, _report(rps=700, p95=30.0, errors=3), tolerance=0.25)
+    assert [line.split()[1] for line in regressions] == ["rps", "p95_ms", "errors"]
@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.blobs import BlobStore, BlobTooLarge
+from app.models_db import Base, BookFile
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def test_blobs_are_content_addressed_and_deduplicated(tmp_path):
+    store = BlobStore(str(tmp_path))
+
+    first = asyncio.run(store.save(_chunks(b"%PDF-1.7 ", b"body"), magic=b"%PDF-"))
+    again = asyncio.run(store.save(_chunks(b"%PDF-1.7 body"), magic=b"%PDF-"))
+
+    assert not first.deduplicated and again.deduplicated
+    assert first.digest == again.digest and first.size == 13
+    with open(store.path(first.digest), "rb") as stream:
+        assert stream.read() == b"%PDF-1.7 body"
+    assert [name for _, _, names in os.walk(tmp_path) for name in names] == [first.digest]
+
+
+def test_rejected_uploads_leave_nothing_behind(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=10)
+
+    with pytest.raises(BlobTooLarge):
+        asyncio.run(store.save(_chunks(b"%PDF-", b"123456")))
+    with pytest.raises(ValueError):
+        asyncio.run(store.save(_chunks(b"%P", b"NG"), magic=b"%PDF-"))
+    with pytest.raises(ValueError):
+        asyncio.run(store.save(_chunks(b"%P"), magic=b"%PDF-"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_collect_garbage_keeps_referenced_blobs(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    kept = asyncio.run(store.save(_chunks(b"kept")))
+    dropped = asyncio.run(store.save(_chunks(b"dropped")))
+    engine = create_engine(f"sqlite:///{tmp_path / 'files.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add(BookFile(book_id=1, digest=kept.digest, media_type="application/pdf", size=4))
+        db.commit()
+
+        # fresh blobs may belong to an upload that has not committed yet
+        assert store.collect_garbage(db) == 0
+        assert store.collect_garbage(db, grace=-1) == 1
+    engine.dispose()
+    assert os.path.exists(kept.path) and not os.path.exists(dropped.path)
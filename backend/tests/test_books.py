@@ -1,8 +1,10 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 from app.main import app
 from app.database import get_db
-from app.models_db import Base
+from app.models_db import Base, UserBook
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -166,3 +168,875 @@ def test_update_book(auth_headers):
     assert data["description"] == "An updated test book description"
     assert data["cover_url"] == "https://example.com/updated-cover.jpg"
     assert data["pdf_url"] == "https://example.com/updated-book.pdf"
+
+
+def test_search_books_ranked_prefix(auth_headers):
+    books = [
+        {
+            "title": "Collected Essays",
+            "author": "Various",
+            "year": 1990,
+            "description": "Includes a short piece on Shakespeare's sonnets",
+        },
+        {
+            "title": "Shakespeare's Sonnets",
+            "author": "William Shakespeare",
+            "year": 1609,
+            "description": "A collection of poems",
+        },
+        {
+            "title": "The Call Of The Wild",
+            "author": "Jack London",
+            "year": 1903,
+            "description": "A sled dog in the Klondike",
+        },
+    ]
+    for book in books:
+        client.post("/books/", json=book, headers=auth_headers)
+
+    response = client.get("/books/", params={"search": "shakesp"})
+    assert response.status_code == 200
+    titles = [book["title"] for book in response.json()]
+    assert titles == ["Shakespeare's Sonnets", "Collected Essays"]
+
+    response = client.get("/books/", params={"search": "klondike"})
+    assert [book["title"] for book in response.json()] == ["The Call Of The Wild"]
+
+
+def test_search_index_follows_librarian_writes(auth_headers):
+    create_response = client.post(
+        "/books/",
+        json={
+            "title": "Test Book",
+            "author": "Test Author",
+            "year": 2024,
+            "description": "A test book description",
+        },
+        headers=auth_headers,
+    )
+    book_id = create_response.json()["id"]
+
+    client.put(
+        f"/books/{book_id}",
+        json={
+            "title": "Renamed Book",
+            "author": "Test Author",
+            "year": 2024,
+            "description": "A test book description",
+        },
+        headers=auth_headers,
+    )
+    assert client.get("/books/", params={"search": "renamed"}).json()[0]["id"] == book_id
+
+    client.delete(f"/books/{book_id}", headers=auth_headers)
+    assert client.get("/books/", params={"search": "renamed"}).json() == []
+
+
+def test_get_books_keyset_pagination(auth_headers):
+    for title in ["Delta", "Alpha", "Charlie", "Bravo", "Echo"]:
+        client.post(
+            "/books/",
+            json={"title": title, "author": "Author", "year": 2000, "description": "Text"},
+            headers=auth_headers,
+        )
+
+    titles = []
+    params = {"limit": 2, "sort": "title"}
+    while True:
+        response = client.get("/books/", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        titles += [book["title"] for book in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["after"] = cursor
+    assert titles == ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+
+    response = client.get("/books/", params={"limit": 3})
+    assert [book["title"] for book in response.json()] == ["Delta", "Alpha", "Charlie"]
+    response = client.get(
+        "/books/", params={"limit": 3, "after": response.headers["X-Next-Cursor"]}
+    )
+    assert [book["title"] for book in response.json()] == ["Bravo", "Echo"]
+    assert "X-Next-Cursor" not in response.headers
+
+    assert client.get("/books/", params={"after": "not-a-cursor"}).status_code == 400
+
+
+def test_get_books_field_projection_and_ndjson(auth_headers):
+    client.post(
+        "/books/",
+        json={"title": "Test Book", "author": "Test Author", "year": 2024, "description": "Long text"},
+        headers=auth_headers,
+    )
+
+    response = client.get("/books/", params={"fields": "title,author"})
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "title", "author"}
+    assert client.get("/books/", params={"fields": "password"}).status_code == 400
+
+    response = client.get("/books/", params={"format": "ndjson", "fields": "title"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["title"] == "Test Book"
+
+
+def _create_books(auth_headers, count):
+    ids = []
+    for i in range(count):
+        response = client.post(
+            "/books/",
+            json={"title": f"Book {i}", "author": "Author", "year": 2000 + i, "description": "Text"},
+            headers=auth_headers,
+        )
+        ids.append(response.json()["id"])
+    return ids
+
+
+def test_get_user_books_single_query(auth_headers):
+    from sqlalchemy import event
+
+    book_ids = _create_books(auth_headers, 5)
+    for book_id in book_ids:
+        client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    client.put(
+        f"/books/user-books/{book_ids[0]}",
+        json={"total_pages": 100, "current_page": 100},
+        headers=auth_headers,
+    )
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if "user_books" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/books/user-books", headers=auth_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    shelf = response.json()
+    assert [entry["book_id"] for entry in shelf] == book_ids
+    assert shelf[0]["status"] == "Finished" and shelf[0]["progress"] == 100
+    assert shelf[1]["title"] == "Book 1"
+    assert len(statements) == 1
+
+
+def test_batch_shelf_operations(auth_headers):
+    book_ids = _create_books(auth_headers, 3)
+    client.post(f"/books/user-books/{book_ids[2]}", headers=auth_headers)
+
+    response = client.post(
+        "/books/user-books/batch",
+        json={
+            "operations": [
+                {"op": "add", "book_id": book_ids[0]},
+                {"op": "add", "book_id": book_ids[1], "total_pages": 200, "current_page": 50},
+                {"op": "update", "book_id": book_ids[0], "total_pages": 10, "current_page": 10},
+                {"op": "remove", "book_id": book_ids[2]},
+            ]
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["removed"] == [book_ids[2]]
+    entries = {entry["book_id"]: entry for entry in result["shelf"]}
+    assert entries[book_ids[0]]["status"] == "Finished"
+    assert entries[book_ids[1]]["progress"] == 25
+
+    shelf = client.get("/books/user-books", headers=auth_headers).json()
+    assert sorted(entry["book_id"] for entry in shelf) == book_ids[:2]
+
+
+def test_batch_shelf_operations_are_atomic(auth_headers):
+    book_ids = _create_books(auth_headers, 2)
+
+    response = client.post(
+        "/books/user-books/batch",
+        json={
+            "operations": [
+                {"op": "add", "book_id": book_ids[0]},
+                {"op": "update", "book_id": book_ids[1], "current_page": 3},
+            ]
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"].startswith("Operation 1")
+    assert client.get("/books/user-books", headers=auth_headers).json() == []
+
+
+def test_catalog_conditional_get(auth_headers):
+    book_id = _create_books(auth_headers, 1)[0]
+
+    response = client.get("/books/")
+    etag = response.headers["ETag"]
+    assert "max-age" in response.headers["Cache-Control"]
+    response = client.get("/books/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(f"/books/{book_id}")
+    book_etag = response.headers["ETag"]
+    assert client.get(f"/books/{book_id}", headers={"If-None-Match": book_etag}).status_code == 304
+
+    client.put(
+        f"/books/{book_id}",
+        json={"title": "Changed", "author": "Author", "year": 2000, "description": "Text"},
+        headers=auth_headers,
+    )
+    response = client.get("/books/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Changed"
+    response = client.get(f"/books/{book_id}", headers={"If-None-Match": book_etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Changed"
+
+
+def test_catalog_cache_serves_repeat_reads_without_queries(auth_headers):
+    from sqlalchemy import event
+
+    book_id = _create_books(auth_headers, 1)[0]
+    client.get("/books/", params={"search": "book"})
+    client.get(f"/books/{book_id}")
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        assert client.get("/books/", params={"search": "book"}).json()[0]["id"] == book_id
+        assert client.get(f"/books/{book_id}").json()["id"] == book_id
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert statements == []
+
+    client.delete(f"/books/{book_id}", headers=auth_headers)
+    assert client.get(f"/books/{book_id}").status_code == 404
+    assert client.get("/books/", params={"search": "book"}).json() == []
+
+
+def test_bulk_import_and_export(auth_headers):
+    _create_books(auth_headers, 1)
+    csv_body = (
+        "title,author,year,description,cover_url,pdf_url\n"
+        "Book 0,Author,2000,Duplicate of an existing title,,\n"
+        "Imported One,Author A,1999,First,,\n"
+        "Imported Two,Author B,not-a-year,Broken,,\n"
+        "Imported Three,Author C,2001,Third,https://example.com/c.jpg,\n"
+        "Imported One,Author A,1999,Repeated in the file,,\n"
+    )
+    response = client.post(
+        "/books/import",
+        files={"file": ("books.csv", csv_body, "text/csv")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 2
+    assert report["duplicates"] == 2
+    assert report["invalid"] == 1
+    assert report["errors"][0]["line"] == 4
+
+    assert client.get("/books/", params={"search": "imported"}).json()[0]["title"].startswith("Imported")
+
+    response = client.get("/books/export", params={"format": "csv"}, headers=auth_headers)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "title,author,year,description,cover_url,pdf_url"
+    assert len(lines) == 4
+
+    response = client.get("/books/export", headers=auth_headers)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[-1]["cover_url"] == "https://example.com/c.jpg"
+
+    ndjson_body = "\n".join(json.dumps({**record, "title": record["title"] + " (copy)"}) for record in records)
+    response = client.post(
+        "/books/import",
+        files={"file": ("books.ndjson", ndjson_body, "application/x-ndjson")},
+        headers=auth_headers,
+    )
+    assert response.json()["imported"] == 3
+
+
+def test_failed_import_reports_and_shows_committed_rows(auth_headers):
+    assert client.get("/books/", params={"search": "partial"}).json() == []
+    # past the text decoder's first read, so earlier chunks commit first
+    rows = "".join(f"Partial {index},Author,2000,,,\n" for index in range(400))
+    body = ("title,author,year,description,cover_url,pdf_url\n" + rows).encode() + b"\xff\n"
+    response = client.post(
+        "/books/import",
+        params={"chunk_size": 100},
+        files={"file": ("books.csv", body, "text/csv")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+    imported = int(response.json()["detail"].split("; ")[1].split()[0])
+    assert imported >= 100
+    books = client.get("/books/", params={"search": "partial", "limit": 1000}).json()
+    assert len(books) == imported
+
+
+def test_bulk_import_requires_librarian():
+    response = client.post(
+        "/books/import", files={"file": ("books.csv", "title\n", "text/csv")}
+    )
+    assert response.status_code == 403
+
+
+def test_duplicate_shelf_add_is_rejected_by_constraint(auth_headers):
+    book_id = _create_books(auth_headers, 1)[0]
+    assert client.post(f"/books/user-books/{book_id}", headers=auth_headers).status_code == 200
+    response = client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Book already in your profile"
+    assert len(client.get("/books/user-books", headers=auth_headers).json()) == 1
+
+
+def test_buffered_progress_coalesces_and_reads_your_writes(auth_headers, monkeypatch):
+    from app.progress import progress_buffer
+    from app.routes import books
+
+    monkeypatch.setattr(books, "PROGRESS_WRITE_MODE", "buffered")
+    book_id = _create_books(auth_headers, 1)[0]
+    client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    url = f"/books/user-books/{book_id}"
+
+    try:
+        client.put(url, json={"total_pages": 200}, headers=auth_headers)
+        for page in (10, 20, 50):
+            response = client.put(url, json={"current_page": page}, headers=auth_headers)
+        assert response.json()["progress"] == 25
+        # validation still runs against the pending state
+        assert client.put(url, json={"current_page": 300}, headers=auth_headers).status_code == 400
+
+        db = TestingSessionLocal()
+        try:
+            stored = db.query(UserBook).filter(UserBook.book_id == book_id).one()
+            assert (stored.current_page, stored.total_pages) == (0, 0)
+            shelf = client.get("/books/user-books", headers=auth_headers).json()
+            assert shelf[0]["current_page"] == 50 and shelf[0]["status"] == "Started"
+
+            assert progress_buffer.flush() == 1
+            db.refresh(stored)
+            assert (stored.current_page, stored.total_pages, stored.progress) == (50, 200, 25)
+        finally:
+            db.close()
+    finally:
+        progress_buffer.take()
+
+
+def test_buffered_progress_refuses_several_workers(tmp_path, monkeypatch):
+    from app import cache
+    from app.progress import ProgressBuffer
+
+    # each worker would flush its own, possibly older, update of a pair
+    monkeypatch.setattr(cache, "cache_backend", cache.SQLiteBackend(str(tmp_path / "cache.db")))
+    with pytest.raises(RuntimeError):
+        ProgressBuffer().start()
+    monkeypatch.setattr(cache, "cache_backend", cache.MemoryBackend())
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError):
+        ProgressBuffer().start()
+
+
+def test_batch_builds_on_buffered_progress(auth_headers, monkeypatch):
+    from app.progress import progress_buffer
+    from app.routes import books
+
+    monkeypatch.setattr(books, "PROGRESS_WRITE_MODE", "buffered")
+    book_id = _create_books(auth_headers, 1)[0]
+    client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    client.put(
+        f"/books/user-books/{book_id}",
+        json={"total_pages": 100, "current_page": 40},
+        headers=auth_headers,
+    )
+
+    response = client.post(
+        "/books/user-books/batch",
+        json={"operations": [{"op": "update", "book_id": book_id, "current_page": 60}]},
+        headers=auth_headers,
+    )
+
+    assert response.json()["shelf"][0]["progress"] == 60
+    assert len(progress_buffer) == 0
+
+
+def test_failed_batch_keeps_buffered_progress(auth_headers, monkeypatch):
+    from app.progress import progress_buffer
+    from app.routes import books
+
+    monkeypatch.setattr(books, "PROGRESS_WRITE_MODE", "buffered")
+    book_id, other_id = _create_books(auth_headers, 2)
+    client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    client.put(
+        f"/books/user-books/{book_id}",
+        json={"total_pages": 100, "current_page": 40},
+        headers=auth_headers,
+    )
+
+    response = client.post(
+        "/books/user-books/batch",
+        json={"operations": [
+            {"op": "update", "book_id": book_id, "current_page": 60},
+            {"op": "remove", "book_id": other_id},
+        ]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+
+    # the page turns were committed before the batch, which rolled back alone
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(UserBook).filter(UserBook.book_id == book_id).one()
+        assert (stored.current_page, stored.progress) == (40, 40)
+    finally:
+        db.close()
+    assert len(progress_buffer) == 0
+
+
+def _stored_stats():
+    from app.stats import rebuild_stats
+    from app.models_db import AuthorShelfStats, BookShelfStats, LibraryStats, UserStats
+
+    def snapshot(db):
+        return {
+            model.__tablename__: sorted(
+                tuple(getattr(row, column.name) for column in model.__table__.columns)
+                for row in db.query(model)
+                # rebuilds leave out keys whose counters are back to zero
+                if any(getattr(row, column.name) for column in model.__table__.columns
+                       if not column.primary_key)
+            )
+            for model in (UserStats, LibraryStats, BookShelfStats, AuthorShelfStats)
+        }
+
+    db = TestingSessionLocal()
+    try:
+        incremental = snapshot(db)
+        rebuild_stats(db)
+        rebuilt = snapshot(db)
+        db.rollback()
+    finally:
+        db.close()
+    return incremental, rebuilt
+
+
+def test_reading_stats_follow_shelf_writes(auth_headers):
+    book_ids = _create_books(auth_headers, 4)
+    for book_id in book_ids[:3]:
+        client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    client.put(
+        f"/books/user-books/{book_ids[0]}",
+        json={"total_pages": 100, "current_page": 100},
+        headers=auth_headers,
+    )
+    client.put(
+        f"/books/user-books/{book_ids[1]}",
+        json={"total_pages": 200, "current_page": 50},
+        headers=auth_headers,
+    )
+
+    stats = client.get("/users/me/stats", headers=auth_headers).json()
+    assert stats == {
+        "books": 3,
+        "by_status": {"Not started": 1, "Started": 1, "Finished": 1},
+        "pages_read": 150,
+        "total_pages": 300,
+        "completion_rate": 0.3333,
+    }
+
+    client.post(
+        "/books/user-books/batch",
+        json={
+            "operations": [
+                {"op": "add", "book_id": book_ids[3], "total_pages": 10, "current_page": 10},
+                {"op": "update", "book_id": book_ids[1], "current_page": 200},
+                {"op": "remove", "book_id": book_ids[2]},
+            ]
+        },
+        headers=auth_headers,
+    )
+    client.put(
+        f"/books/{book_ids[0]}",
+        json={"title": "Book 0", "author": "Someone Else", "year": 2000, "description": "Text"},
+        headers=auth_headers,
+    )
+    client.delete(f"/books/user-books/{book_ids[3]}", headers=auth_headers)
+    client.post(f"/books/user-books/{book_ids[2]}", headers=auth_headers)
+    client.delete(f"/books/{book_ids[2]}", headers=auth_headers)
+
+    stats = client.get("/stats", headers=auth_headers).json()
+    assert stats["books"] == 2 and stats["by_status"]["Finished"] == 2
+    assert stats["pages_read"] == 300 and stats["completion_rate"] == 1.0
+    assert [entry["author"] for entry in stats["most_shelved_authors"]] == ["Author", "Someone Else"]
+    assert [entry["book_id"] for entry in stats["most_shelved_books"]] == book_ids[:2]
+
+    incremental, rebuilt = _stored_stats()
+    assert incremental == rebuilt
+
+
+def test_reading_stats_follow_buffered_progress(auth_headers, monkeypatch):
+    from app.progress import progress_buffer
+    from app.routes import books
+
+    monkeypatch.setattr(books, "PROGRESS_WRITE_MODE", "buffered")
+    book_id = _create_books(auth_headers, 1)[0]
+    client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+    try:
+        client.put(
+            f"/books/user-books/{book_id}",
+            json={"total_pages": 100, "current_page": 100},
+            headers=auth_headers,
+        )
+        assert progress_buffer.flush() == 1
+    finally:
+        progress_buffer.take()
+
+    stats = client.get("/users/me/stats", headers=auth_headers).json()
+    assert stats["by_status"]["Finished"] == 1 and stats["pages_read"] == 100
+    incremental, rebuilt = _stored_stats()
+    assert incremental == rebuilt
+
+
+def test_library_stats_require_librarian(auth_headers):
+    client.post(
+        "/auth/signup",
+        json={"name": "Reader", "email": "reader@example.com", "password": "readerpass123"},
+    )
+    token = client.post(
+        "/auth/signin", json={"email": "reader@example.com", "password": "readerpass123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/stats", headers=headers).status_code == 403
+    assert client.get("/users/me/stats", headers=headers).json()["books"] == 0
+
+
+def test_book_cover_proxy(auth_headers, tmp_path):
+    from app.covers import CoverCache, CoverFetchError, FetchedCover, get_cover_cache
+
+    fetched = []
+
+    async def fetcher(url):
+        fetched.append(url)
+        if "broken" in url:
+            raise CoverFetchError(url)
+        return FetchedCover(b"cover bytes", "image/gif")
+
+    app.dependency_overrides[get_cover_cache] = lambda: CoverCache(str(tmp_path), fetcher=fetcher)
+    try:
+        book_id = client.post(
+            "/books/",
+            json={"title": "Covered", "author": "Author", "year": 2000, "description": "Text",
+                  "cover_url": "https://covers.example.com/1.gif"},
+            headers=auth_headers,
+        ).json()["id"]
+        bare_id = _create_books(auth_headers, 1)[0]
+
+        response = client.get(f"/books/{book_id}/cover?size=small")
+        assert response.status_code == 200
+        assert response.content == b"cover bytes"
+        assert response.headers["content-type"] == "image/gif"
+        assert "max-age" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+        assert not etag.startswith("W/")
+
+        response = client.get(f"/books/{book_id}/cover?size=small", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert fetched == ["https://covers.example.com/1.gif"]
+
+        assert client.get(f"/books/{book_id}/cover?size=huge").status_code == 422
+        assert client.get(f"/books/{bare_id}/cover").status_code == 404
+        assert client.get("/books/9999/cover").status_code == 404
+
+        client.put(
+            f"/books/{bare_id}",
+            json={"title": "Book 0", "author": "Author", "year": 2000, "description": "Text",
+                  "cover_url": "https://broken.example.com/0.gif"},
+            headers=auth_headers,
+        )
+        assert client.get(f"/books/{bare_id}/cover").status_code == 502
+    finally:
+        del app.dependency_overrides[get_cover_cache]
+
+
+def test_book_file_upload_and_range_reads(auth_headers, tmp_path):
+    from app.blobs import BlobStore, get_blob_store
+
+    app.dependency_overrides[get_blob_store] = lambda: BlobStore(str(tmp_path))
+    content = b"%PDF-1.7\n" + bytes(range(256)) * 40 + b"%%EOF"
+    try:
+        book_ids = _create_books(auth_headers, 2)
+        url = f"/books/{book_ids[0]}/file"
+        pdf = {**auth_headers, "Content-Type": "application/pdf"}
+
+        response = client.put(url, content=content, headers=pdf, params={"filename": "b.pdf"})
+        assert response.status_code == 200
+        assert response.json()["size"] == len(content)
+        assert not response.json()["deduplicated"]
+        copy = client.put(f"/books/{book_ids[1]}/file", content=content, headers=pdf)
+        assert copy.json()["deduplicated"]
+        assert client.get(f"/books/{book_ids[0]}").json()["pdf_url"] == url
+
+        assert client.put(url, content=b"GIF89a", headers=pdf).status_code == 400
+        assert client.put(
+            url, content=content, headers={**auth_headers, "Content-Type": "text/plain"}
+        ).status_code == 415
+
+        response = client.get(url)
+        assert response.status_code == 200 and response.content == content
+        assert response.headers["etag"] == f'"{copy.json()["digest"]}"'
+
+        # a reader with the book on its shelf advances by reading
+        client.post(f"/books/user-books/{book_ids[0]}", headers=auth_headers)
+        client.put(f"/books/user-books/{book_ids[0]}", json={"total_pages": 100}, headers=auth_headers)
+        start = len(content) // 2
+        response = client.get(url, headers={**auth_headers, "Range": f"bytes={start}-{start + 99}"})
+        assert response.status_code == 206
+        assert response.content == content[start:start + 100]
+        assert response.headers["content-range"] == f"bytes {start}-{start + 99}/{len(content)}"
+        # trailer reads and anonymous reads leave progress alone
+        client.get(url, headers={**auth_headers, "Range": "bytes=-5"})
+        client.get(url, headers={"Range": f"bytes={len(content) - 200}-{len(content) - 100}"})
+        shelf = client.get("/books/user-books", headers=auth_headers).json()
+        assert shelf[0]["current_page"] == 51 and shelf[0]["status"] == "Started"
+
+        assert client.delete(url, headers=auth_headers).status_code == 204
+        assert client.get(url).status_code == 404
+        assert client.get(f"/books/{book_ids[0]}").json()["pdf_url"] is None
+        assert client.delete(f"/books/{book_ids[1]}", headers=auth_headers).status_code == 204
+    finally:
+        del app.dependency_overrides[get_blob_store]
+
+
+def test_book_file_changes_are_published(auth_headers, tmp_path, monkeypatch):
+    import os
+    from app.blobs import BlobStore, get_blob_store
+    from app.routes import files
+
+    published = []
+    monkeypatch.setattr(files.event_bus, "publish", lambda *event: published.append(event))
+    blobs = BlobStore(str(tmp_path))
+    app.dependency_overrides[get_blob_store] = lambda: blobs
+    try:
+        book_id = _create_books(auth_headers, 1)[0]
+        url = f"/books/{book_id}/file"
+        pdf = {**auth_headers, "Content-Type": "application/pdf"}
+        digest = client.put(url, content=b"%PDF-1.7\n%%EOF", headers=pdf).json()["digest"]
+        assert published[-1][:2] == ("catalog", "book.updated")
+        assert published[-1][2]["pdf_url"] == url
+
+        # a row whose blob is gone is a missing file, not a server error
+        os.remove(blobs.path(digest))
+        assert client.get(url).status_code == 404
+
+        assert client.delete(url, headers=auth_headers).status_code == 204
+        assert published[-1][2] == {**published[-2][2], "pdf_url": None}
+    finally:
+        del app.dependency_overrides[get_blob_store]
+
+
+def _concurrent_refreshes(lock, refresh, count=4):
+    """Run `count` refreshes that all start while `lock` is held elsewhere."""
+    import threading
+    import time
+
+    def work():
+        db = TestingSessionLocal()
+        try:
+            refresh(db)
+        finally:
+            db.close()
+
+    with lock:
+        threads = [threading.Thread(target=work) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)  # all of them are now waiting on the lock
+    for thread in threads:
+        thread.join()
+
+
+def test_stale_suggestions_reload_once(auth_headers, monkeypatch):
+    from app.suggest import BookSuggestions
+
+    _create_books(auth_headers, 2)
+    suggestions = BookSuggestions()
+    loads = []
+    original = suggestions.index.load
+    monkeypatch.setattr(suggestions.index, "load", lambda rows: loads.append(1) or original(rows))
+
+    _concurrent_refreshes(suggestions._load_lock, suggestions.refresh)
+    assert len(loads) == 1 and len(suggestions.index) == 2
+
+
+def test_stale_memory_search_index_rebuilds_once(auth_headers, monkeypatch):
+    from app import search
+
+    _create_books(auth_headers, 2)
+    index = search.BookSearchIndex()
+    monkeypatch.setattr(index, "_use_fts5", lambda db: False)
+    loads = []
+    original = index.memory.add
+    monkeypatch.setattr(index.memory, "add", lambda *row: loads.append(row[0]) or original(*row))
+
+    _concurrent_refreshes(index._load_lock, index._ensure_memory)
+    assert len(loads) == 2
+    db = TestingSessionLocal()
+    try:
+        assert len(index.search(db, "book")) == 2
+    finally:
+        db.close()
+
+
+def test_suggest_follows_librarian_writes(auth_headers):
+    from app.suggest import book_suggestions
+
+    db = TestingSessionLocal()
+    try:
+        book_suggestions.load(db)
+    finally:
+        db.close()
+    book_ids = _create_books(auth_headers, 2)
+    client.put(
+        f"/books/{book_ids[0]}",
+        json={"title": "Wild Nights", "author": "Emily Dickinson", "year": 1890, "description": "Poems"},
+        headers=auth_headers,
+    )
+
+    assert client.get("/books/suggest", params={"q": "wild"}).json() == [
+        {"id": book_ids[0], "title": "Wild Nights"}
+    ]
+    assert client.get("/books/suggest", params={"q": "dickins"}).json()[0]["id"] == book_ids[0]
+    assert [entry["id"] for entry in client.get("/books/suggest?q=book").json()] == book_ids[1:]
+
+    client.delete(f"/books/{book_ids[0]}", headers=auth_headers)
+    assert client.get("/books/suggest", params={"q": "wild"}).json() == []
+    assert client.get("/books/suggest", params={"q": ""}).status_code == 422
+
+
+def test_catalog_and_shelf_changes_are_pushed(auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    book_id = _create_books(auth_headers, 1)[0]
+
+    with client.websocket_connect(f"/events/ws?token={token}") as websocket:
+        renamed = {"title": "Renamed", "author": "A", "year": 2001, "description": "D"}
+        client.put(f"/books/{book_id}", json=renamed, headers=auth_headers)
+        client.post(f"/books/user-books/{book_id}", headers=auth_headers)
+        client.put(f"/books/user-books/{book_id}", json={"total_pages": 10}, headers=auth_headers)
+        client.delete(f"/books/{book_id}", headers=auth_headers)
+
+        events = [websocket.receive_json() for _ in range(4)]
+        assert [event["type"] for event in events] == [
+            "book.updated", "shelf.added", "shelf.updated", "book.deleted",
+        ]
+        assert events[0]["data"]["title"] == "Renamed"
+        assert events[2]["data"]["total_pages"] == 10
+        assert events[3]["data"] == {"id": book_id}
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/events/ws?token=forged") as websocket:
+            websocket.receive_json()
+    assert client.get("/events", params={"token": "forged"}).status_code == 401
+
+
+def test_sync_returns_only_changes_since_a_revision(auth_headers):
+    first, second, third = _create_books(auth_headers, 3)
+    client.post(f"/books/user-books/{first}", headers=auth_headers)
+    client.post(f"/books/user-books/{second}", headers=auth_headers)
+
+    full = client.get("/sync", headers=auth_headers).json()
+    assert full["reset"] and full["next"] is None
+    assert [book["id"] for book in full["books"]] == [first, second, third]
+    assert {entry["book_id"] for entry in full["shelf"]} == {first, second}
+    since = full["revision"]
+
+    assert client.get("/sync", params={"since": since}, headers=auth_headers).json() == {
+        "revision": since, "reset": False, "books": [], "deleted_books": [],
+        "shelf": [], "removed_shelf": [], "next": None,
+    }
+
+    renamed = {"title": "Renamed", "author": "A", "year": 2001, "description": "D"}
+    client.put(f"/books/{first}", json=renamed, headers=auth_headers)
+    client.put(f"/books/user-books/{second}", json={"total_pages": 50}, headers=auth_headers)
+    client.delete(f"/books/user-books/{first}", headers=auth_headers)
+    client.delete(f"/books/{third}", headers=auth_headers)
+
+    delta = client.get("/sync", params={"since": since}, headers=auth_headers).json()
+    assert not delta["reset"] and delta["revision"] > since
+    assert [book["title"] for book in delta["books"]] == ["Renamed"]
+    assert delta["deleted_books"] == [third]
+    assert [(entry["book_id"], entry["total_pages"]) for entry in delta["shelf"]] == [(second, 50)]
+    assert delta["removed_shelf"] == [first]
+
+    # anonymous callers get the catalog part
+    anonymous = client.get("/sync", params={"since": since}).json()
+    assert anonymous["deleted_books"] == [third] and anonymous["shelf"] == []
+
+
+def test_sync_pages_through_large_changes(auth_headers):
+    book_ids = _create_books(auth_headers, 5)
+    page = client.get("/sync", params={"limit": 2}).json()
+    seen = [book["id"] for book in page["books"]]
+    while page["next"]:
+        page = client.get("/sync", params={"after": page["next"], "limit": 2}).json()
+        seen += [book["id"] for book in page["books"]]
+    assert seen == book_ids
+    assert client.get("/sync", params={"after": "garbage"}).status_code == 400
+
+
+def test_pruned_tombstones_force_a_reset(auth_headers):
+    from app.sync import prune_tombstones
+
+    book_ids = _create_books(auth_headers, 2)
+    since = client.get("/sync").json()["revision"]
+    client.delete(f"/books/{book_ids[0]}", headers=auth_headers)
+
+    db = TestingSessionLocal()
+    try:
+        assert prune_tombstones(db, days=0) == 1
+    finally:
+        db.close()
+    stale = client.get("/sync", params={"since": since}).json()
+    assert stale["reset"] and [book["id"] for book in stale["books"]] == [book_ids[1]]
+
+
+def test_book_batch_is_one_query(auth_headers):
+    from sqlalchemy import event
+
+    book_ids = _create_books(auth_headers, 5)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if "books" in statement:
+            statements.append(statement)
+
+    ids = f"{book_ids[3]},{book_ids[0]},999,{book_ids[0]}"
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/books/batch", params={"ids": ids})
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    batch = response.json()
+    assert list(batch["books"]) == [str(book_ids[3]), str(book_ids[0])]
+    assert batch["books"][str(book_ids[0])]["title"] == "Book 0"
+    assert batch["missing"] == [999]
+    assert len(statements) == 1
+
+    posted = client.post("/books/batch", json={"ids": book_ids}).json()
+    assert [book["id"] for book in posted["books"].values()] == book_ids
+    assert client.get("/books/batch", params={"ids": "1,x"}).status_code == 400
+    assert client.get(f"/books/{book_ids[1]}").json()["title"] == "Book 1"
@@ -0,0 +1,93 @@
+from app import cache
+from app.auth import Principal
+from app.cache import MemoryBackend, NamespacedCache, SQLiteBackend
+from app.http_cache import ResponseCache
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "cache.db")
+    # two backends on one file stand in for two worker processes
+    first = SQLiteBackend(path, clock=lambda: now[0])
+    second = SQLiteBackend(path, clock=lambda: now[0])
+
+    principal = Principal(id=1, name="Ana", email="ana@example.com", role="user")
+    first.set("principal:1", principal, ttl=60)
+    assert second.get("principal:1") == principal
+
+    assert first.incr("catalog:generation") == 1
+    assert second.incr("catalog:generation") == 2
+    assert first.get("catalog:generation") == 2
+
+    now[0] += 61
+    assert second.get("principal:1") is None
+
+    first.set("other:1", "kept")
+    second.clear("catalog:")
+    assert first.get("catalog:generation") is None
+    assert first.get("other:1") == "kept"
+
+
+def test_namespaced_cache_counts_hits_and_clears_only_its_prefix():
+    backend = MemoryBackend()
+    principals = NamespacedCache("principal", ttl=60, backend=backend)
+    backend.set("catalog:generation", 3)
+
+    principals.set(1, "one")
+    assert principals.get(1) == "one"
+    assert principals.get(2) is None
+    assert (principals.hits, principals.misses) == (1, 1)
+
+    principals.clear()
+    assert principals.get(1) is None
+    assert backend.get("catalog:generation") == 3
+
+
+def test_catalog_invalidation_reaches_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "cache_backend", SQLiteBackend(str(tmp_path / "cache.db")))
+    worker_a, worker_b = ResponseCache(), ResponseCache()
+    list_key, book_key = worker_b.catalog_key("list"), worker_b.book_key(7)
+    unrelated_key = worker_b.book_key(8)
+
+    worker_a.invalidate_book(7)
+
+    assert worker_b.catalog_key("list") != list_key
+    assert worker_b.book_key(7) != book_key
+    assert worker_b.book_key(8) == unrelated_key
+
+
+def test_memory_backend_never_evicts_counters(monkeypatch):
+    monkeypatch.setattr(cache, "cache_backend", MemoryBackend(maxsize=4))
+    responses = ResponseCache()
+    responses.invalidate_book(7)
+    book_key = responses.book_key(7)
+
+    # a flood of other entries pushes everything else out of the LRU
+    for client in range(20):
+        cache.cache_backend.set(f"admission:ip:{client}", client)
+        cache.cache_backend.throttle(f"admission:search:{client}", 1.0, 1)
+    assert len(cache.cache_backend) == 4
+    assert responses.book_key(7) == book_key
+
+    cache.cache_backend.clear("catalog:")
+    assert responses.book_key(7) != book_key
+
+
+def test_throttle_is_a_token_bucket_on_both_backends(tmp_path):
+    now = [1000.0]
+    for backend in (
+        MemoryBackend(clock=lambda: now[0]),
+        SQLiteBackend(str(tmp_path / "cache.db"), clock=lambda: now[0]),
+    ):
+        buckets = NamespacedCache("admission", backend=backend)
+        # 3 tokens, one back every 2 seconds
+        assert [buckets.throttle("ip:a", 2, 3) for _ in range(3)] == [0, 0, 0]
+        assert buckets.throttle("ip:a", 2, 3) == 2
+        assert buckets.throttle("ip:b", 2, 3) == 0
+
+        now[0] += 2
+        assert buckets.throttle("ip:a", 2, 3) == 0
+        assert buckets.throttle("ip:a", 2, 3) == 2
+
+        now[0] += 60
+        assert [buckets.throttle("ip:a", 2, 3) for _ in range(4)] == [0, 0, 0, 2]
@@ -0,0 +1,55 @@
+import io
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import cli
+from app.catalog_io import import_books, iter_records
+from app.models_db import Base, Book
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine, Session(engine)
+
+
+def test_import_books_dedupes_and_batches(tmp_path):
+    engine, db = _session(tmp_path)
+    records = [
+        {"title": f"Title {i % 250}", "author": "Author", "year": 2000, "description": ""}
+        for i in range(1000)
+    ]
+    report = import_books(db, enumerate(records, start=1), chunk_size=100)
+    assert report.imported == 250
+    assert report.duplicates == 750
+    assert db.query(Book).count() == 250
+    db.close()
+
+
+def test_iter_records_reports_bad_ndjson_lines():
+    stream = io.StringIO('{"title": "A"}\nnot json\n\n[1, 2]\n')
+    assert list(iter_records(stream, "ndjson")) == [(1, {"title": "A"}), (2, None), (4, None)]
+
+
+def test_cli_round_trip(tmp_path, monkeypatch, capsys):
+    engine, db = _session(tmp_path)
+    monkeypatch.setattr(cli, "SessionLocal", lambda: Session(engine))
+
+    source = tmp_path / "books.ndjson"
+    source.write_text(
+        "\n".join(
+            json.dumps({"title": f"Book {i}", "author": "A", "year": 1900 + i, "description": "d"})
+            for i in range(5)
+        )
+    )
+    cli.main(["import-books", str(source)])
+    assert "imported 5" in capsys.readouterr().out
+
+    target = tmp_path / "export.csv"
+    cli.main(["export-books", str(target)])
+    lines = target.read_text().splitlines()
+    assert lines[0].startswith("title,author,year")
+    assert lines[1].startswith("Book 0,A,1900,d")
+    db.close()
@@ -0,0 +1,137 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+from app.covers import CoverCache, CoverFetchError, FetchedCover, http_fetcher
+
+
+def _png(width, height):
+    Image = pytest.importorskip("PIL.Image")
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "teal").save(output, "PNG")
+    return output.getvalue()
+
+
+class FakeFetcher:
+    def __init__(self, content, media_type="image/png"):
+        self.content = content
+        self.media_type = media_type
+        self.urls = []
+
+    async def __call__(self, url):
+        self.urls.append(url)
+        return FetchedCover(self.content, self.media_type)
+
+
+def test_cover_is_fetched_once_and_shared_by_content(tmp_path):
+    fetcher = FakeFetcher(b"not really an image", "image/gif")
+    covers = CoverCache(str(tmp_path), fetcher=fetcher)
+
+    async def scenario():
+        first, again = await asyncio.gather(
+            covers.get("https://a.example/1.gif", "original"),
+            covers.get("https://a.example/1.gif", "original"),
+        )
+        mirror = await covers.get("https://b.example/same.gif", "original")
+        return first, again, mirror
+
+    first, again, mirror = asyncio.run(scenario())
+    assert fetcher.urls == ["https://a.example/1.gif", "https://b.example/same.gif"]
+    assert first == again == mirror
+    assert first.media_type == "image/gif"
+    # undecodable images are served as they are, whatever the size
+    assert asyncio.run(covers.get("https://a.example/1.gif", "small")) == first
+
+
+def test_cover_thumbnails(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    covers = CoverCache(str(tmp_path), fetcher=FakeFetcher(_png(1000, 500)))
+
+    small = asyncio.run(covers.get("https://a.example/1.png", "small"))
+    assert small.etag.endswith("-small") and small.media_type == "image/png"
+    with Image.open(small.path) as image:
+        assert image.size == (200, 100)
+    assert asyncio.run(covers.get("https://a.example/1.png", "small")) == small
+
+
+def test_cover_cache_evicts_least_recently_used(tmp_path):
+    fetcher = FakeFetcher(b"")
+    covers = CoverCache(str(tmp_path), max_bytes=2500, fetcher=fetcher)
+
+    async def fetch(name):
+        fetcher.content = name.encode() * 1000
+        return await covers.get(f"https://a.example/{name}", "original")
+
+    a = asyncio.run(fetch("a"))
+    b = asyncio.run(fetch("b"))
+    os.utime(a.path, (1, os.stat(a.path).st_mtime))
+    asyncio.run(fetch("c"))
+
+    assert not os.path.exists(a.path) and os.path.exists(b.path)
+    # an evicted cover is fetched again
+    asyncio.run(fetch("a"))
+    assert fetcher.urls.count("https://a.example/a") == 2
+
+
+def test_failed_fetches_are_remembered_for_a_while(tmp_path):
+    urls = []
+
+    async def failing(url):
+        urls.append(url)
+        raise CoverFetchError(f"{url}: 404 text/html")
+
+    async def twice(covers):
+        for _ in range(2):
+            with pytest.raises(CoverFetchError):
+                await covers.get("https://a.example/gone.png", "small")
+
+    asyncio.run(twice(CoverCache(str(tmp_path), fetcher=failing)))
+    assert len(urls) == 1
+    asyncio.run(twice(CoverCache(str(tmp_path), fetcher=failing, failure_ttl=0)))
+    assert len(urls) == 3
+
+
+def test_malformed_cover_urls_fail_as_fetch_errors():
+    with pytest.raises(CoverFetchError):
+        asyncio.run(http_fetcher("http://[::1"))
+
+
+def test_covers_are_only_fetched_from_public_hosts(monkeypatch):
+    import httpx
+
+    from app import covers
+
+    addresses = {"covers.example": "93.184.216.34", "internal.example": "10.0.0.5"}
+
+    async def resolve(host, port):
+        return [addresses.get(host, host)]
+
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.path == "/moved.png":
+            return httpx.Response(302, headers={"Location": "http://internal.example/x.png"})
+        return httpx.Response(200, headers={"Content-Type": "image/png"}, content=b"png")
+
+    monkeypatch.setattr(covers, "_resolve", resolve)
+    transport = httpx.MockTransport(handler)
+
+    assert asyncio.run(http_fetcher("https://covers.example/cover.png", transport)).content == b"png"
+    # sent to the address that was checked, for the original host
+    assert (seen[0].url.host, seen[0].headers["host"]) == ("93.184.216.34", "covers.example")
+
+    for url in (
+        "file:///etc/passwd",
+        "http://127.0.0.1/cover.png",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/cover.png",
+        "http://internal.example/cover.png",
+        "http://covers.example/moved.png",
+    ):
+        with pytest.raises(CoverFetchError):
+            asyncio.run(http_fetcher(url, transport))
+    # the redirect was followed only as far as its check
+    assert [request.url.path for request in seen[1:]] == ["/moved.png"]
@@ -0,0 +1,52 @@
+import asyncio
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.database import async_database_url, detached_session, run_db, stream_partitions
+from app.models_db import Base, Book
+
+
+def _add_books(db: Session, count):
+    db.add_all(Book(title=f"Book {i}", author="Author", year=2000) for i in range(count))
+    db.commit()
+    return db.query(Book).count()
+
+
+async def _exercise(db):
+    assert await run_db(db, _add_books, 5) == 5
+    titles = []
+    async with detached_session(db) as session:
+        async for rows in stream_partitions(session, select(Book.title).order_by(Book.id), 2):
+            assert len(rows) <= 2
+            titles += [row.title for row in rows]
+    return titles
+
+
+def test_async_database_url():
+    assert str(async_database_url("sqlite:///./library.db")) == "sqlite+aiosqlite:///./library.db"
+    assert async_database_url("postgresql://u:p@db/library").drivername == "postgresql+asyncpg"
+
+
+def test_run_db_with_sync_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        titles = asyncio.run(_exercise(db))
+    assert titles == [f"Book {i}" for i in range(5)]
+
+
+def test_run_db_with_async_session(tmp_path):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    Base.metadata.create_all(bind=create_engine(url))
+
+    async def scenario():
+        engine = create_async_engine(async_database_url(url))
+        try:
+            async with AsyncSession(engine) as db:
+                return await _exercise(db)
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == [f"Book {i}" for i in range(5)]
@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine, text
+
+from app.db_config import (
+    InstrumentedQueuePool,
+    configure_engine,
+    engine_options,
+    pool_checkouts,
+)
+
+
+def test_sqlite_engine_gets_pragmas_and_pool_metrics(tmp_path):
+    url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = configure_engine(create_engine(url, **engine_options(url, name="test")), name="test")
+    before = pool_checkouts.value(engine="test")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert pool_checkouts.value(engine="test") == before + 1
+    engine.dispose()
+
+
+def test_postgres_options_have_pool_settings_and_no_sqlite_args():
+    options = engine_options("postgresql://user:pass@db/library")
+    assert "connect_args" not in options
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] > 0 and options["pool_recycle"] > 0
+
+
+def test_memory_sqlite_keeps_default_pool():
+    options = engine_options("sqlite://")
+    assert "poolclass" not in options and "pool_size" not in options
+    assert options["connect_args"] == {"check_same_thread": False}
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.cache import NamespacedCache, SQLiteBackend
+from app.events import RESYNC, EventBus, TooManySubscribers, events_dropped
+
+
+def test_events_reach_only_subscribers_of_their_topic():
+    bus = EventBus()
+
+    async def scenario():
+        with_shelf = bus.subscribe(["catalog", "user:1"])
+        catalog_only = bus.subscribe(["catalog"])
+        # a single worker has no log to tail
+        assert bus._tailer is None
+        bus.publish("catalog", "book.created", {"id": 7, "title": "Dune"})
+        # writers publish from threadpool workers
+        worker = threading.Thread(target=bus.publish, args=("user:1", "shelf.updated", {"book_id": 7}))
+        worker.start()
+        worker.join()
+
+        first, second = await with_shelf.next(1), await with_shelf.next(1)
+        assert (first.type, json.loads(first.data)) == ("book.created", {"id": 7, "title": "Dune"})
+        assert second.type == "shelf.updated" and second.id > first.id
+        assert json.loads(second.json())["data"] == {"book_id": 7}
+        assert second.sse().startswith(b"id: %d\nevent: shelf.updated\ndata: " % second.id)
+
+        assert (await catalog_only.next(1)).type == "book.created"
+        # a quiet subscription times out into a heartbeat
+        assert await catalog_only.next(0.01) is None
+
+        async with with_shelf, catalog_only:
+            pass
+        assert not bus._topics
+
+    asyncio.run(scenario())
+
+
+def test_a_full_queue_drops_the_subscriber_with_resync():
+    bus = EventBus(max_subscribers=1)
+    before = events_dropped.value()
+
+    async def scenario():
+        slow = bus.subscribe(["catalog"], maxsize=2)
+        with pytest.raises(TooManySubscribers):
+            bus.subscribe(["catalog"])
+
+        for book_id in range(3):
+            bus.publish("catalog", "book.updated", {"id": book_id})
+        await asyncio.sleep(0)
+
+        # the publisher never waited; the subscriber is gone and must reload
+        assert slow.closed and not bus._topics
+        assert await slow.next(1) is RESYNC
+        bus.publish("catalog", "book.updated", {"id": 9})
+        assert await slow.next(0.01) is None
+        bus.subscribe(["catalog"]).close()
+
+    asyncio.run(scenario())
+    assert events_dropped.value() == before + 1
+
+
+def test_events_reach_subscribers_of_other_workers(tmp_path):
+    shared = SQLiteBackend(str(tmp_path / "cache.db"))
+    # one bus per worker, both logging to the shared backend
+    here, there = (
+        EventBus(log=NamespacedCache("events", ttl=60, backend=shared), poll_interval=0.01)
+        for _ in range(2)
+    )
+
+    async def scenario():
+        subscription = here.subscribe(["catalog"])
+        there.publish("catalog", "book.created", {"id": 1})
+        event = await subscription.next(2)
+        assert (event.type, event.id, json.loads(event.data)) == ("book.created", 1, {"id": 1})
+
+        # a worker's own events are delivered once, not again from the log
+        here.publish("catalog", "book.updated", {"id": 1})
+        assert (await subscription.next(2)).id == 2
+        assert await subscription.next(0.1) is None
+
+        # an event that left the log before it was read
+        shared.incr("events:seq")
+        assert await subscription.next(2) is RESYNC
+        assert subscription.closed
+
+    asyncio.run(scenario())
@@ -0,0 +1,110 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app import instrumentation
+from app.instrumentation import InstrumentationMiddleware, instrument_engine, n_plus_one
+from app.metrics import Registry, SharedMetrics
+
+engine = instrument_engine(
+    create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+)
+
+app = FastAPI()
+app.add_middleware(InstrumentationMiddleware)
+
+
+@app.get("/items/{count}")
+def run_queries(count: int):
+    with engine.connect() as conn:
+        for value in range(count):
+            conn.execute(text("SELECT :value"), {"value": value})
+    return {"ran": count}
+
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(3, route="/a")
+
+    rendered = registry.render()
+    assert "# TYPE latency_seconds histogram" in rendered
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in rendered
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in rendered
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in rendered
+    assert 'latency_seconds_count{route="/a"} 3' in rendered
+    assert latency.value(route="/a") == 3 and latency.total(route="/a") == 3.55
+
+
+def test_server_timing_reports_per_request_queries():
+    response = client.get("/items/3")
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert 'desc="3 queries"' in timing and "app;dur=" in timing
+    assert instrumentation.request_queries.value(route="/items/{count}") >= 1
+
+
+def test_repeated_statements_are_reported_as_n_plus_one(monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "N_PLUS_ONE_THRESHOLD", 4)
+    before = n_plus_one.value(route="/items/{count}")
+
+    with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+        client.get("/items/4")
+        assert n_plus_one.value(route="/items/{count}") == before
+        client.get("/items/5")
+
+    assert n_plus_one.value(route="/items/{count}") == before + 1
+    assert "statement ran 5 times: SELECT ?" in caplog.text
+
+
+def test_slow_queries_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+    before = instrumentation.slow_queries.value()
+
+    with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+        client.get("/items/1")
+
+    assert instrumentation.slow_queries.value() == before + 1
+    assert "slow query" in caplog.text
+
+
+def test_failed_statements_do_not_leave_timings_behind():
+    import pytest
+    from sqlalchemy.exc import OperationalError
+
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        assert conn.info.get("query_started") == []
+
+
+def test_shared_metrics_add_up_every_workers_counters(tmp_path):
+    from app.cache import SQLiteBackend
+
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    workers = []
+    for requests in (3, 4):
+        registry = Registry()
+        registry.counter("requests_total", "Requests").inc(requests, route="/books")
+        registry.gauge("subscribers", "Subscribers").set(requests)
+        registry.histogram("latency_seconds", "Latency", buckets=(0.1,)).observe(0.05)
+        workers.append(SharedMetrics(registry, backend=backend))
+    workers[1].publish()
+
+    rendered = workers[0].render()
+    assert 'requests_total{route="/books"} 7' in rendered
+    assert 'latency_seconds_bucket{le="0.1"} 2' in rendered
+    # gauges are per worker, not summed
+    assert 'subscribers{worker="1"} 4' in rendered
+    assert 'subscribers{worker="2"} 3' in rendered
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app.loaders import Loaders
+
+
+def test_loads_in_one_turn_share_a_batch():
+    calls = []
+
+    def batch(db, keys):
+        calls.append(list(keys))
+        return {key: key * 10 for key in keys if key != 4}
+
+    async def scenario():
+        loaders = Loaders(db=None)
+        loader = loaders(batch)
+        assert loaders(batch) is loader
+        values = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1))
+        assert values == [10, 20, 10]
+        # known keys are not fetched again; missing ones come back as None
+        assert await loader.load_many([2, 3, 4]) == {2: 20, 3: 30}
+
+    asyncio.run(scenario())
+    assert calls == [[1, 2], [3, 4]]
+
+
+def test_failed_batches_are_not_memoized():
+    calls = []
+
+    def batch(db, keys):
+        calls.append(list(keys))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return {key: key for key in keys}
+
+    async def scenario():
+        loader = Loaders(db=None)(batch)
+        with pytest.raises(RuntimeError):
+            await loader.load(1)
+        assert await loader.load(1) == 1
+
+    asyncio.run(scenario())
+    assert calls == [[1], [1]]
+
+
+def test_loader_keeps_its_dispatch_until_done():
+    async def scenario():
+        loader = Loaders(db=None)(lambda db, keys: {key: key for key in keys})
+        future = loader.load(1)
+        await asyncio.sleep(0)
+        assert len(loader._tasks) == 1
+        assert await future == 1
+        await asyncio.sleep(0)
+        assert not loader._tasks
+
+    asyncio.run(scenario())
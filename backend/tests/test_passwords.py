@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.passwords import PasswordHasher, hash_jobs
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, workers=1)
+
+    async def scenario():
+        hashed = await hasher.hash("secret-password")
+        return hashed, await hasher.verify("secret-password", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(scenario())
+    assert hashed.startswith("$2b$04$")
+    assert valid and not invalid
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+
+def test_rehash_when_cost_factor_changes():
+    old = PasswordHasher(rounds=4, workers=1)
+    new = PasswordHasher(rounds=5, workers=1)
+
+    async def scenario():
+        hashed = await old.hash("secret-password")
+        return await new.verify_and_update("secret-password", hashed), await old.verify_and_update(
+            "secret-password", hashed
+        )
+
+    (valid, new_hash), (still_valid, no_hash) = asyncio.run(scenario())
+    assert valid and new_hash.startswith("$2b$05$")
+    assert still_valid and no_hash is None
+    assert not new.needs_rehash(new_hash)
+    assert new.needs_rehash("not-a-bcrypt-hash")
+
+
+def test_overload_is_rejected_with_503():
+    hasher = PasswordHasher(rounds=10, workers=1, max_pending=1)
+    rejected_before = hash_jobs.value(operation="hash", outcome="rejected")
+
+    async def scenario():
+        return await asyncio.gather(
+            hasher.hash("first"), hasher.hash("second"), return_exceptions=True
+        )
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, str)
+    assert isinstance(second, HTTPException) and second.status_code == 503
+    assert hash_jobs.value(operation="hash", outcome="rejected") == rejected_before + 1
+    hasher.shutdown()
+
+
+def test_malformed_hash_does_not_verify():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    assert asyncio.run(hasher.verify("secret", "plaintext")) is False
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_executor_kinds(executor):
+    hasher = PasswordHasher(rounds=4, workers=1, executor=executor)
+    hashed = asyncio.run(hasher.hash("secret"))
+    assert asyncio.run(hasher.verify("secret", hashed))
+    hasher.shutdown()
@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import create_engine, delete, inspect, select, text
+
+from app.migrations import discover, run_migrations
+from app.models_db import Base, Book, UserBook
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def _plan(engine, stmt):
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def test_shelf_lookup_uses_composite_index(engine):
+    stmt = select(UserBook).where(UserBook.user_id == 1, UserBook.book_id == 2)
+    assert "INDEX uq_user_books_user_book (user_id=? AND book_id=?)" in _plan(engine, stmt)
+
+
+def test_user_shelf_listing_uses_composite_index(engine):
+    stmt = select(UserBook.book_id).where(UserBook.user_id == 1)
+    assert "uq_user_books_user_book (user_id=?)" in _plan(engine, stmt)
+
+
+def test_delete_book_cascade_uses_book_id_index(engine):
+    stmt = delete(UserBook).where(UserBook.book_id == 2)
+    assert "ix_user_books_book_id (book_id=?)" in _plan(engine, stmt)
+
+
+def test_author_filter_uses_index(engine):
+    stmt = select(Book.id).where(Book.author == "Jack London")
+    assert "ix_books_author (author=?)" in _plan(engine, stmt)
+
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # the pre-migration schema: no composite index, racy duplicate shelf rows
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+                          "email VARCHAR NOT NULL, password VARCHAR NOT NULL, role VARCHAR NOT NULL)"))
+        conn.execute(text("CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR, author VARCHAR, "
+                          "year INTEGER, description VARCHAR, cover_url VARCHAR, pdf_url VARCHAR)"))
+        conn.execute(text("CREATE TABLE user_books (id INTEGER PRIMARY KEY, user_id INTEGER, book_id INTEGER, "
+                          "status VARCHAR(7), progress INTEGER, current_page INTEGER, total_pages INTEGER)"))
+        conn.execute(text("INSERT INTO user_books (user_id, book_id, status) VALUES "
+                          "(1, 1, 'unread'), (1, 1, 'reading'), (1, 2, 'unread')"))
+
+    assert run_migrations(engine) == [version for version, _, _ in discover()]
+    assert run_migrations(engine) == []
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id FROM user_books ORDER BY id")).scalars().all() == [1, 3]
+        indexes = set(
+            conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars()
+        )
+    assert {"uq_user_books_user_book", "ix_user_books_book_id", "ix_books_author"} <= indexes
+    assert {"ix_books_revision", "ix_user_books_user_revision"} <= indexes
+    with engine.connect() as conn:
+        # statistics are backfilled from the deduplicated shelves
+        assert conn.execute(
+            text("SELECT books, unread, reading FROM user_stats WHERE user_id = 1")
+        ).one() == (2, 2, 0)
+        # existing rows are revision 0, part of every full sync
+        assert conn.execute(text("SELECT DISTINCT revision FROM user_books")).scalars().all() == [0]
+        assert conn.execute(text("SELECT revision, horizon FROM sync_state")).one() == (0, 0)
+    engine.dispose()
+
+
+def test_migrations_on_create_all_schema_are_noops(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert run_migrations(engine)
+    engine.dispose()
+
+
+def test_sync_reads_use_revision_indexes(engine):
+    stmt = select(Book.id).where(Book.revision > 5).order_by(Book.revision, Book.id)
+    assert "ix_books_revision (revision>?)" in _plan(engine, stmt)
+    stmt = select(UserBook.book_id).where(UserBook.user_id == 1, UserBook.revision > 5)
+    assert "ix_user_books_user_revision (user_id=? AND revision>?)" in _plan(engine, stmt)
+
+
+def test_migrated_schema_matches_the_models(tmp_path):
+    def schema(engine):
+        with engine.connect() as conn:
+            inspector = inspect(conn)
+            return {
+                table: (
+                    {column["name"] for column in inspector.get_columns(table)},
+                    {index["name"] for index in inspector.get_indexes(table)},
+                )
+                for table in Base.metadata.tables
+            }
+
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    run_migrations(migrated)
+    created = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    Base.metadata.create_all(bind=created)
+    assert schema(migrated) == schema(created)
+    migrated.dispose()
+    created.dispose()
@@ -0,0 +1,29 @@
+from app.search import InvertedIndex, tokenize
+
+
+def test_tokenize_folds_case_and_diacritics():
+    assert tokenize("Anna Karénina, Tolstoy") == ["anna", "karenina", "tolstoy"]
+
+
+def test_inverted_index_prefix_and_ranking():
+    index = InvertedIndex()
+    index.add(1, "Collected Essays", "Various", "Includes a piece on Shakespeare")
+    index.add(2, "Shakespeare's Sonnets", "William Shakespeare", "Poems")
+    index.add(3, "The Call Of The Wild", "Jack London", "A sled dog")
+
+    assert index.search("shak") == [2, 1]
+    assert index.search("wild london") == [3]
+    assert index.search("wild shakespeare") == []
+    assert index.search("...") == []
+
+
+def test_inverted_index_update_and_remove():
+    index = InvertedIndex()
+    index.add(1, "Old Title", "Author", "")
+    index.add(1, "New Title", "Author", "")
+    assert index.search("old") == []
+    assert index.search("new") == [1]
+
+    index.remove(1)
+    assert index.search("title") == []
+    assert len(index) == 0
@@ -0,0 +1,34 @@
+import os
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import cli, init_db
+from app.models_db import Book
+from benchmarks.bench_startup import measure_startup
+
+# generous enough for a cold CI runner; today's import-to-first-request is ~1s
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "5"))
+
+
+def test_import_to_first_request_is_fast_and_side_effect_free(tmp_path):
+    result = measure_startup(f"sqlite:///{tmp_path / 'startup.db'}")
+
+    assert result["status"] == 200
+    assert result["total_s"] < STARTUP_BUDGET_S, result
+    # importing the app must not create the schema or seed anything
+    assert result["database_created"] is False
+    assert result["loaded_lazy_modules"] == []
+
+
+def test_cli_init_db_creates_and_seeds_the_schema(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cli.db'}")
+    monkeypatch.setattr(init_db, "engine", engine)
+    monkeypatch.setattr(init_db, "SessionLocal", sessionmaker(bind=engine))
+
+    cli.main(["init-db", "--seed"])
+    cli.main(["seed-books"])
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Book)).scalar() == 8
+    engine.dispose()
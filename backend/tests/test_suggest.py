@@ -0,0 +1,66 @@
+import random
+
+from app.suggest import PrefixIndex
+
+BOOKS = [
+    (1, "War and Peace", "Leo Tolstoy"),
+    (2, "Peace and War", "Someone Else"),
+    (3, "The Warden", "Anthony Trollope"),
+    (4, "Anna Karénina", "Leo Tolstoy"),
+    (5, "Warlock", "Oakley Hall"),
+]
+
+
+def _index(rows=BOOKS):
+    index = PrefixIndex()
+    index.load(rows)
+    return index
+
+
+def test_prefix_matches_word_starts_of_titles_and_authors():
+    index = _index()
+
+    assert index.suggest("war") == [
+        (5, "Warlock"),
+        (1, "War and Peace"),
+        (3, "The Warden"),
+        (2, "Peace and War"),
+    ]
+    assert index.suggest("war and p") == [(1, "War and Peace")]
+    assert index.suggest("KARENINA") == [(4, "Anna Karénina")]
+    assert [book_id for book_id, _ in index.suggest("tolst")] == [1, 4]
+    assert index.suggest("war", limit=1) == [(5, "Warlock")]
+    assert index.suggest("xyz") == [] and index.suggest("  ") == []
+
+
+def test_incremental_updates_match_a_fresh_load():
+    rng = random.Random(3)
+    words = "war peace river stone night light wild".split()
+    rows = {
+        book_id: (book_id, " ".join(rng.choice(words) for _ in range(3)), rng.choice(words))
+        for book_id in range(1, 200)
+    }
+    index = _index(rows.values())
+    for book_id in rng.sample(sorted(rows), 60):
+        index.remove(book_id)
+        del rows[book_id]
+    for book_id in rng.sample(sorted(rows), 40):
+        rows[book_id] = (book_id, f"renamed {book_id}", "new author")
+        index.add(*rows[book_id])
+    # a bulk import merges its whole chunk at once, replacing books it repeats
+    batch = [(book_id, f"fresh {words[book_id % len(words)]}", None) for book_id in range(300, 320)]
+    batch.append((7, "fresh again", "new author"))
+    index.add_many(batch)
+    rows.update((row[0], row) for row in batch)
+
+    fresh = _index(rows.values())
+    assert len(index) == len(fresh) == len(rows)
+    for query in words + ["renamed", "fresh w", "new", "r"]:
+        assert index.suggest(query, limit=50) == fresh.suggest(query, limit=50), query
+
+
+def test_footprint_per_title_stays_small():
+    rows = [(book_id, f"Silent River Journey {book_id}", "Jane Austen") for book_id in range(10_000)]
+    index = _index(rows)
+    # normalized + display title strings dominate; the array adds 8 bytes per word start
+    assert index.footprint() / len(rows) < 300
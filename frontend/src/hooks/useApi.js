@@ -1,30 +1,8 @@
-export const useApi = () => {
-  const refreshAccessToken = async () => {
-    const refreshToken = localStorage.getItem("refreshToken");
-
-    if (!refreshToken) return null;
-
-    try {
-      const res = await fetch("http://127.0.0.1:8003/auth/refresh", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ refresh_token: refreshToken }),
-      });
-
-      if (!res.ok) throw new Error("Failed to refresh token");
+import { refreshAccessToken } from "../utils/refreshToken";
 
-      const data = await res.json();
-      localStorage.setItem("accessToken", data.access_token);
-      return data.access_token;
-    } catch (err) {
-      localStorage.removeItem("accessToken");
-      localStorage.removeItem("refreshToken");
-      window.location.href = "/signin";
-      return null;
-    }
-  };
-
-  const authFetch = async (url, options = {}) => {
+export const useApi = () => {
+  // the raw response, for callers that need its headers
+  const authFetchResponse = async (url, options = {}) => {
     let token = localStorage.getItem("accessToken");
     let headers = {
       "Content-Type": "application/json",
@@ -39,7 +17,7 @@ export const useApi = () => {
 
     // if access token has expired
     if (response.status === 401) {
-      const newToken = await refreshAccessToken();
+      const newToken = await refreshAccessToken(token);
       if (!newToken) throw new Error("Session expired");
 
       headers = {
@@ -53,15 +31,20 @@ export const useApi = () => {
       });
     }
 
-    if (response.status === 204) {
-      return;
-    }
-
-    if (!response.ok) {
+    if (!response.ok && response.status !== 204) {
       const errorData = await response.json();
       throw new Error(errorData.detail || "Request failed");
     }
 
+    return response;
+  };
+
+  const authFetch = async (url, options = {}) => {
+    const response = await authFetchResponse(url, options);
+    if (response.status === 204) {
+      return;
+    }
+
     const contentType = response.headers.get("content-type");
     if (contentType && contentType.includes("application/json")) {
       return response.json();
@@ -70,5 +53,5 @@ export const useApi = () => {
     return response.text();
   };
 
-  return { authFetch };
+  return { authFetch, authFetchResponse };
 };
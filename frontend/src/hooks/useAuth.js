@@ -52,6 +52,15 @@ export const useAuth = () => {
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem("refreshToken");
+    if (refreshToken) {
+      // revoke the sign-in server-side; leaving does not wait for it
+      fetch("http://127.0.0.1:8003/auth/logout", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      }).catch(() => {});
+    }
     localStorage.removeItem("accessToken");
     localStorage.removeItem("refreshToken");
     navigate("/");
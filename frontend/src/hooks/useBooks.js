@@ -1,8 +1,11 @@
 import { useState, useEffect, useCallback } from "react";
 import { useApi } from "./useApi";
 
+// the API's largest page (MAX_PAGE_SIZE)
+const PAGE_SIZE = 1000;
+
 export const useBooks = () => {
-  const { authFetch } = useApi();
+  const { authFetch, authFetchResponse } = useApi();
   const [books, setBooks] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
@@ -10,15 +13,24 @@ export const useBooks = () => {
   const fetchBooks = useCallback(async (searchQuery = "") => {
     setLoading(true);
     try {
-      const url = searchQuery ? `/books/?search=${searchQuery}` : "/books/";
-      const data = await authFetch(url);
-      setBooks(data);
+      // the listing is paged; follow the cursor to the end of the catalog
+      const params = new URLSearchParams({ limit: PAGE_SIZE });
+      if (searchQuery) params.set("search", searchQuery);
+      let all = [];
+      let cursor = null;
+      do {
+        if (cursor) params.set("after", cursor);
+        const response = await authFetchResponse(`/books/?${params}`);
+        all = all.concat(await response.json());
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
+      setBooks(all);
     } catch (err) {
       setError(err.message);
     } finally {
       setLoading(false);
     }
-  }, [authFetch]);
+  }, [authFetchResponse]);
 
   const deleteBook = useCallback(async (bookId) => {
     try {
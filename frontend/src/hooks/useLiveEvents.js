@@ -0,0 +1,88 @@
+import { useEffect, useRef } from "react";
+import { refreshAccessToken } from "../utils/refreshToken";
+
+const EVENT_TYPES = [
+  "book.created",
+  "book.updated",
+  "book.deleted",
+  "catalog.imported",
+  "shelf.added",
+  "shelf.updated",
+  "shelf.removed",
+  "shelf.batch",
+  "resync",
+];
+// matches the server's SSE retry hint
+const RETRY_MS = 5000;
+// refresh a token this close to expiry before connecting with it
+const EXPIRY_MARGIN_MS = 30000;
+
+// One stream per tab, shared by every component that listens.
+const listeners = new Set();
+let source = null;
+let connecting = false;
+let retryTimer = null;
+
+const expiresSoon = (token) => {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return JSON.parse(atob(payload)).exp * 1000 < Date.now() + EXPIRY_MARGIN_MS;
+  } catch (err) {
+    return true;
+  }
+};
+
+const currentToken = async () => {
+  const token = localStorage.getItem("accessToken");
+  if (!token || !expiresSoon(token)) return token;
+  return refreshAccessToken(token);
+};
+
+const dispatch = (event) => {
+  const data = JSON.parse(event.data);
+  listeners.forEach((listener) => listener(event.type, data));
+};
+
+const connect = async () => {
+  retryTimer = null;
+  connecting = true;
+  const token = await currentToken();
+  connecting = false;
+  if (listeners.size === 0 || source) return;
+
+  const query = token ? `?token=${encodeURIComponent(token)}` : "";
+  const next = new EventSource(`http://127.0.0.1:8003/events${query}`);
+  EVENT_TYPES.forEach((type) => next.addEventListener(type, dispatch));
+  // EventSource would retry with the same URL, and so the same token,
+  // and gives up for good on a 401; reconnect with a current one instead
+  next.onerror = () => {
+    next.close();
+    if (source === next) source = null;
+    if (listeners.size > 0 && !retryTimer) retryTimer = setTimeout(connect, RETRY_MS);
+  };
+  source = next;
+};
+
+const disconnect = () => {
+  if (source) source.close();
+  source = null;
+  clearTimeout(retryTimer);
+  retryTimer = null;
+};
+
+// Pushes catalog changes, and the signed-in user's shelf changes, to
+// `onEvent(type, data)`. "resync" means events were missed: reload.
+export const useLiveEvents = (onEvent) => {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    const listener = (type, data) => handler.current(type, data);
+    listeners.add(listener);
+    if (!source && !connecting && !retryTimer) connect();
+    return () => {
+      listeners.delete(listener);
+      if (listeners.size === 0) disconnect();
+    };
+  }, []);
+};
@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import { useApi } from "./useApi";
+import { useLiveEvents } from "./useLiveEvents";
 
 export const useUserBooks = () => {
   const { authFetch } = useApi();
@@ -118,6 +119,20 @@ export const useUserBooks = () => {
     fetchUserBooks();
   }, []);
 
+  // changes made on other devices
+  useLiveEvents((type, data) => {
+    if (type === "shelf.updated") {
+      setBooks((prev) =>
+        prev.map((b) => (b.book_id === data.book_id ? { ...b, ...data } : b))
+      );
+    } else if (type === "shelf.removed" || type === "book.deleted") {
+      const bookId = type === "book.deleted" ? data.id : data.book_id;
+      setBooks((prev) => prev.filter((b) => b.book_id !== bookId));
+    } else if (type === "shelf.added" || type === "shelf.batch" || type === "resync") {
+      fetchUserBooks();
+    }
+  });
+
   return {
     books,
     loading,
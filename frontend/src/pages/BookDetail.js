@@ -5,9 +5,13 @@ import ErrorState from "../components/common/ErrorState/ErrorState";
 import { useBook } from "../hooks/useBook";
 import "../styles/BookDetail.css";
 
-const BookCover = ({ coverUrl, title }) => (
+const BookCover = ({ bookId, coverUrl, title }) => (
   <img
-    src={coverUrl || "https://via.placeholder.com/200x300?text=No+Cover"}
+    src={
+      coverUrl
+        ? `http://127.0.0.1:8003/books/${bookId}/cover?size=large`
+        : "https://via.placeholder.com/200x300?text=No+Cover"
+    }
     alt={title}
     className="bookCover"
     loading="lazy"
@@ -21,7 +25,7 @@ const BookMetadata = ({ title, author, year, pdfUrl }) => (
     <p className="bookYear"><strong>Year:</strong> {year}</p>
     {pdfUrl && (
       <a
-        href={pdfUrl}
+        href={pdfUrl.startsWith("/") ? `http://127.0.0.1:8003${pdfUrl}` : pdfUrl}
         target="_blank"
         rel="noopener noreferrer"
         className="readButton"
@@ -50,7 +54,7 @@ function BookDetail() {
   return (
     <div className="bookDetailContainer">
       <div className="bookContent">
-        <BookCover coverUrl={book.cover_url} title={book.title} />
+        <BookCover bookId={book.id} coverUrl={book.cover_url} title={book.title} />
         <BookMetadata
           title={book.title}
           author={book.author}
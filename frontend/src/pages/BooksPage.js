@@ -10,6 +10,7 @@ import { useBooks } from "../hooks/useBooks";
 import { useUserBooks } from "../hooks/useUserBooks";
 import { useNotification } from "../hooks/useNotification";
 import { useApi } from "../hooks/useApi";
+import { useLiveEvents } from "../hooks/useLiveEvents";
 import "../styles/BooksPage.css";
 
 function BooksPage() {
@@ -29,6 +30,8 @@ function BooksPage() {
   const debounceTimeout = useRef(null);
   const searchInputRef = useRef(null);
 
+  const [suggestions, setSuggestions] = useState([]);
+
   const [showConfirmModal, setShowConfirmModal] = useState(false);
   const [bookToDelete, setBookToDelete] = useState(null);
 
@@ -43,6 +46,30 @@ function BooksPage() {
     return () => clearTimeout(debounceTimeout.current);
   }, [query]);
 
+  // librarian edits show up without polling
+  useLiveEvents((type) => {
+    if (type.startsWith("book.") || type === "catalog.imported" || type === "resync") {
+      fetchBooks(query);
+    }
+  });
+
+  // typeahead answers from memory, so it can follow every keystroke
+  useEffect(() => {
+    if (!query.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    authFetch(`/books/suggest?q=${encodeURIComponent(query)}`)
+      .then((data) => {
+        if (!cancelled) setSuggestions(data);
+      })
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+    };
+  }, [query]);
+
   async function handleSubmitBook(data) {
     try {
       const method = modalMode === "edit" ? "PUT" : "POST";
@@ -134,7 +161,13 @@ function BooksPage() {
             value={query}
             onChange={(e) => setQuery(e.target.value)}
             className="search-input"
+            list="book-suggestions"
           />
+          <datalist id="book-suggestions">
+            {suggestions.map((suggestion) => (
+              <option key={suggestion.id} value={suggestion.title} />
+            ))}
+          </datalist>
           {user?.role === "librarian" && (
             <button onClick={handleAddNewBook} className="add-btn">
               + Add New Book
@@ -152,7 +185,11 @@ function BooksPage() {
           {books.map((book) => (
             <div key={book.id} className="book-card">
               <img
-                src={book.cover_url || "https://via.placeholder.com/150x200?text=No+Cover"}
+                src={
+                  book.cover_url
+                    ? `http://127.0.0.1:8003/books/${book.id}/cover?size=small`
+                    : "https://via.placeholder.com/150x200?text=No+Cover"
+                }
                 alt={book.title}
                 className="book-cover"
                 onClick={() => navigate(`/books/${book.id}`)}
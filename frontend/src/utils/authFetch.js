@@ -1,3 +1,5 @@
+import { refreshAccessToken } from "./refreshToken";
+
 export async function authFetch(url, options = {}) {
   let accessToken = localStorage.getItem("accessToken");
   let refreshToken = localStorage.getItem("refreshToken");
@@ -11,25 +13,10 @@ export async function authFetch(url, options = {}) {
   let response = await fetch(url, options);
 
   if (response.status === 401 && refreshToken) {
-    const refreshResponse = await fetch("http://127.0.0.1:8003/auth/refresh", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({ refresh_token: refreshToken }),
-    });
-
-    if (refreshResponse.ok) {
-      const data = await refreshResponse.json();
-      localStorage.setItem("accessToken", data.access_token);
-      accessToken = data.access_token;
-
+    accessToken = await refreshAccessToken(accessToken);
+    if (accessToken) {
       options.headers.Authorization = `Bearer ${accessToken}`;
       response = await fetch(url, options);
-    } else {
-      localStorage.removeItem("accessToken");
-      localStorage.removeItem("refreshToken");
-      window.location.href = "/signin";
     }
   }
 
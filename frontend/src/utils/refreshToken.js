@@ -0,0 +1,49 @@
+const API_URL = "http://127.0.0.1:8003";
+
+// Refresh tokens are single-use: a second refresh with the same token looks
+// like a stolen copy and revokes the whole sign-in. Every caller therefore
+// shares the one refresh that is in flight.
+let inFlight = null;
+
+const signOut = () => {
+  localStorage.removeItem("accessToken");
+  localStorage.removeItem("refreshToken");
+  window.location.href = "/signin";
+};
+
+const refresh = async () => {
+  const refreshToken = localStorage.getItem("refreshToken");
+  if (!refreshToken) return null;
+
+  try {
+    const res = await fetch(`${API_URL}/auth/refresh`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+    if (!res.ok) throw new Error("Failed to refresh token");
+
+    const data = await res.json();
+    localStorage.setItem("accessToken", data.access_token);
+    localStorage.setItem("refreshToken", data.refresh_token);
+    return data.access_token;
+  } catch (err) {
+    signOut();
+    return null;
+  }
+};
+
+// `rejected` is the access token that just got a 401; if another caller
+// has replaced it in the meantime, the new one is used without refreshing.
+export const refreshAccessToken = (rejected) => {
+  const current = localStorage.getItem("accessToken");
+  if (rejected && current && current !== rejected) {
+    return Promise.resolve(current);
+  }
+  if (!inFlight) {
+    inFlight = refresh().finally(() => {
+      inFlight = null;
+    });
+  }
+  return inFlight;
+};